@@ -0,0 +1,261 @@
+"""
+基准测试：按给定规模生成合成数据集（见 generate_synthetic_datasets.generate_datasets），
+端到端测量分块、全域统计（首次/复用交集表）、区域统计与多边形获取，写出 JSON 报告，可与之前的报告比较。
+
+    python benchmark.py --sizes 1000,10000,100000 --clusters 16 --out bench/report.json
+    python benchmark.py --sizes 1000,10000 --compare bench/report.json
+
+区域统计与多边形获取经 FastAPI 应用（进程内 TestClient）调用，包含序列化开销；
+查询 bbox 由 --seed 决定，同一参数下各次运行完全相同。
+合成数据集按参数缓存在 --data-dir，分块写到 partitioned_data/bench_a_{rows} 等目录，结束后删除（--keep 保留）。
+峰值 RSS 取自 getrusage：本进程与已回收子进程各自的历史最大值（只增不减），按阶段结束时记录。
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+# 基准测试使用进程内任务表，不写项目目录下的 tasks.db
+os.environ.setdefault("TASK_STORE", "memory")
+
+from generate_synthetic_datasets import generate_datasets  # noqa: E402
+from parti1_local import PARTITION_DIR, partition_file  # noqa: E402
+from parti2_local import compute_stats  # noqa: E402
+from partition_layout import GLOBAL_BOUNDS  # noqa: E402
+
+BENCH_PREFIX = "bench"
+# 比较报告时使用的指标：(阶段, 字段, 数值越大越好)
+COMPARE_FIELDS = [
+    ("partition", "rows_per_sec", True),
+    ("join_cold", "seconds", False),
+    ("join_warm", "seconds", False),
+    ("region_stats", "p50_ms", False),
+    ("region_stats", "p95_ms", False),
+    ("polygons_json", "p50_ms", False),
+    ("polygons_binary", "p50_ms", False),
+    ("memory", "peak_rss_mb", False),
+]
+
+
+def _peak_rss_mb() -> Dict[str, float]:
+    # Linux 上 ru_maxrss 单位为 KB，macOS 为字节
+    scale = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale / 2**20
+    return {"peak_rss_mb": round(own, 1), "peak_rss_children_mb": round(children, 1)}
+
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    """延迟分位数（毫秒）"""
+    ms = np.asarray(seconds) * 1000
+    return {
+        "count": int(len(ms)),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p90_ms": float(np.percentile(ms, 90)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+
+def query_boxes(count: int, frac: float, seed: int) -> List[tuple]:
+    """随机查询 bbox：边长为世界范围的 frac 倍，完全落在 GLOBAL_BOUNDS 内"""
+    minx, miny, maxx, maxy = GLOBAL_BOUNDS
+    w, h = (maxx - minx) * frac, (maxy - miny) * frac
+    rng = np.random.default_rng(seed)
+    x0 = rng.uniform(minx, maxx - w, count)
+    y0 = rng.uniform(miny, maxy - h, count)
+    return [(float(x), float(y), float(x + w), float(y + h)) for x, y in zip(x0, y0)]
+
+
+def dataset_files(data_dir: str, rows: int, params: Dict) -> tuple:
+    """生成（或复用已缓存的）合成数据集，返回 (path_a, path_b)"""
+    key = hashlib.sha1(json.dumps({"rows": rows, **params}, sort_keys=True).encode()).hexdigest()[:10]
+    path_a = os.path.join(data_dir, f"a_{rows}_{key}.csv")
+    path_b = os.path.join(data_dir, f"b_{rows}_{key}.csv")
+    if not (os.path.exists(path_a) and os.path.exists(path_b)):
+        os.makedirs(data_dir, exist_ok=True)
+        tmp_a, tmp_b = f"{path_a}.tmp", f"{path_b}.tmp"
+        generate_datasets(tmp_a, tmp_b, rows, **params)
+        os.replace(tmp_a, path_a)
+        os.replace(tmp_b, path_b)
+    return path_a, path_b
+
+
+def _timed_get(client, url: str, params: Dict):
+    t0 = time.perf_counter()
+    res = client.get(url, params=params)
+    elapsed = time.perf_counter() - t0
+    res.raise_for_status()
+    return elapsed, res
+
+
+def run_size(client, rows: int, args, params: Dict) -> Dict:
+    """单个规模的全部阶段"""
+    out = {"rows": rows}
+    t0 = time.perf_counter()
+    path_a, path_b = dataset_files(args.data_dir, rows, params)
+    out["generate_seconds"] = time.perf_counter() - t0
+    prefix_a, prefix_b = f"{BENCH_PREFIX}_a_{rows}", f"{BENCH_PREFIX}_b_{rows}"
+    base_a, base_b = os.path.join(PARTITION_DIR, prefix_a), os.path.join(PARTITION_DIR, prefix_b)
+
+    # 分块（两个数据集合计）
+    t0 = time.perf_counter()
+    partition_file(path_a, prefix_a, layout=args.layout, max_per_cell=args.max_per_cell)
+    partition_file(path_b, prefix_b, layout=args.layout, max_per_cell=args.max_per_cell)
+    seconds = time.perf_counter() - t0
+    out["partition"] = {"seconds": seconds, "rows_per_sec": 2 * rows / seconds, **_peak_rss_mb()}
+
+    # 全域统计：首次计算交集表，之后复用
+    for name in ("join_cold", "join_warm"):
+        t0 = time.perf_counter()
+        res = compute_stats(base_a, base_b)
+        seconds = time.perf_counter() - t0
+        out[name] = {
+            "seconds": seconds,
+            "polygons_per_sec": 2 * rows / seconds,
+            "intersection_count": res["intersection_count"],
+            "area_inter": res["area_inter"],
+            "block_jaccard": res["block_jaccard"],
+            "stage_seconds": res["metrics"]["seconds"],
+            **_peak_rss_mb(),
+        }
+
+    boxes = query_boxes(args.queries, args.bbox_frac, args.seed)
+    latencies = []
+    for box in boxes:
+        params_q = {"dataset_a": prefix_a, "dataset_b": prefix_b, **dict(zip(("minx", "miny", "maxx", "maxy"), box))}
+        elapsed, _ = _timed_get(client, "/api/regions/stats", params_q)
+        latencies.append(elapsed)
+    out["region_stats"] = latency_summary(latencies)
+
+    for fmt in ("json", "binary"):
+        latencies, sizes = [], []
+        for box in boxes:
+            params_q = {"dataset": prefix_a, "limit": args.limit, "format": fmt}
+            params_q.update(zip(("minx", "miny", "maxx", "maxy"), box))
+            elapsed, res = _timed_get(client, "/api/regions/polygons", params_q)
+            latencies.append(elapsed)
+            sizes.append(len(res.content))
+        out[f"polygons_{fmt}"] = {**latency_summary(latencies), "mean_bytes": float(np.mean(sizes))}
+
+    out["memory"] = _peak_rss_mb()
+    if not args.keep:
+        shutil.rmtree(base_a, ignore_errors=True)
+        shutil.rmtree(base_b, ignore_errors=True)
+    return out
+
+
+def environment() -> Dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "join_workers": os.environ.get("JOIN_WORKERS"),
+        "ingest_workers": os.environ.get("INGEST_WORKERS"),
+        "partition_cache_mb": os.environ.get("PARTITION_CACHE_MB"),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def compare(report: Dict, baseline: Dict):
+    """按规模对齐两份报告，打印各指标的变化（正数表示变好）"""
+    old = {r["rows"]: r for r in baseline["results"]}
+    print(f"对比基线 {baseline['environment'].get('commit')} -> {report['environment'].get('commit')}")
+    print(f"{'rows':>10} {'metric':<28} {'baseline':>12} {'current':>12} {'change':>8}")
+    for r in report["results"]:
+        base = old.get(r["rows"])
+        if base is None:
+            continue
+        for stage, field, higher_better in COMPARE_FIELDS:
+            a, b = base.get(stage, {}).get(field), r.get(stage, {}).get(field)
+            if not a or b is None:
+                continue
+            change = (b / a - 1) if higher_better else (a / b - 1 if b else 0.0)
+            print(f"{r['rows']:>10} {stage + '.' + field:<28} {a:>12.3f} {b:>12.3f} {change:>+8.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="空间 Jaccard 基准测试")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="逗号分隔的每个数据集多边形数（1e3 ~ 1e7）")
+    parser.add_argument("--clusters", type=int, default=0, help="聚集中心数，0 为均匀分布")
+    parser.add_argument("--spread", type=float, default=0.03, help="聚集半径（世界宽度的比例）")
+    parser.add_argument("--vertices", type=int, default=8, help="每个多边形的顶点数")
+    parser.add_argument("--overlap", type=float, default=0.5, help="紧邻 A 中对应多边形放置的 B 多边形比例")
+    parser.add_argument("--crossing", type=float, default=0.05, help="放到网格边界上（跨网格）的多边形比例")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--layout", default="grid", choices=["grid", "quadtree"])
+    parser.add_argument("--max-per-cell", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=50, help="区域统计与多边形获取的查询次数")
+    parser.add_argument("--bbox-frac", type=float, default=0.1, help="查询 bbox 边长占世界范围的比例")
+    parser.add_argument("--limit", type=int, default=5000, help="多边形获取的 limit")
+    parser.add_argument("--data-dir", default=os.path.join("bench", "data"))
+    parser.add_argument("--out", default=os.path.join("bench", "report.json"))
+    parser.add_argument("--compare", help="与之前的 JSON 报告比较")
+    parser.add_argument("--keep", action="store_true", help="保留基准测试的分块目录")
+    args = parser.parse_args()
+
+    from fastapi.testclient import TestClient
+
+    from main import app
+
+    params = {
+        "clusters": args.clusters,
+        "spread": args.spread,
+        "vertices": args.vertices,
+        "overlap": args.overlap,
+        "crossing": args.crossing,
+        "seed": args.seed,
+    }
+    report = {
+        "environment": environment(),
+        "params": {
+            **params,
+            "layout": args.layout,
+            "max_per_cell": args.max_per_cell,
+            "queries": args.queries,
+            "bbox_frac": args.bbox_frac,
+            "limit": args.limit,
+        },
+        "results": [],
+    }
+    client = TestClient(app)
+    for rows in (int(float(v)) for v in args.sizes.split(",")):
+        print(f"[-] 规模 {rows:,}")
+        result = run_size(client, rows, args, params)
+        report["results"].append(result)
+        print(
+            f"    分块 {result['partition']['rows_per_sec']:,.0f} rows/s | "
+            f"全域统计 {result['join_cold']['seconds']:.2f}s / 复用 {result['join_warm']['seconds']:.2f}s | "
+            f"区域统计 p50 {result['region_stats']['p50_ms']:.1f}ms p95 {result['region_stats']['p95_ms']:.1f}ms | "
+            f"多边形 p50 {result['polygons_binary']['p50_ms']:.1f}ms | 峰值 RSS {result['memory']['peak_rss_mb']:.0f}MB"
+        )
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    print(f"✅ 报告已写出: {args.out}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
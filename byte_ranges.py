@@ -0,0 +1,50 @@
+"""
+CSV 字节区间：把文件数据区切成对齐到换行符的区间，并提供区间的只读视图，供多个进程分别流式读取。
+只依赖标准库、没有导入时副作用，分块模块（parti1_local）与离线 CLI（cal.py）共用。
+"""
+import io
+import os
+
+
+class ByteRange(io.RawIOBase):
+    """文件 [start, end) 字节区间的只读视图，供 pd.read_csv 分块读取"""
+
+    def __init__(self, path: str, start: int, end: int):
+        self._f = open(path, "rb")
+        self._f.seek(start)
+        self._left = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        n = self._f.readinto(memoryview(buf)[: max(0, min(len(buf), self._left))])
+        self._left -= n
+        return n
+
+    def close(self):
+        self._f.close()
+        super().close()
+
+
+def split_ranges(input_path: str, parts: int):
+    """
+    将 CSV 数据区（表头之后）切成 parts 个字节区间，边界对齐到换行符（每行一条记录）。
+    返回 [(start, end), ...]，可能少于 parts 个（文件较小时）。
+    """
+    size = os.path.getsize(input_path)
+    with open(input_path, "rb") as f:
+        f.readline()
+        data_start = f.tell()
+        bounds = [data_start]
+        for k in range(1, parts):
+            target = data_start + (size - data_start) * k // parts
+            if target <= bounds[-1]:
+                continue
+            f.seek(target - 1)
+            f.readline()
+            pos = f.tell()
+            if bounds[-1] < pos < size:
+                bounds.append(pos)
+        bounds.append(size)
+    return [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
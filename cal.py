@@ -1,122 +1,274 @@
-import pandas as pd
-from shapely import wkt
+"""
+全局 Jaccard 计算器：由空间连接结果（Spark 作业的 Parquet 输出或旧版合并 CSV）与两个原始数据集计算
+交集总面积、A/B 总面积、并集与 Jaccard。
+
+    python cal.py merged_spatial_join.csv dataset_a.csv dataset_b.csv --workers 16 --out summary.json
+    python cal.py hdfs_export/pairs partitioned_data/a partitioned_data/b > summary.json
+
+原始 CSV 按字节区间切分后由进程池并行读取，每个区间内按块向量化解析 WKT（shapely.from_wkt/area），
+无效几何用 buffer(0) 修复，无法解析/修复的行计入 invalid_rows（与分块时的规则相同）；
+结果文件同样按区间（CSV）或按文件（Parquet）经同一个进程池流式求和。
+数据集参数为带 manifest 的分块目录时直接读取分块时记录的总面积。
+进度与报告输出到 stderr，机器可读的 JSON 汇总输出到 stdout（--out 同时写入文件），不需要交互。
+"""
+import argparse
+import io
+import json
+import math
+import multiprocessing
+import os
 import sys
-import csv
 import time
-import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import shapely
+
+from byte_ranges import ByteRange, split_ranges
+from partition_layout import dataset_totals
 
 # ================= 配置区域 =================
-# 1. 你的 Spark 运行结果 (包含交集信息)
+# 未在命令行指定时使用的默认路径
+# 1. 你的 Spark 运行结果 (包含交集信息)：spatial_join_production.py 输出的 Parquet 目录，或旧版合并后的 CSV
 RESULT_FILE = r"merged_spatial_join.csv"
 
-# 2. 原始的大型数据集 (用于计算分母)
+# 2. 原始的大型数据集 (用于计算分母)；也可以填分块目录 (partitioned_data/xxx)，直接读取 manifest 中的总面积
 DATASET_A = r"dataset_a.csv"
 DATASET_B = r"dataset_b.csv"
 
 # 3. 性能配置
-CHUNK_SIZE = 10000  # 每次读取行数
+CHUNK_SIZE = 10000  # 每个区间内每次向量化解析的行数
+RANGE_BYTES = 64 * 2**20  # 每个进程池任务读取的字节数
+CAL_WORKERS = int(os.environ.get("CAL_WORKERS", os.cpu_count() or 1))
 # ===========================================
 
-# 【Windows 兼容性修复】
-try:
-    csv.field_size_limit(2147483647)
-except Exception:
-    pass
-
-def get_intersection_sum(filepath):
-    """从结果文件中计算交集总面积"""
-    print(f"[-] 正在读取结果文件: {filepath} ...")
-    if not os.path.exists(filepath):
-        print(f"错误: 文件不存在!")
-        return 0.0
-    
-    start = time.time()
-    try:
-        # 结果文件通常没有表头: id_a, id_b, area_a, area_b, intersection_area
-        # 我们只需要第 5 列 (索引 4)
-        df = pd.read_csv(filepath, header=None, usecols=[4], names=['inter_area'])
-        total = df['inter_area'].sum()
-        
-        print(f"  -> 读取完成，耗时 {time.time()-start:.2f}s")
-        print(f"  -> 【交集总面积】: {total:,.4f}")
-        return total
-    except Exception as e:
-        print(f"读取结果文件失败: {e}")
-        return 0.0
-
-def get_raw_dataset_area(filepath, name):
-    """分块读取原始大文件计算总面积"""
-    print(f"[-] 正在计算 {name} 总面积...")
-    if not os.path.exists(filepath):
-        print(f"错误: 文件 {filepath} 不存在")
-        return 0.0
-        
-    total_area = 0.0
-    start = time.time()
-    
+
+def log(msg: str = ""):
+    print(msg, file=sys.stderr, flush=True)
+
+
+def csv_ranges(path: str, has_header: bool):
+    """按 RANGE_BYTES 把 CSV 切成对齐到换行符的字节区间；无表头时第一个区间从文件开头算起"""
+    size = os.path.getsize(path)
+    ranges = split_ranges(path, max(1, math.ceil(size / RANGE_BYTES)))
+    if has_header:
+        return ranges
+    if not ranges:
+        return [(0, size)] if size else []
+    return [(0, ranges[0][1])] + ranges[1:]
+
+
+def read_range(path: str, start: int, end: int, usecols: List[int], chunksize: int):
+    """逐块读取 [start, end) 区间内的记录（无表头），列全部按字符串读入；经有界读取器流式读取，不把整个区间读进内存"""
+    if start >= end:
+        return
+    with io.BufferedReader(ByteRange(path, start, end)) as src:
+        try:
+            reader = pd.read_csv(src, header=None, usecols=usecols, dtype=str, chunksize=chunksize)
+        except pd.errors.EmptyDataError:
+            return
+        yield from reader
+
+
+def dataset_range_area(path: str, start: int, end: int, geom_col: int, chunksize: int) -> Dict:
+    """进程池任务：区间内多边形的行数、无效行数、修复行数与总面积"""
+    out = {"rows": 0, "invalid_rows": 0, "repaired_rows": 0, "area": 0.0}
+    for chunk in read_range(path, start, end, [geom_col], chunksize):
+        wkts = chunk.iloc[:, 0].fillna("").str.strip().str.strip('"').to_numpy()
+        geoms = shapely.from_wkt(wkts, on_invalid="ignore")
+        bad = shapely.is_missing(geoms)
+        need_fix = ~bad & ~shapely.is_valid(geoms)
+        if need_fix.any():
+            geoms[need_fix] = shapely.buffer(geoms[need_fix], 0)
+        bad |= ~shapely.is_valid(geoms) | shapely.is_empty(geoms)
+        out["rows"] += len(chunk)
+        out["invalid_rows"] += int(bad.sum())
+        out["repaired_rows"] += int((need_fix & ~bad).sum())
+        out["area"] += float(shapely.area(geoms[~bad]).sum())
+    return out
+
+
+def result_range_sum(path: str, start: int, end: int, chunksize: int) -> Dict:
+    """进程池任务：旧版 CSV 结果（无表头，第 5 列为交集面积）区间内的行数、无法解析的行数与交集面积"""
+    out = {"rows": 0, "invalid_rows": 0, "inter_area": 0.0}
+    for chunk in read_range(path, start, end, [4], chunksize):
+        values = pd.to_numeric(chunk.iloc[:, 0], errors="coerce").to_numpy(dtype=float)
+        bad = ~np.isfinite(values)
+        out["rows"] += len(chunk)
+        out["invalid_rows"] += int(bad.sum())
+        out["inter_area"] += float(values[~bad].sum())
+    return out
+
+
+def result_file_sum(path: str) -> Dict:
+    """进程池任务：单个 Parquet 结果文件的行数与 inter_area 之和（逐 row group 读取）"""
+    out = {"rows": 0, "invalid_rows": 0, "inter_area": 0.0}
+    for batch in pq.ParquetFile(path).iter_batches(columns=["inter_area"]):
+        values = batch.column(0).to_numpy(zero_copy_only=False).astype(float)
+        bad = ~np.isfinite(values)
+        out["rows"] += len(values)
+        out["invalid_rows"] += int(bad.sum())
+        out["inter_area"] += float(values[~bad].sum())
+    return out
+
+
+def run_tasks(pool: Optional[ProcessPoolExecutor], fn: Callable, tasks: List[tuple], name: str) -> Dict:
+    """在进程池中执行任务并按字段求和（pool 为 None 时在本进程依次执行），按完成顺序报告进度"""
+    total: Dict = {}
+    start = time.perf_counter()
+    if pool is None:
+        results = (fn(*task) for task in tasks)
+    else:
+        results = (future.result() for future in as_completed([pool.submit(fn, *task) for task in tasks]))
+    for done, res in enumerate(results, 1):
+        for key, value in res.items():
+            total[key] = total.get(key, 0) + value
+        if len(tasks) > 1:
+            rate = total["rows"] / max(time.perf_counter() - start, 1e-9)
+            log(f"  -> {name}: {done}/{len(tasks)} 个任务，{total['rows']:,} 行，{rate:,.0f} 行/秒")
+    return total
+
+
+def _finish(stats: Dict, path: str, source: str, start: float) -> Dict:
+    seconds = time.perf_counter() - start
+    stats = {"path": path, "source": source, **stats, "seconds": seconds}
+    stats["rows_per_sec"] = stats.get("rows", 0) / seconds if seconds > 0 else 0.0
+    return stats
+
+
+def get_intersection_sum(filepath: str, pool=None, chunksize: int = CHUNK_SIZE) -> Dict:
+    """从结果文件中计算交集总面积：Parquet 目录/文件按文件分发，CSV 按字节区间分发"""
+    log(f"[-] 正在读取结果文件: {filepath} ...")
+    start = time.perf_counter()
+    if os.path.isdir(filepath) or filepath.endswith(".parquet"):
+        # Spark 作业的 Parquet 输出: id_a, id_b, area_a, area_b, inter_area (已去重)，只读 inter_area 列
+        if os.path.isdir(filepath):
+            files = sorted(
+                os.path.join(root, f)
+                for root, _, names in os.walk(filepath)
+                for f in names
+                if f.endswith(".parquet") and not f.startswith((".", "_"))
+            )
+        else:
+            files = [filepath]
+        stats = run_tasks(pool, result_file_sum, [(f,) for f in files], "结果文件")
+        source = "parquet"
+    else:
+        # 旧版 CSV 结果文件没有表头: id_a, id_b, area_a, area_b, intersection_area
+        tasks = [(filepath, a, b, chunksize) for a, b in csv_ranges(filepath, has_header=False)]
+        stats = run_tasks(pool, result_range_sum, tasks, "结果文件")
+        source = "csv"
+    stats = _finish({"rows": 0, "invalid_rows": 0, "inter_area": 0.0, **stats}, filepath, source, start)
+    log(f"  -> 读取完成，{stats['rows']:,} 行 (无法解析 {stats['invalid_rows']:,} 行)，耗时 {stats['seconds']:.2f}s")
+    log(f"  -> 【交集总面积】: {stats['inter_area']:,.4f}")
+    return stats
+
+
+def get_raw_dataset_area(filepath: str, name: str, pool=None, chunksize: int = CHUNK_SIZE) -> Dict:
+    """计算数据集总面积；filepath 为带 manifest 的分块目录时直接读取分块时记录的总面积"""
+    log(f"[-] 正在计算 {name} 总面积...")
+    start = time.perf_counter()
+    totals = dataset_totals(filepath) if os.path.isdir(filepath) else None
+    if totals is not None:
+        log(f"  -> 读取分块 manifest: {totals['rows']} 行 (修复 {totals['repaired_rows']} 行)")
+        stats = {
+            "rows": totals.get("input_rows", totals["rows"]),
+            "invalid_rows": totals.get("invalid_rows", 0),
+            "repaired_rows": totals["repaired_rows"],
+            "area": totals["area"],
+        }
+        stats = _finish(stats, filepath, "manifest", start)
+    else:
+        # 自动找 geometry 列，没有时假设在第 2 列
+        columns = list(pd.read_csv(filepath, nrows=0).columns)
+        geom_col = columns.index("geometry") if "geometry" in columns else 1
+        if geom_col >= len(columns):
+            raise ValueError(f"{filepath} 缺少 geometry 列")
+        tasks = [(filepath, a, b, geom_col, chunksize) for a, b in csv_ranges(filepath, has_header=True)]
+        stats = run_tasks(pool, dataset_range_area, tasks, name)
+        stats = _finish({"rows": 0, "invalid_rows": 0, "repaired_rows": 0, "area": 0.0, **stats}, filepath, "csv", start)
+        log(
+            f"  -> {name} 完成，{stats['rows']:,} 行 (无效 {stats['invalid_rows']:,} 行，修复 {stats['repaired_rows']:,} 行)，"
+            f"耗时 {stats['seconds']:.2f}s，{stats['rows_per_sec']:,.0f} 行/秒"
+        )
+    log(f"  -> 面积: {stats['area']:,.4f}")
+    return stats
+
+
+def compute(result: str, dataset_a: str, dataset_b: str, workers: int = CAL_WORKERS, chunksize: int = CHUNK_SIZE) -> Dict:
+    """计算全局 Jaccard，返回汇总（各输入的行数、无效行数、耗时与吞吐量，以及面积与 Jaccard）"""
+    for path in (result, dataset_a, dataset_b):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"文件不存在: {path}")
+    start = time.perf_counter()
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
     try:
-        # header=0 表示第一行是表头
-        reader = pd.read_csv(filepath, chunksize=CHUNK_SIZE, header=0, engine='c')
-        
-        for chunk in reader:
-            # 自动找 geometry 列
-            if 'geometry' in chunk.columns:
-                wkt_col = chunk['geometry']
-            elif len(chunk.columns) > 1:
-                wkt_col = chunk.iloc[:, 1] # 假设在第2列
-            else:
-                continue
-
-            for wkt_str in wkt_col.astype(str):
-                try:
-                    if len(wkt_str) < 10: continue # 跳过空或过短的
-                    geom = wkt.loads(wkt_str)
-                    total_area += geom.area if geom.is_valid else geom.buffer(0).area
-                except:
-                    pass
-                    
-    except Exception as e:
-        print(f"处理 {name} 时出错: {e}")
-        return 0.0
-        
-    print(f"  -> {name} 完成，耗时 {time.time()-start:.2f}s")
-    print(f"  -> 面积: {total_area:,.4f}")
-    return total_area
+        inter = get_intersection_sum(result, pool, chunksize)
+        if inter["inter_area"] == 0:
+            log("警告: 交集面积为 0，请检查结果文件")
+        stats_a = get_raw_dataset_area(dataset_a, "Dataset A", pool, chunksize)
+        stats_b = get_raw_dataset_area(dataset_b, "Dataset B", pool, chunksize)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    union_area = stats_a["area"] + stats_b["area"] - inter["inter_area"]
+    return {
+        "area_a": stats_a["area"],
+        "area_b": stats_b["area"],
+        "inter_area": inter["inter_area"],
+        "union_area": union_area,
+        "jaccard": inter["inter_area"] / union_area if union_area > 0 else 0.0,
+        "result": inter,
+        "dataset_a": stats_a,
+        "dataset_b": stats_b,
+        "workers": workers,
+        "seconds": time.perf_counter() - start,
+    }
+
 
 def main():
-    print("="*60)
-    print("        全自动 Global Jaccard 计算器        ")
-    print("="*60)
-
-    # 1. 先算交集 (最快)
-    inter_area = get_intersection_sum(RESULT_FILE)
-    if inter_area == 0:
-        print("\n错误: 交集面积为 0 或读取失败，程序终止。")
-        return
+    parser = argparse.ArgumentParser(description="全局 Jaccard 计算器")
+    parser.add_argument("result", nargs="?", default=RESULT_FILE, help="连接结果：Parquet 目录/文件或旧版 CSV")
+    parser.add_argument("dataset_a", nargs="?", default=DATASET_A, help="数据集 A 的 CSV 或分块目录")
+    parser.add_argument("dataset_b", nargs="?", default=DATASET_B, help="数据集 B 的 CSV 或分块目录")
+    parser.add_argument("--workers", type=int, default=CAL_WORKERS, help="进程数，1 为单进程")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE, help="每次向量化解析的行数")
+    parser.add_argument("--out", help="汇总 JSON 同时写入该文件")
+    args = parser.parse_args()
+
+    log("=" * 60)
+    log("        全自动 Global Jaccard 计算器        ")
+    log("=" * 60)
+    try:
+        summary = compute(args.result, args.dataset_a, args.dataset_b, args.workers, args.chunksize)
+    except (OSError, ValueError) as e:
+        log(f"错误: {e}")
+        sys.exit(1)
+
+    log("\n" + "=" * 60)
+    log("             最 终 结 果 报 告              ")
+    log("=" * 60)
+    log(f" Dataset A 总面积 : {summary['area_a']:,.4f}")
+    log(f" Dataset B 总面积 : {summary['area_b']:,.4f}")
+    log(f" 交集总面积 (I)   : {summary['inter_area']:,.4f}")
+    log(f" 并集总面积 (U)   : {summary['union_area']:,.4f}")
+    log("-" * 60)
+    log(f" ★ Global Jaccard : {summary['jaccard']:.10f}")
+    log(f" 总耗时 {summary['seconds']:.2f}s ({summary['workers']} 个进程)")
+    log("=" * 60)
+
+    text = json.dumps(summary, ensure_ascii=False, indent=1)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
 
-    print("-" * 30)
-
-    # 2. 算 Dataset A
-    area_a = get_raw_dataset_area(DATASET_A, "Dataset A")
-    
-    # 3. 算 Dataset B
-    area_b = get_raw_dataset_area(DATASET_B, "Dataset B")
-
-    # 4. 汇总计算
-    union_area = area_a + area_b - inter_area
-    jaccard = inter_area / union_area if union_area > 0 else 0
-
-    print("\n" + "="*60)
-    print("             最 终 结 果 报 告              ")
-    print("="*60)
-    print(f" Dataset A 总面积 : {area_a:,.4f}")
-    print(f" Dataset B 总面积 : {area_b:,.4f}")
-    print(f" 交集总面积 (I)   : {inter_area:,.4f}")
-    print(f" 并集总面积 (U)   : {union_area:,.4f}")
-    print("-" * 60)
-    print(f" ★ Global Jaccard : {jaccard:.10f}")
-    print("="*60)
-    input("按回车键退出...")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -20,8 +20,19 @@ import { UploadOutlined, PlayCircleOutlined, ReloadOutlined, AimOutlined, Rocket
 import { DeckGL } from "@deck.gl/react";
 import { PolygonLayer } from "@deck.gl/layers";
 import { OrthographicView } from "@deck.gl/core";
-import { createTask, getPolygons, getRegionStats, getTask, uploadDataset } from "./api";
-import { BBox, PolygonFeature } from "./types";
+import {
+  EMPTY_POLYGONS,
+  cancelTask,
+  createTask,
+  getPolygonsBinary,
+  getRegionStats,
+  getTilePolygons,
+  hasHoles,
+  partPolygon,
+  uploadDataset,
+  watchTask,
+} from "./api";
+import { BBox, BinaryPolygons, TaskProgress } from "./types";
 
 const { Title, Text } = Typography;
 const GLOBAL_BOUNDS: BBox = { minx: -120, miny: -120, maxx: 120, maxy: 120 };
@@ -35,8 +46,8 @@ function CanvasPreview({
   width = 800,
   height = 520,
 }: {
-  polygonsA: PolygonFeature[];
-  polygonsB: PolygonFeature[];
+  polygonsA: BinaryPolygons;
+  polygonsB: BinaryPolygons;
   bbox: BBox;
   width?: number;
   height?: number;
@@ -49,37 +60,22 @@ function CanvasPreview({
 
   // 计算数据边界
   const dataBounds = useMemo(() => {
-    const collectRings = (features: PolygonFeature[]) => {
-      const rings: number[][][] = [];
-      features.forEach((f) => {
-        const coords = f.geometry.coordinates;
-        const ring = Array.isArray(coords[0][0]) ? coords[0] : coords;
-        rings.push(ring as number[][]);
-      });
-      return rings;
-    };
-
-    const ringsA = collectRings(polygonsA);
-    const ringsB = collectRings(polygonsB);
-
     let minx = bbox.minx;
     let maxx = bbox.maxx;
     let miny = bbox.miny;
     let maxy = bbox.maxy;
-    const extendBounds = (rings: number[][][]) => {
-      rings.forEach((ring) =>
-        ring.forEach(([x, y]) => {
-          minx = Math.min(minx, x);
-          maxx = Math.max(maxx, x);
-          miny = Math.min(miny, y);
-          maxy = Math.max(maxy, y);
-        })
-      );
+    const extendBounds = ({ positions }: BinaryPolygons) => {
+      for (let i = 0; i < positions.length; i += 2) {
+        minx = Math.min(minx, positions[i]);
+        maxx = Math.max(maxx, positions[i]);
+        miny = Math.min(miny, positions[i + 1]);
+        maxy = Math.max(maxy, positions[i + 1]);
+      }
     };
-    extendBounds(ringsA);
-    extendBounds(ringsB);
+    extendBounds(polygonsA);
+    extendBounds(polygonsB);
 
-    return { minx, maxx, miny, maxy, ringsA, ringsB };
+    return { minx, maxx, miny, maxy };
   }, [polygonsA, polygonsB, bbox]);
 
   // 坐标转换函数
@@ -111,25 +107,28 @@ function CanvasPreview({
     ctx.fillStyle = "#fcfcfc";
     ctx.fillRect(0, 0, width, height);
 
-    const drawRings = (rings: number[][][], stroke: string, fill: string) => {
-      rings.forEach((ring) => {
+    const drawPolygons = ({ positions, ringOffsets, partOffsets }: BinaryPolygons, stroke: string, fill: string) => {
+      for (let p = 0; p + 1 < partOffsets.length; p++) {
         ctx.beginPath();
-        ring.forEach(([x, y], idx) => {
-          const [px, py] = toPx(x, y);
-          if (idx === 0) ctx.moveTo(px, py);
-          else ctx.lineTo(px, py);
-        });
-        ctx.closePath();
+        // 外环与内环依次成为子路径，evenodd 填充留出洞
+        for (let r = partOffsets[p]; r < partOffsets[p + 1]; r++) {
+          for (let i = ringOffsets[r]; i < ringOffsets[r + 1]; i++) {
+            const [px, py] = toPx(positions[i * 2], positions[i * 2 + 1]);
+            if (i === ringOffsets[r]) ctx.moveTo(px, py);
+            else ctx.lineTo(px, py);
+          }
+          ctx.closePath();
+        }
         ctx.fillStyle = fill;
         ctx.strokeStyle = stroke;
         ctx.lineWidth = 1.2 / viewState.scale;
-        ctx.fill();
+        ctx.fill("evenodd");
         ctx.stroke();
-      });
+      }
     };
 
-    drawRings(dataBounds.ringsA, "rgba(220,20,60,0.9)", "rgba(220,20,60,0.25)");
-    drawRings(dataBounds.ringsB, "rgba(34,139,34,0.9)", "rgba(34,139,34,0.25)");
+    drawPolygons(polygonsA, "rgba(220,20,60,0.9)", "rgba(220,20,60,0.25)");
+    drawPolygons(polygonsB, "rgba(34,139,34,0.9)", "rgba(34,139,34,0.25)");
 
     // draw bbox
     ctx.beginPath();
@@ -149,7 +148,7 @@ function CanvasPreview({
     ctx.setLineDash([6, 4]);
     ctx.stroke();
     ctx.setLineDash([]);
-  }, [dataBounds, bbox, width, height, viewState, toPx]);
+  }, [dataBounds, polygonsA, polygonsB, bbox, width, height, viewState, toPx]);
 
   // 鼠标事件处理
   const handleWheel = (e: React.WheelEvent) => {
@@ -292,19 +291,23 @@ export default function App() {
   const [bbox, setBbox] = useState<BBox>({ ...GLOBAL_BOUNDS });
   const [taskId, setTaskId] = useState<string>();
   const [taskStatus, setTaskStatus] = useState<string>();
+  const [taskProgress, setTaskProgress] = useState<TaskProgress | null>();
   const [result, setResult] = useState<any>();
   const [statsGlobal, setStatsGlobal] = useState<any>();
   const [statsBBox, setStatsBBox] = useState<any>();
-  const [polygonsA, setPolygonsA] = useState<PolygonFeature[]>([]);
-  const [polygonsB, setPolygonsB] = useState<PolygonFeature[]>([]);
-  const pollingRef = useRef<number>();
+  const [polygonsA, setPolygonsA] = useState<BinaryPolygons>(EMPTY_POLYGONS);
+  const [polygonsB, setPolygonsB] = useState<BinaryPolygons>(EMPTY_POLYGONS);
+  // WebGL 视图使用按缩放级别简化的二进制瓦片
+  const [tilesA, setTilesA] = useState<BinaryPolygons>(EMPTY_POLYGONS);
+  const [tilesB, setTilesB] = useState<BinaryPolygons>(EMPTY_POLYGONS);
+  const unwatchRef = useRef<() => void>();
   const [glError, setGlError] = useState(() => !detectWebglSupport());
   // 默认使用 Canvas，必要时可切换 WebGL
   const [useCanvas, setUseCanvas] = useState(true);
 
   useEffect(() => {
     return () => {
-      if (pollingRef.current) window.clearInterval(pollingRef.current);
+      unwatchRef.current?.();
     };
   }, []);
 
@@ -313,6 +316,12 @@ export default function App() {
     if (glError) setUseCanvas(true);
   }, [glError]);
 
+  // 切换渲染模式时丢弃瓦片，WebGL 视图不再显示其他模式下加载前的旧瓦片
+  useEffect(() => {
+    setTilesA(EMPTY_POLYGONS);
+    setTilesB(EMPTY_POLYGONS);
+  }, [useCanvas, glError]);
+
   const handleUpload = async () => {
     if (!uploadA.file || !uploadB.file) {
       message.error("请同时选择两个数据集文件");
@@ -340,17 +349,20 @@ export default function App() {
     const res = await createTask(payload);
     setTaskId(res.task_id);
     setTaskStatus(res.status);
-    pollingRef.current = window.setInterval(async () => {
-      const r = await getTask(res.task_id);
-      setTaskStatus(r.status);
-      if (r.status === "DONE") {
-        setResult(r.result);
-        if (pollingRef.current) window.clearInterval(pollingRef.current);
-      }
-      if (r.status === "FAILED") {
-        if (pollingRef.current) window.clearInterval(pollingRef.current);
-      }
-    }, 1500);
+    setTaskProgress(null);
+    unwatchRef.current?.();
+    unwatchRef.current = watchTask(res.task_id, (task) => {
+      setTaskStatus(task.status);
+      setTaskProgress(task.progress);
+      if (task.status === "DONE") setResult(task.result);
+      if (task.status === "FAILED") message.error(task.error || "计算失败");
+    });
+  };
+
+  const handleCancel = async () => {
+    if (!taskId) return;
+    const res = await cancelTask(taskId);
+    setTaskStatus(res.status);
   };
 
   const handleStatsGlobal = async () => {
@@ -382,13 +394,23 @@ export default function App() {
   const handleLoadPolygons = async () => {
     const hide = message.loading("加载数据...");
     try {
+      if (!useCanvas && !glError) {
+        const [ta, tb] = await Promise.all([
+          getTilePolygons(uploadA.prefix, bbox),
+          getTilePolygons(uploadB.prefix, bbox),
+        ]);
+        setTilesA(ta);
+        setTilesB(tb);
+        message.success(`已加载瓦片 A:${ta.ids.length} / B:${tb.ids.length}`);
+        return;
+      }
       const [fa, fb] = await Promise.all([
-        getPolygons(uploadA.prefix, bbox, 4000),
-        getPolygons(uploadB.prefix, bbox, 4000),
+        getPolygonsBinary(uploadA.prefix, bbox, 4000),
+        getPolygonsBinary(uploadB.prefix, bbox, 4000),
       ]);
-      setPolygonsA(fa.features);
-      setPolygonsB(fb.features);
-      message.success(`已加载 A:${fa.count} / B:${fb.count}`);
+      setPolygonsA(fa);
+      setPolygonsB(fb);
+      message.success(`已加载 A:${fa.ids.length} / B:${fb.ids.length}`);
     } catch (e: any) {
       message.error(e?.message || "加载失败");
     } finally {
@@ -397,17 +419,35 @@ export default function App() {
   };
 
   const layers = useMemo(() => {
-    const toDeck = (features: PolygonFeature[], color: [number, number, number, number]) =>
-      new PolygonLayer({
+    // 没有内环时，解码后的类型化数组直接作为 Deck.gl 二进制 data（每个部件一个环），不逐要素构造对象；
+    // 二进制模式不支持内环，含内环的数据退回按部件取 {positions, holeIndices} 的访问器，洞才能正确留空
+    const toDeck = (polys: BinaryPolygons, color: [number, number, number, number]) => {
+      const common = {
         id: color[0] === 220 ? "dataset-a" : "dataset-b",
-        data: features,
         pickable: true,
-        getPolygon: (d) => d.geometry.coordinates,
+        positionFormat: "XY" as const,
         getFillColor: color,
-        getLineColor: [40, 40, 40, 220],
-        lineWidthUnits: "pixels",
+        getLineColor: [40, 40, 40, 220] as [number, number, number, number],
+        lineWidthUnits: "pixels" as const,
         lineWidthMinPixels: 1.2,
+      };
+      if (hasHoles(polys)) {
+        return new PolygonLayer<unknown>({
+          ...common,
+          data: { length: polys.partFeature.length },
+          getPolygon: (_: unknown, { index }: { index: number }) => partPolygon(polys, index),
+        });
+      }
+      return new PolygonLayer({
+        ...common,
+        data: {
+          length: polys.ringOffsets.length - 1,
+          startIndices: polys.ringOffsets,
+          attributes: { getPolygon: { value: polys.positions, size: 2 } },
+        } as any,
+        _normalize: false,
       });
+    };
     const bboxFeature = {
       id: "bbox",
       geometry: {
@@ -435,11 +475,11 @@ export default function App() {
       dashJustified: true,
     });
     return [
-      toDeck(polygonsA, [220, 20, 60, 190]),
-      toDeck(polygonsB, [34, 139, 34, 190]),
+      toDeck(tilesA.ids.length ? tilesA : polygonsA, [220, 20, 60, 190]),
+      toDeck(tilesB.ids.length ? tilesB : polygonsB, [34, 139, 34, 190]),
       bboxLayer,
     ];
-  }, [polygonsA, polygonsB, bbox]);
+  }, [polygonsA, polygonsB, tilesA, tilesB, bbox]);
 
   const center = {
     x: (bbox.minx + bbox.maxx) / 2,
@@ -455,9 +495,16 @@ export default function App() {
           ? "error"
           : taskStatus === "RUNNING"
           ? "processing"
+          : taskStatus === "CANCELLED"
+          ? "warning"
           : "default"
       }
-      text={`${taskStatus || "未开始"}`}
+      text={
+        taskStatus === "RUNNING" && taskProgress
+          ? `RUNNING ${taskProgress.cells_done}/${taskProgress.cells_total}` +
+            (taskProgress.eta_seconds != null ? ` · 剩余约 ${Math.ceil(taskProgress.eta_seconds)}s` : "")
+          : `${taskStatus || "未开始"}`
+      }
     />
   );
 
@@ -624,6 +671,11 @@ export default function App() {
                     <Button type="primary" icon={<PlayCircleOutlined />} onClick={handleCompute} block>
                       执行计算
                     </Button>
+                    {(taskStatus === "PENDING" || taskStatus === "RUNNING") && (
+                      <Button danger onClick={handleCancel} block>
+                        取消计算
+                      </Button>
+                    )}
                     <Button icon={<ReloadOutlined />} onClick={handleLoadPolygons} block>
                       刷新视图
                     </Button>
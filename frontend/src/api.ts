@@ -1,5 +1,5 @@
 import axios from "axios";
-import { BBox, TaskCreatePayload } from "./types";
+import { BBox, BinaryPolygons, TaskCreatePayload, TaskState } from "./types";
 
 const client = axios.create({
   baseURL: "/",
@@ -30,6 +30,50 @@ export async function getTask(taskId: string) {
   return res.data;
 }
 
+export async function cancelTask(taskId: string) {
+  const res = await client.post(`/api/tasks/${taskId}/cancel`);
+  return res.data;
+}
+
+const FINISHED_STATUS = ["DONE", "FAILED", "CANCELLED"];
+
+// 订阅任务状态与进度（SSE），EventSource 不可用或连接出错时退回轮询；返回取消订阅函数
+export function watchTask(taskId: string, onUpdate: (task: TaskState) => void, pollMs = 1500) {
+  let closed = false;
+  let timer: number | undefined;
+  let source: EventSource | undefined;
+  const poll = async () => {
+    if (closed) return;
+    try {
+      const task: TaskState = await getTask(taskId);
+      onUpdate(task);
+      if (FINISHED_STATUS.includes(task.status)) return;
+    } catch {
+      // 忽略单次轮询失败
+    }
+    timer = window.setTimeout(poll, pollMs);
+  };
+  if (typeof EventSource === "undefined") {
+    poll();
+  } else {
+    source = new EventSource(`/api/tasks/${taskId}/events`);
+    source.onmessage = (evt) => {
+      const task: TaskState = JSON.parse(evt.data);
+      onUpdate(task);
+      if (FINISHED_STATUS.includes(task.status)) source?.close();
+    };
+    source.onerror = () => {
+      source?.close();
+      poll();
+    };
+  }
+  return () => {
+    closed = true;
+    source?.close();
+    if (timer) window.clearTimeout(timer);
+  };
+}
+
 export async function getResult(taskId: string) {
   const res = await client.get(`/api/results/${taskId}`);
   return res.data;
@@ -41,6 +85,13 @@ export async function getPolygons(dataset: string, bbox: BBox, limit = 3000) {
   return res.data;
 }
 
+// 二进制响应：不经过 JSON 解析，坐标直接为 Float32Array（format=arrow 仅供其他客户端使用，前端不解析）
+export async function getPolygonsBinary(dataset: string, bbox: BBox, limit = 3000) {
+  const params = { dataset, limit, format: "binary", ...bbox };
+  const res = await client.get("/api/regions/polygons", { params, responseType: "arraybuffer" });
+  return decodePolygons(res.data);
+}
+
 export async function getRegionStats(dataset_a: string, dataset_b: string, bbox?: BBox) {
   const params: any = { dataset_a, dataset_b };
   if (bbox) {
@@ -53,3 +104,140 @@ export async function getRegionStats(dataset_a: string, dataset_b: string, bbox?
   return res.data;
 }
 
+
+// 瓦片世界范围由后端按数据集 manifest 给出（见 tiles.py 的 tile_world），y 向上递增
+export type TileWorld = { bounds: [number, number, number, number]; max_zoom: number };
+
+export async function getTileWorld(dataset: string): Promise<TileWorld> {
+  const res = await client.get(`/api/tiles/${encodeURIComponent(dataset)}/world`);
+  return res.data;
+}
+
+export function tilesForBBox(bbox: BBox, world: TileWorld, tilesPerSide = 4) {
+  const [wminx, wminy, wmaxx] = world.bounds;
+  const span = Math.max(bbox.maxx - bbox.minx, bbox.maxy - bbox.miny, 1e-9);
+  const z = Math.max(0, Math.min(world.max_zoom, Math.floor(Math.log2(((wmaxx - wminx) * tilesPerSide) / span)) - 1));
+  const size = (wmaxx - wminx) / 2 ** z;
+  // 只请求世界范围内的瓦片（后端对 [0, 2^z) 之外的 x/y 返回 404）
+  const clamp = (v: number) => Math.max(0, Math.min(2 ** z - 1, Math.floor(v)));
+  const x0 = clamp((bbox.minx - wminx) / size);
+  const x1 = clamp((bbox.maxx - wminx) / size);
+  const y0 = clamp((bbox.miny - wminy) / size);
+  const y1 = clamp((bbox.maxy - wminy) / size);
+  const tiles: [number, number, number][] = [];
+  for (let x = x0; x <= x1; x++) for (let y = y0; y <= y1; y++) tiles.push([z, x, y]);
+  return tiles;
+}
+
+export const EMPTY_POLYGONS: BinaryPolygons = {
+  ids: [],
+  areas: new Float64Array(0),
+  positions: new Float32Array(0),
+  ringOffsets: new Uint32Array(1),
+  partOffsets: new Uint32Array(1),
+  partFeature: new Uint32Array(0),
+};
+
+// 解析 polygon_codec.py 的扁平二进制格式（瓦片与 polygons?format=binary 共用）：各数组为缓冲区上的视图，不复制
+export function decodePolygons(buf: ArrayBuffer): BinaryPolygons {
+  const [nFeatures, nParts, nRings, nCoords] = new Uint32Array(buf, 0, 4);
+  let offset = 16;
+  const areas = new Float64Array(buf, offset, nFeatures);
+  offset += nFeatures * 8;
+  const positions = new Float32Array(buf, offset, nCoords * 2);
+  offset += nCoords * 8;
+  const ringOffsets = new Uint32Array(buf, offset, nRings + 1);
+  offset += (nRings + 1) * 4;
+  const partOffsets = new Uint32Array(buf, offset, nParts + 1);
+  offset += (nParts + 1) * 4;
+  const partFeature = new Uint32Array(buf, offset, nParts);
+  offset += nParts * 4;
+  const ids = nFeatures ? new TextDecoder().decode(new Uint8Array(buf, offset)).split("\n") : [];
+  return { ids, areas, positions, ringOffsets, partOffsets, partFeature };
+}
+
+// 是否有带内环的部件（环数多于部件数）
+export function hasHoles(polys: BinaryPolygons) {
+  return polys.ringOffsets.length > polys.partOffsets.length;
+}
+
+// 第 p 个部件的扁平坐标（缓冲区视图）与内环起始点号
+export function partPolygon({ positions, ringOffsets, partOffsets }: BinaryPolygons, p: number) {
+  const r0 = partOffsets[p];
+  const r1 = partOffsets[p + 1];
+  const start = ringOffsets[r0];
+  const holeIndices: number[] = [];
+  for (let r = r0 + 1; r < r1; r++) holeIndices.push(ringOffsets[r] - start);
+  return { positions: positions.subarray(start * 2, ringOffsets[r1] * 2), holeIndices };
+}
+
+// 合并多个解码结果，按 id 去重（同一要素的部件在每个结果中相邻，保留第一次出现的）
+export function mergePolygons(list: BinaryPolygons[]): BinaryPolygons {
+  const seen = new Set<string>();
+  const keep: [BinaryPolygons, number, number][] = []; // (来源, 起始部件, 结束部件)
+  let nParts = 0;
+  let nRings = 0;
+  let nCoords = 0;
+  for (const src of list) {
+    let p = 0;
+    while (p < src.partFeature.length) {
+      const f = src.partFeature[p];
+      let q = p;
+      while (q < src.partFeature.length && src.partFeature[q] === f) q++;
+      if (!seen.has(src.ids[f])) {
+        seen.add(src.ids[f]);
+        keep.push([src, p, q]);
+        nParts += q - p;
+        nRings += src.partOffsets[q] - src.partOffsets[p];
+        nCoords += src.ringOffsets[src.partOffsets[q]] - src.ringOffsets[src.partOffsets[p]];
+      }
+      p = q;
+    }
+  }
+
+  const out: BinaryPolygons = {
+    ids: [],
+    areas: new Float64Array(keep.length),
+    positions: new Float32Array(nCoords * 2),
+    ringOffsets: new Uint32Array(nRings + 1),
+    partOffsets: new Uint32Array(nParts + 1),
+    partFeature: new Uint32Array(nParts),
+  };
+  let part = 0;
+  let ring = 0;
+  let coord = 0;
+  keep.forEach(([src, p, q], f) => {
+    out.ids.push(src.ids[src.partFeature[p]]);
+    out.areas[f] = src.areas[src.partFeature[p]];
+    const r0 = src.partOffsets[p];
+    const r1 = src.partOffsets[q];
+    const c0 = src.ringOffsets[r0];
+    const c1 = src.ringOffsets[r1];
+    out.positions.set(src.positions.subarray(c0 * 2, c1 * 2), coord * 2);
+    for (let r = r0; r < r1; r++) out.ringOffsets[ring + r - r0] = coord + src.ringOffsets[r] - c0;
+    for (let k = p; k < q; k++) {
+      out.partOffsets[part + k - p] = ring + src.partOffsets[k] - r0;
+      out.partFeature[part + k - p] = f;
+    }
+    part += q - p;
+    ring += r1 - r0;
+    coord += c1 - c0;
+  });
+  out.ringOffsets[ring] = coord;
+  out.partOffsets[part] = ring;
+  return out;
+}
+
+export async function getTile(dataset: string, z: number, x: number, y: number) {
+  const res = await client.get(`/api/tiles/${encodeURIComponent(dataset)}/${z}/${x}/${y}.bin`, {
+    responseType: "arraybuffer",
+  });
+  return decodePolygons(res.data);
+}
+
+// 加载覆盖 bbox 的全部瓦片；跨瓦片的多边形按 id 去重
+export async function getTilePolygons(dataset: string, bbox: BBox) {
+  const world = await getTileWorld(dataset);
+  const tiles = await Promise.all(tilesForBBox(bbox, world).map(([z, x, y]) => getTile(dataset, z, x, y)));
+  return mergePolygons(tiles);
+}
@@ -7,6 +7,26 @@ export type TaskCreatePayload = {
   grids?: string[];
 };
 
+// 任务进度（见后端 parti2_local.JoinProgress.snapshot）
+export type TaskProgress = {
+  cells_done: number;
+  cells_total: number;
+  pairs_tested: number;
+  polygons_done: number;
+  polygons_total: number;
+  polygons_per_sec: number;
+  elapsed_seconds: number;
+  eta_seconds: number | null;
+};
+
+export type TaskState = {
+  task_id: string;
+  status: string;
+  error?: string | null;
+  result?: any;
+  progress?: TaskProgress | null;
+};
+
 export type PolygonFeature = {
   id: string | number;
   area: number;
@@ -16,3 +36,15 @@ export type PolygonFeature = {
   };
 };
 
+
+// 二进制响应（瓦片 / polygons?format=binary）解码后的列式数组，不逐要素构造对象：
+// positions 为全部环的扁平 [x, y, ...] 坐标，ringOffsets 为每个环的起始点号，
+// partOffsets 为每个多边形部件的起始环号（第一个环为外环），partFeature 为部件所属要素
+export type BinaryPolygons = {
+  ids: string[];
+  areas: Float64Array;
+  positions: Float32Array;
+  ringOffsets: Uint32Array;
+  partOffsets: Uint32Array;
+  partFeature: Uint32Array;
+};
@@ -1,18 +1,32 @@
 """
-Generate two synthetic polygon datasets (A and B), each with 100 polygons.
-Polygons are axis-aligned squares within a 0~15 extent, and B is slightly
-shifted from A so every pair overlaps.
+Generate two synthetic polygon datasets (A and B).
 
-Output:
-- dataset_a.csv
-- dataset_b.csv
+Without arguments: 100 axis-aligned squares each within a 0~15 extent, B slightly
+shifted from A so every pair overlaps (dataset_a_test.csv / dataset_b_test.csv).
+
+With --rows: scalable workloads for benchmarking (see generate_datasets), with
+controllable clustering, vertex count, A/B overlap ratio and the share of
+polygons straddling grid cell boundaries. Rows are generated and written in
+chunks, so 10^7 polygons fit in bounded memory.
+
+    python generate_synthetic_datasets.py --rows 1000000 --clusters 16 --vertices 12 \
+        --overlap 0.5 --crossing 0.1 --out-a bench_a.csv --out-b bench_b.csv
 
 Schema: id, geometry (WKT)
 """
 
+import argparse
 import csv
 from pathlib import Path
-from typing import Iterable, Tuple
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from partition_layout import GLOBAL_BOUNDS, NUM_DIVISIONS
+
+GENERATE_CHUNK_ROWS = 100_000
 
 
 def square_wkt(center: Tuple[float, float], size: float) -> str:
@@ -48,7 +62,111 @@ def write_dataset(path: Path, rows: Iterable[Tuple[str, str]]):
         writer.writerows(rows)
 
 
-def main():
+def sample_centers(rng: np.random.Generator, n: int, hubs: np.ndarray, spread: float, bounds=GLOBAL_BOUNDS):
+    """
+    Polygon centers, shape (n, 2). Without hubs the layout is uniform; otherwise
+    points are drawn around a random hub with a normal spread of `spread` * extent
+    width, clipped to bounds.
+    """
+    minx, miny, maxx, maxy = bounds
+    lo, hi = np.array([minx, miny]), np.array([maxx, maxy])
+    if not len(hubs):
+        return rng.uniform(lo, hi, (n, 2))
+    pts = hubs[rng.integers(len(hubs), size=n)] + rng.normal(0.0, spread * (maxx - minx), (n, 2))
+    return np.clip(pts, lo, hi)
+
+
+def snap_to_cell_edges(rng: np.random.Generator, centers: np.ndarray, fraction: float, bounds=GLOBAL_BOUNDS):
+    """Move `fraction` of the centers onto the nearest interior 5x5 grid line so they cross cell boundaries."""
+    minx, miny, maxx, maxy = bounds
+    pick = rng.random(len(centers)) < fraction
+    if not pick.any():
+        return centers
+    centers = centers.copy()
+    axis = rng.integers(2, size=int(pick.sum()))
+    origin = np.where(axis == 0, minx, miny)
+    size = np.where(axis == 0, (maxx - minx), (maxy - miny)) / NUM_DIVISIONS
+    vals = centers[pick, axis]
+    k = np.clip(np.round((vals - origin) / size), 1, NUM_DIVISIONS - 1)
+    centers[np.flatnonzero(pick), axis] = origin + k * size
+    return centers
+
+
+def random_polygons(rng: np.random.Generator, centers: np.ndarray, radius: float, vertices: int) -> np.ndarray:
+    """
+    Star-shaped simple polygons: `vertices` (>= 3) jittered angles around each center with jittered radii.
+    Consecutive angles are less than pi apart, so the center stays inside and the ring never self-intersects.
+    """
+    n = len(centers)
+    step = 2 * np.pi / vertices
+    angles = (np.arange(vertices) + rng.uniform(0.0, 0.5, (n, vertices))) * step
+    radii = radius * rng.uniform(0.5, 1.0, (n, 1)) * rng.uniform(0.7, 1.0, (n, vertices))
+    ring = np.stack(
+        [centers[:, :1] + radii * np.cos(angles), centers[:, 1:] + radii * np.sin(angles)], axis=-1
+    )
+    return shapely.polygons(np.concatenate([ring, ring[:, :1]], axis=1))
+
+
+def generate_datasets(
+    path_a: str,
+    path_b: str,
+    rows: int,
+    clusters: int = 0,
+    spread: float = 0.03,
+    vertices: int = 8,
+    overlap: float = 0.5,
+    crossing: float = 0.05,
+    radius: Optional[float] = None,
+    seed: int = 0,
+    chunk_rows: int = GENERATE_CHUNK_ROWS,
+) -> dict:
+    """
+    Write `rows` polygons to each of path_a / path_b (ids A0.. / B0..).
+    - clusters / spread: number of cluster hubs (0 = uniform) and their spread (see sample_centers);
+    - vertices: vertices per polygon (at least 3);
+    - overlap: share of B polygons placed next to their A counterpart (the rest are independent);
+    - crossing: share of polygons moved onto a 5x5 grid line (replicated into several cells);
+    - radius: polygon radius, default about half the mean spacing of the centers.
+    The output is fully determined by the arguments. Returns the parameters used.
+    """
+    if vertices < 3:
+        raise ValueError("vertices must be at least 3")
+    minx, miny, maxx, maxy = GLOBAL_BOUNDS
+    if radius is None:
+        # area covered by the centers: the whole extent, or 2*pi*sigma^2 per hub (peak density of the normal spread)
+        covered = (maxx - minx) * (maxy - miny)
+        if clusters > 0:
+            covered = min(covered, clusters * 2 * np.pi * (spread * (maxx - minx)) ** 2)
+        radius = 0.5 * float(np.sqrt(covered / max(rows, 1)))
+    rng = np.random.default_rng(seed)
+    hubs = rng.uniform((minx, miny), (maxx, maxy), (max(clusters, 0), 2))
+    for start in range(0, rows, chunk_rows):
+        n = min(chunk_rows, rows - start)
+        centers_a = snap_to_cell_edges(rng, sample_centers(rng, n, hubs, spread), crossing)
+        centers_b = snap_to_cell_edges(rng, sample_centers(rng, n, hubs, spread), crossing)
+        near = rng.random(n) < overlap
+        centers_b[near] = centers_a[near] + rng.normal(0.0, 0.5 * radius, (int(near.sum()), 2))
+        for path, prefix, centers in ((path_a, "A", centers_a), (path_b, "B", centers_b)):
+            geoms = random_polygons(rng, centers, radius, vertices)
+            pd.DataFrame(
+                {
+                    "id": [f"{prefix}{i}" for i in range(start, start + n)],
+                    "geometry": shapely.to_wkt(geoms, rounding_precision=6),
+                }
+            ).to_csv(path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+    return {
+        "rows": rows,
+        "clusters": clusters,
+        "spread": spread,
+        "vertices": vertices,
+        "overlap": overlap,
+        "crossing": crossing,
+        "radius": radius,
+        "seed": seed,
+    }
+
+
+def write_test_datasets():
     count = 100
     size_a = 0.9
     size_b = 0.9
@@ -70,6 +188,37 @@ def main():
     print("✅ Generated dataset_a.csv and dataset_b.csv with 100 polygons each, all overlapping.")
 
 
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic polygon datasets A and B")
+    parser.add_argument("--rows", type=int, help="polygons per dataset; omit for the 100-square test datasets")
+    parser.add_argument("--clusters", type=int, default=0)
+    parser.add_argument("--spread", type=float, default=0.03)
+    parser.add_argument("--vertices", type=int, default=8)
+    parser.add_argument("--overlap", type=float, default=0.5)
+    parser.add_argument("--crossing", type=float, default=0.05)
+    parser.add_argument("--radius", type=float)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out-a", default="dataset_a.csv")
+    parser.add_argument("--out-b", default="dataset_b.csv")
+    args = parser.parse_args()
+    if args.rows is None:
+        write_test_datasets()
+        return
+    params = generate_datasets(
+        args.out_a,
+        args.out_b,
+        args.rows,
+        args.clusters,
+        args.spread,
+        args.vertices,
+        args.overlap,
+        args.crossing,
+        args.radius,
+        args.seed,
+    )
+    print(f"✅ Generated {args.out_a} and {args.out_b}: {params}")
+
+
 if __name__ == "__main__":
     main()
 
@@ -1,23 +1,68 @@
+import asyncio
+import json
 import os
-import uuid
+import socket
 import threading
+from contextlib import asynccontextmanager
 from typing import Optional, List
 
-import pandas as pd
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Form
+import numpy as np
+import shapely
+from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Form, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from shapely import wkt
-from shapely.errors import WKTReadingError
 
-from parti1_local import partition_file, PARTITION_DIR, UPLOAD_DIR
-from parti2_local import jaccard_local, filter_bbox
+from parti1_local import partition_file, update_dataset, PARTITION_DIR, UPLOAD_DIR
+from metrics import PROMETHEUS_MEDIA_TYPE, REGISTRY
+from partition_cache import PARTITION_CACHE
+from parti2_local import iter_pairs, load_partition, owned_rows, plan_tasks
+from partition_layout import QUADTREE_MAX_PER_CELL, bbox_intersects, load_layout
+from partition_store import dataset_version, list_grids, partition_path
+from polygon_codec import ARROW_MEDIA_TYPE, FLAT_MEDIA_TYPE, encode_arrow, encode_polygons
+from task_store import FINISHED, open_task_store
+from task_worker import compute_request, run_task, run_worker
+from tiles import MAX_ZOOM, get_tile, tile_world
 
-app = FastAPI(title="Local Spatial Jaccard")
+# 任务队列与结果存储（默认 SQLite，见 task_store）；TASK_INLINE=0 时由独立的 task_worker 进程执行
+TASK_STORE = open_task_store()
+TASK_INLINE = os.environ.get("TASK_INLINE", "1") != "0"
 
-# 简单内存任务表
-TASKS = {}
-RESULTS = {}
-LOCK = threading.Lock()
+UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+TASK_EVENT_SECONDS = 0.5  # SSE 进度推送的轮询间隔
+TASK_SHUTDOWN_SECONDS = 5.0  # 关闭时等待后台任务线程退出的最长秒数
+
+
+def inline_worker_name() -> str:
+    """API 进程内执行任务时记录的 worker 名（心跳与结果写入按此判断任务归属）"""
+    return f"api:{socket.gethostname()}:{os.getpid()}"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    TASK_INLINE 时在后台线程中消费任务队列：重启前遗留的 PENDING 任务与心跳超时重新排队的 RUNNING 任务
+    不会一直挂起；关闭时通知线程在当前任务结束后退出
+    """
+    stop = threading.Event()
+    thread = None
+    if TASK_INLINE:
+        thread = threading.Thread(
+            target=run_worker,
+            kwargs={"store": TASK_STORE, "worker": inline_worker_name(), "metrics_port": 0, "stop": stop},
+            daemon=True,
+        )
+        thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        if thread is not None:
+            await run_in_threadpool(thread.join, TASK_SHUTDOWN_SECONDS)
+
+
+app = FastAPI(title="Local Spatial Jaccard", lifespan=lifespan)
 
 
 class BBox(BaseModel):
@@ -32,188 +77,266 @@ class TaskCreate(BaseModel):
     dataset_b: str
     bbox: Optional[BBox] = None
     grids: Optional[List[str]] = None  # 指定 grid_id 列表；为空则自动按交集网格
+    profile: bool = False  # 采样分析本任务，结果附带折叠栈（见 GET /api/results/{task_id}/profile）
 
 
 @app.post("/api/datasets/upload")
-async def upload_dataset(prefix: str = Form(...), file: UploadFile = File(...)):
-    """上传 CSV 并分块到 partitioned_data/{prefix}"""
+async def upload_dataset(
+    prefix: str = Form(...),
+    file: UploadFile = File(...),
+    layout: str = Form("grid"),
+    max_per_cell: int = Form(QUADTREE_MAX_PER_CELL),
+):
+    """上传 CSV 并分块到 partitioned_data/{prefix}；layout 为 grid（固定 5x5）或 quadtree（按数据自适应）"""
+    filepath = await _save_upload(prefix, file)
+    # 分块计算在线程池中执行，避免阻塞事件循环
+    try:
+        part_dir = await run_in_threadpool(
+            partition_file, filepath, prefix, layout=layout, max_per_cell=max_per_cell
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"prefix": prefix, "path": part_dir, "layout": layout}
+
+
+@app.post("/api/datasets/{prefix}/update")
+async def update_dataset_rows(prefix: str, file: UploadFile = File(...), mode: str = Form("append")):
+    """
+    增量更新数据集：mode 为 append（追加）、upsert（按 id 替换）或 delete（按 id 删除，CSV 只需 id 列）。
+    只重写受影响的网格，之后的统计只重算这些网格涉及的网格对。
+    """
+    filepath = await _save_upload(prefix, file)
+    try:
+        return await run_in_threadpool(update_dataset, filepath, prefix, mode=mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def _save_upload(prefix: str, file: UploadFile) -> str:
     os.makedirs(UPLOAD_DIR, exist_ok=True)
     filepath = os.path.join(UPLOAD_DIR, f"{prefix}_{file.filename}")
+    # 分块写盘，不把整个上传文件读进内存
     with open(filepath, "wb") as f:
-        f.write(await file.read())
-    part_dir = partition_file(filepath, prefix)
-    return {"prefix": prefix, "path": part_dir}
+        while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+            f.write(chunk)
+    return filepath
 
 
 @app.post("/api/tasks")
 def create_task(body: TaskCreate, background_tasks: BackgroundTasks):
-    """创建计算任务"""
-    task_id = str(uuid.uuid4())
-    with LOCK:
-        TASKS[task_id] = {"status": "PENDING", "error": None}
-    background_tasks.add_task(run_task, task_id, body)
+    """创建计算任务（入队）；TASK_INLINE 时由本进程在后台执行"""
+    TASK_STORE.purge()
+    task_id = TASK_STORE.create(body.model_dump())
+    if TASK_INLINE:
+        background_tasks.add_task(run_inline_task, task_id)
     return {"task_id": task_id, "status": "PENDING"}
 
 
-def run_task(task_id: str, body: TaskCreate):
-    with LOCK:
-        TASKS[task_id]["status"] = "RUNNING"
-    try:
-        result = compute_stats_internal(body.dataset_a, body.dataset_b, body.bbox, body.grids)
-        with LOCK:
-            RESULTS[task_id] = result
-            TASKS[task_id]["status"] = "DONE"
-    except Exception as e:
-        with LOCK:
-            TASKS[task_id]["status"] = "FAILED"
-            TASKS[task_id]["error"] = str(e)
+def run_inline_task(task_id: str):
+    # 任务可能已被独立 worker 领取，领取失败则跳过
+    worker = inline_worker_name()
+    claimed = TASK_STORE.claim(task_id, worker=worker)
+    if claimed is not None:
+        run_task(TASK_STORE, *claimed, worker)
 
 
 @app.get("/api/tasks/{task_id}")
 def get_task(task_id: str):
-    if task_id not in TASKS:
+    task = TASK_STORE.get(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="task not found")
+    if task["result"] is None:
+        del task["result"]
+    return task
+
+
+@app.post("/api/tasks/{task_id}/cancel")
+def cancel_task(task_id: str):
+    """取消任务：排队中的任务立即取消，运行中的任务在当前网格对完成后停止"""
+    status = TASK_STORE.cancel(task_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="task not found")
+    return {"task_id": task_id, "status": status}
+
+
+@app.get("/api/tasks/{task_id}/events")
+async def task_events(task_id: str, request: Request):
+    """以 SSE 推送任务状态与进度（字段同 GET /api/tasks/{task_id}），任务结束后关闭"""
+    if await run_in_threadpool(TASK_STORE.get, task_id) is None:
         raise HTTPException(status_code=404, detail="task not found")
-    resp = {"task_id": task_id, **TASKS[task_id]}
-    if task_id in RESULTS:
-        resp["result"] = RESULTS[task_id]
-    return resp
+
+    async def events():
+        last = None
+        while not await request.is_disconnected():
+            task = await run_in_threadpool(TASK_STORE.get, task_id)
+            if task is None:
+                return
+            task.pop("request")
+            if task["result"] is None:
+                del task["result"]
+            data = json.dumps(task, ensure_ascii=False)
+            if data != last:
+                yield f"data: {data}\n\n"
+                last = data
+            if task["status"] in FINISHED:
+                return
+            await asyncio.sleep(TASK_EVENT_SECONDS)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 
 @app.get("/api/results/{task_id}")
 def get_result(task_id: str):
-    if task_id not in RESULTS:
+    task = TASK_STORE.get(task_id)
+    if task is None or task["result"] is None:
         raise HTTPException(status_code=404, detail="result not ready")
-    return RESULTS[task_id]
+    return task["result"]
 
 
-def _load_polygons(dataset: str, bbox, limit: int, grids: Optional[List[str]] = None):
-    """按 bbox 读取多边形，返回 GeoJSON 结构，带 area 和 id。"""
+@app.get("/api/results/{task_id}/profile")
+def get_result_profile(task_id: str):
+    """任务的采样折叠栈（创建任务时 profile=true），每行 "调用栈 采样次数"，可直接交给 flamegraph.pl / speedscope"""
+    task = TASK_STORE.get(task_id)
+    if task is None or task["result"] is None or "profile" not in task["result"]:
+        raise HTTPException(status_code=404, detail="profile not available")
+    return PlainTextResponse("\n".join(task["result"]["profile"]["stacks"]) + "\n")
+
+
+def _pair_stream(dataset_a: str, dataset_b: str, bbox: Optional[BBox], grids: Optional[List[str]]):
+    base_a = os.path.join(PARTITION_DIR, dataset_a)
+    base_b = os.path.join(PARTITION_DIR, dataset_b)
+    if not os.path.isdir(base_a) or not os.path.isdir(base_b):
+        raise HTTPException(status_code=404, detail="数据集不存在，请先上传并分块")
+    bbox_tuple = (bbox.minx, bbox.miny, bbox.maxx, bbox.maxy) if bbox else None
+    tasks = plan_tasks(base_a, base_b, grids, bbox_tuple)
+    frames = iter_pairs(base_a, base_b, tasks, bbox_tuple)
+    return StreamingResponse(_ndjson_pairs(frames), media_type=NDJSON_MEDIA_TYPE)
+
+
+@app.get("/api/results/{task_id}/pairs")
+def stream_result_pairs(task_id: str):
+    """
+    以 NDJSON 流式返回任务匹配到的交集对（每行 id_a, id_b, area_a, area_b, inter_area），逐网格对产出。
+    交集对取自网格对交集表，只在任务已完成且两侧数据集自计算后未变化时返回（否则 409），与任务结果一致。
+    """
+    task = TASK_STORE.get(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="task not found")
+    if task["status"] != "DONE":
+        raise HTTPException(status_code=409, detail=f"任务未完成（{task['status']}）")
+    body = TaskCreate(**task["request"])
+    base_a = os.path.join(PARTITION_DIR, body.dataset_a)
+    base_b = os.path.join(PARTITION_DIR, body.dataset_b)
+    versions = task["result"].get("dataset_versions")
+    if (
+        not os.path.isdir(base_a)
+        or not os.path.isdir(base_b)
+        or versions != {"a": dataset_version(base_a), "b": dataset_version(base_b)}
+    ):
+        raise HTTPException(status_code=409, detail="数据集在任务完成后已更新，请重新计算")
+    return _pair_stream(body.dataset_a, body.dataset_b, body.bbox, body.grids)
+
+
+@app.get("/api/regions/pairs/stream")
+def stream_region_pairs(
+    dataset_a: str,
+    dataset_b: str,
+    minx: Optional[float] = None,
+    miny: Optional[float] = None,
+    maxx: Optional[float] = None,
+    maxy: Optional[float] = None,
+    grids: Optional[str] = None,
+):
+    """以 NDJSON 流式返回指定 bbox（或全域）内的交集对，同 /api/results/{task_id}/pairs"""
+    bbox_obj = None
+    if None not in (minx, miny, maxx, maxy):
+        bbox_obj = BBox(minx=minx, miny=miny, maxx=maxx, maxy=maxy)
+    return _pair_stream(dataset_a, dataset_b, bbox_obj, grids.split(",") if grids else None)
+
+
+def _polygon_frames(dataset: str, bbox, limit: Optional[int] = None, grids: Optional[List[str]] = None):
+    """
+    按 bbox 逐网格选出多边形，返回 DataFrame（id, area, geom 等列）的生成器，合计最多 limit 行（None 不限）。
+    数据集不存在时立即抛出 ValueError（不等到开始迭代）。
+    """
     base = os.path.join(PARTITION_DIR, dataset)
     if not os.path.isdir(base):
         raise ValueError("数据集不存在，请先上传并分块")
-
-    if grids is None:
-        # 按网格 ID 排序：先按 x 再按 y，确保 0_0 排在前面
-        grid_set = {f[:-4] for f in os.listdir(base) if f.endswith(".csv")}
-        grids = sorted(grid_set, key=lambda g: tuple(map(int, g.split("_"))))
-    feats = []
-    minx, miny, maxx, maxy = bbox
-    for gid in grids:
-        path = os.path.join(base, f"{gid}.csv")
-        if not os.path.exists(path):
-            continue
-        df = pd.read_csv(path)
-        if "geometry" not in df.columns or "id" not in df.columns:
-            continue
-        for _, row in df.iterrows():
-            if len(feats) >= limit:
-                return feats
-            geom_str = str(row["geometry"]).strip().replace('"', "")
-            try:
-                geom = wkt.loads(geom_str)
-            except WKTReadingError:
+    layout, cells = load_layout(base, list_grids(base))
+    cell_ids = list(cells) if grids is None else [gid for gid in grids if gid in cells]
+
+    def frames():
+        remaining = limit
+        for gid in cell_ids:
+            if remaining is not None and remaining <= 0:
+                return
+            # manifest 中数据外包框与 bbox 不相交的网格无需打开
+            if not bbox_intersects(cells[gid].get("bbox"), bbox):
                 continue
-            bx = geom.bounds
-            if bx[2] < minx or bx[0] > maxx or bx[3] < miny or bx[1] > maxy:
+            path = partition_path(base, gid)
+            if path is None:
                 continue
-            feats.append(
-                {
-                    "id": row["id"],
-                    "area": geom.area,
-                    "geometry": geom.__geo_interface__,
-                }
-            )
-    return feats
+            # 跨网格复制的多边形只在参考点所在网格返回一次
+            df, _ = load_partition(path, bbox)
+            df = owned_rows(df, layout.cell(gid), bbox)
+            if remaining is not None:
+                df = df.iloc[:remaining]
+                remaining -= len(df)
+            if len(df):
+                yield df
 
+    return frames()
 
-def compute_stats_internal(dataset_a: str, dataset_b: str, bbox: Optional[BBox], grids: Optional[List[str]]):
-    base_a = os.path.join(PARTITION_DIR, dataset_a)
-    base_b = os.path.join(PARTITION_DIR, dataset_b)
-    if not os.path.isdir(base_a) or not os.path.isdir(base_b):
-        raise ValueError("数据集不存在，请先上传并分块")
 
-    grid_list = grids
-    if not grid_list:
-        grids_a = {f[:-4] for f in os.listdir(base_a) if f.endswith(".csv")}
-        grids_b = {f[:-4] for f in os.listdir(base_b) if f.endswith(".csv")}
-        # 按网格 ID 排序：先按 x 再按 y，确保 0_0 排在前面
-        grid_list = sorted(list(grids_a & grids_b), key=lambda g: tuple(map(int, g.split("_"))))
-
-    bbox_tuple = None
-    if bbox:
-        bbox_tuple = (bbox.minx, bbox.miny, bbox.maxx, bbox.maxy)
-
-    # 使用集合记录已计算过的交集对，避免重复计数
-    intersection_pairs = set()
-    total = {"area_a": 0.0, "area_b": 0.0, "area_inter": 0.0, "intersection_count": 0}
-    
-    for gid in grid_list:
-        pa = os.path.join(base_a, f"{gid}.csv")
-        pb = os.path.join(base_b, f"{gid}.csv")
-        if not (os.path.exists(pa) and os.path.exists(pb)):
-            continue
-        
-        # 加载数据并获取 id 列
-        df_a = pd.read_csv(pa)
-        df_b = pd.read_csv(pb)
-        if "id" not in df_a.columns or "id" not in df_b.columns:
-            # 如果没有 id，回退到原来的逻辑
-            res = jaccard_local(pa, pb, bbox_tuple)
-            total["area_a"] += res["area_a"]
-            total["area_b"] += res["area_b"]
-            total["area_inter"] += res["area_inter"]
-            total["intersection_count"] += res["intersection_count"]
-            continue
-        
-        # 解析几何
-        df_a["geom"] = df_a["geometry"].astype(str).str.replace('"', "").apply(wkt.loads)
-        df_b["geom"] = df_b["geometry"].astype(str).str.replace('"', "").apply(wkt.loads)
-        
-        if bbox_tuple:
-            df_a = filter_bbox(df_a, bbox_tuple)
-            df_b = filter_bbox(df_b, bbox_tuple)
-        
-        # 计算面积
-        df_a["area"] = df_a["geom"].apply(lambda g: g.area)
-        df_b["area"] = df_b["geom"].apply(lambda g: g.area)
-        total["area_a"] += df_a["area"].sum()
-        total["area_b"] += df_b["area"].sum()
-        
-        # 使用 R-tree 加速查找
-        from rtree import index
-        idx = index.Index()
-        for i, (_, row) in enumerate(df_b.iterrows()):
-            idx.insert(i, row["geom"].bounds)
-        
-        # 计算交集，使用 (id_a, id_b) 作为唯一标识
-        for _, row_a in df_a.iterrows():
-            id_a = str(row_a["id"])
-            geom_a = row_a["geom"]
-            for j in idx.intersection(geom_a.bounds):
-                row_b = df_b.iloc[j]
-                id_b = str(row_b["id"])
-                pair_key = (id_a, id_b)
-                
-                # 如果这对已经计算过，跳过
-                if pair_key in intersection_pairs:
-                    continue
-                
-                geom_b = row_b["geom"]
-                if geom_a.intersects(geom_b):
-                    inter = geom_a.intersection(geom_b)
-                    if not inter.is_empty:
-                        inter_area = inter.area
-                        total["area_inter"] += inter_area
-                        intersection_pairs.add(pair_key)
-                        total["intersection_count"] += 1
-
-    denom = total["area_a"] + total["area_b"] - total["area_inter"]
-    jacc = total["area_inter"] / denom if denom > 0 else 0.0
-    return {**total, "block_jaccard": jacc}
+def _select_polygons(dataset: str, bbox, limit: int, grids: Optional[List[str]] = None):
+    """按 bbox 选出多边形，返回 (ids, areas, geoms) 三个数组（最多 limit 个）。"""
+    frames = list(_polygon_frames(dataset, bbox, limit, grids))
+    if not frames:
+        return np.empty(0, dtype=object), np.empty(0), np.empty(0, dtype=object)
+    return (
+        np.concatenate([df["id"].to_numpy() for df in frames]),
+        np.concatenate([df["area"].to_numpy() for df in frames]),
+        np.concatenate([df["geom"].to_numpy() for df in frames]),
+    )
+
+
+def _ndjson_polygons(frames):
+    """多边形逐网格编码为 NDJSON（几何由 shapely.to_geojson 批量生成）"""
+    for df in frames:
+        geojson = shapely.to_geojson(df["geom"].to_numpy())
+        yield "".join(
+            f'{{"id":{json.dumps(str(i))},"area":{float(a)!r},"geometry":{g}}}\n'
+            for i, a, g in zip(df["id"], df["area"], geojson)
+        )
+
+
+def _ndjson_pairs(frames):
+    for df in frames:
+        yield df.to_json(orient="records", lines=True, double_precision=15).rstrip("\n") + "\n"
+
+
+def _load_polygons(dataset: str, bbox, limit: int, grids: Optional[List[str]] = None):
+    """按 bbox 读取多边形，返回 GeoJSON 结构，带 area 和 id。"""
+    ids, areas, geoms = _select_polygons(dataset, bbox, limit, grids)
+    return [
+        {
+            "id": id_val,
+            "area": area,
+            "geometry": geom.__geo_interface__,
+        }
+        for id_val, area, geom in zip(ids, areas, geoms)
+    ]
+
+
+def compute_stats_internal(dataset_a: str, dataset_b: str, bbox: Optional[BBox], grids: Optional[List[str]]):
+    return compute_request(
+        {"dataset_a": dataset_a, "dataset_b": dataset_b, "bbox": bbox.model_dump() if bbox else None, "grids": grids}
+    )
 
 
 @app.get("/api/regions/polygons")
 def get_polygons(
+    request: Request,
     dataset: str,
     minx: float,
     miny: float,
@@ -221,14 +344,74 @@ def get_polygons(
     maxy: float,
     limit: int = 5000,
     grids: Optional[str] = None,
+    format: Optional[str] = None,
 ):
     """
     拉取指定数据集在 bbox 内的多边形（用于前端渲染/缩略图），limit 默认 5000。
     grids 可传逗号分隔的 grid_id 列表，用于更快过滤。
+    format（或 Accept 头）选择响应格式：json（默认，GeoJSON 结构）、
+    binary（扁平坐标缓冲区，application/octet-stream）、arrow（Arrow IPC stream），格式见 polygon_codec。
     """
+    if format is None:
+        accept = request.headers.get("accept", "")
+        format = "arrow" if ARROW_MEDIA_TYPE in accept else "binary" if FLAT_MEDIA_TYPE in accept else "json"
+    if format not in ("json", "binary", "arrow"):
+        raise HTTPException(status_code=400, detail=f"未知的响应格式: {format}")
     grid_list = grids.split(",") if grids else None
-    feats = _load_polygons(dataset, (minx, miny, maxx, maxy), limit, grid_list)
-    return {"dataset": dataset, "count": len(feats), "features": feats}
+    if format == "json":
+        feats = _load_polygons(dataset, (minx, miny, maxx, maxy), limit, grid_list)
+        return {"dataset": dataset, "count": len(feats), "features": feats}
+    ids, areas, geoms = _select_polygons(dataset, (minx, miny, maxx, maxy), limit, grid_list)
+    if format == "arrow":
+        return Response(encode_arrow(ids, areas, geoms), media_type=ARROW_MEDIA_TYPE)
+    return Response(encode_polygons(ids, areas, geoms), media_type=FLAT_MEDIA_TYPE)
+
+
+@app.get("/api/regions/polygons/stream")
+def stream_polygons(
+    dataset: str,
+    minx: float,
+    miny: float,
+    maxx: float,
+    maxy: float,
+    limit: Optional[int] = None,
+    grids: Optional[str] = None,
+):
+    """
+    以 NDJSON 流式返回 bbox 内的多边形（每行一个 {"id", "area", "geometry"}），逐网格产出，
+    首字节时间与结果规模无关；limit 默认不限。
+    """
+    grid_list = grids.split(",") if grids else None
+    try:
+        frames = _polygon_frames(dataset, (minx, miny, maxx, maxy), limit, grid_list)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return StreamingResponse(_ndjson_polygons(frames), media_type=NDJSON_MEDIA_TYPE)
+
+
+@app.get("/api/tiles/{dataset}/world")
+def get_tile_world(dataset: str):
+    """数据集的瓦片世界范围 [minx, miny, maxx, maxy] 与最大缩放级别，前端据此计算 z/x/y"""
+    base = os.path.join(PARTITION_DIR, dataset)
+    if not os.path.isdir(base):
+        raise HTTPException(status_code=404, detail="数据集不存在，请先上传并分块")
+    return {"bounds": list(tile_world(base)), "max_zoom": MAX_ZOOM}
+
+
+@app.get("/api/tiles/{dataset}/{z}/{x}/{y}.bin")
+def get_polygon_tile(dataset: str, z: int, x: int, y: int):
+    """
+    多边形预览瓦片（按缩放级别简化、剔除亚像素多边形，二进制编码见 tiles.py），生成后缓存在磁盘。
+    """
+    if not 0 <= z <= MAX_ZOOM:
+        raise HTTPException(status_code=400, detail=f"z 需在 0..{MAX_ZOOM} 之间")
+    # 世界范围外的瓦片不生成也不缓存
+    if not (0 <= x < 2**z and 0 <= y < 2**z):
+        raise HTTPException(status_code=404, detail="瓦片超出世界范围")
+    path = get_tile(os.path.join(PARTITION_DIR, dataset), z, x, y)
+    if path is None:
+        raise HTTPException(status_code=404, detail="数据集不存在，请先上传并分块")
+    return FileResponse(path, media_type="application/octet-stream")
 
 
 @app.get("/api/regions/stats")
@@ -258,8 +441,22 @@ def get_region_stats(
     }
 
 
+@app.get("/metrics")
+def get_metrics():
+    """本进程的累计指标（Prometheus 文本格式）：分阶段耗时、候选/交集/缓存等计数、统计与任务耗时分布"""
+    return Response(REGISTRY.render(), media_type=PROMETHEUS_MEDIA_TYPE)
+
+
+@app.get("/api/cache/stats")
+def get_cache_stats():
+    """分块缓存（本进程）的命中/未命中/淘汰次数与占用字节数，用于调整 PARTITION_CACHE_MB"""
+    return PARTITION_CACHE.stats()
+
+
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    # 任务状态在 task_store 中共享，可用 API_WORKERS 启动多个 worker（多 worker 时不启用 reload）
+    api_workers = int(os.environ.get("API_WORKERS", 1))
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=api_workers == 1, workers=api_workers)
 
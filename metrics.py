@@ -0,0 +1,175 @@
+"""
+计算指标与分析：
+- JoinMetrics：一次统计的分阶段耗时与计数（读取分块、候选查询、求交、交集表读写、过滤等），随结果返回；
+- MetricsRegistry：进程级累计指标，以 Prometheus 文本格式导出（API 的 /metrics，独立 worker 见 serve_metrics）；
+- SamplingProfiler：按任务开启的采样分析器，输出折叠栈。
+
+阶段耗时为各网格对耗时之和，进程池并行时会大于墙钟时间。累计指标在每个进程内独立。
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from partition_cache import PARTITION_CACHE
+
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# 统计耗时直方图的桶上界（秒）
+SECONDS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL_MS", 5)) / 1000
+
+
+class JoinMetrics:
+    """分阶段耗时（seconds，秒）与计数（counts）；进程池任务以 to_dict 返回，由调用方 merge"""
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = defaultdict(float)
+        self.counts: Dict[str, int] = defaultdict(int)
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - t0
+
+    def count(self, name: str, n: int = 1):
+        self.counts[name] += int(n)
+
+    def merge(self, other: Dict):
+        for k, v in other.get("seconds", {}).items():
+            self.seconds[k] += v
+        for k, v in other.get("counts", {}).items():
+            self.counts[k] += v
+
+    def to_dict(self) -> Dict:
+        return {"seconds": dict(self.seconds), "counts": dict(self.counts)}
+
+
+def _labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class MetricsRegistry:
+    """进程级累计计数器（可带标签）与直方图，线程安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[tuple, float] = defaultdict(float)
+        self._hists: Dict[str, Dict] = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        with self._lock:
+            self._counters[(name, tuple(sorted(labels.items())))] += value
+
+    def observe(self, name: str, value: float, buckets=SECONDS_BUCKETS):
+        with self._lock:
+            h = self._hists.setdefault(name, {"buckets": buckets, "counts": [0] * len(buckets), "sum": 0.0, "count": 0})
+            for i, le in enumerate(h["buckets"]):
+                if value <= le:
+                    h["counts"][i] += 1
+            h["sum"] += value
+            h["count"] += 1
+
+    def record_join(self, metrics: JoinMetrics, seconds: float):
+        """累计一次统计的阶段耗时、计数与总耗时"""
+        for stage, value in metrics.seconds.items():
+            self.inc("spatial_join_stage_seconds_total", value, stage=stage)
+        for event, value in metrics.counts.items():
+            self.inc("spatial_join_events_total", value, event=event)
+        self.observe("spatial_join_seconds", seconds)
+
+    def render(self) -> str:
+        """Prometheus 文本格式，附带本进程分块缓存的状态"""
+        lines = []
+        typed = set()
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{_labels(labels)} {value!r}")
+            for name, h in sorted(self._hists.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for le, n in zip(h["buckets"], h["counts"]):
+                    lines.append(f'{name}_bucket{{le="{le}"}} {n}')
+                lines.append(f'{name}_bucket{{le="+Inf"}} {h["count"]}')
+                lines.append(f"{name}_sum {h['sum']!r}")
+                lines.append(f"{name}_count {h['count']}")
+        for key, value in PARTITION_CACHE.stats().items():
+            lines.append(f"# TYPE partition_cache_{key} gauge")
+            lines.append(f"partition_cache_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def serve_metrics(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """在后台线程用标准库 HTTP 服务导出 /metrics（独立 worker 进程使用）"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = REGISTRY.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", PROMETHEUS_MEDIA_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class SamplingProfiler:
+    """
+    采样分析器：后台线程每 interval 秒记录一次启动线程的调用栈，
+    汇总为折叠栈（"文件:函数;文件:函数 次数"，flamegraph.pl / speedscope 可直接读取）。
+    只采样进入 with 块的线程，进程池中执行的部分采样不到。
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._target: Optional[int] = None
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        self._target = threading.get_ident()
+        self._sampler = threading.Thread(target=self._run, daemon=True)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._sampler.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def collapsed(self, limit: Optional[int] = None) -> List[str]:
+        """按采样次数降序的折叠栈行"""
+        return [f"{stack} {n}" for stack, n in self.stacks.most_common(limit)]
@@ -1,15 +1,58 @@
-import csv
+import io
+import multiprocessing
 import os
 import shutil
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
 import pandas as pd
-from shapely.wkt import loads
-from shapely.errors import WKTReadingError
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+
+from byte_ranges import ByteRange, split_ranges
+from metrics import REGISTRY
+from partition_cache import PARTITION_CACHE
+from partition_layout import (
+    GLOBAL_BOUNDS,
+    NUM_DIVISIONS,
+    QUADTREE_MAX_PER_CELL,
+    GridLayout,
+    QuadtreeLayout,
+    dataset_totals,
+    load_layout,
+    write_manifest,
+)
+from partition_store import (
+    LEGACY_EXT,
+    PARTITION_EXT,
+    build_index,
+    build_table,
+    list_grids,
+    open_writer,
+    partition_stats,
+    read_partition,
+    remove_cell_pairs,
+    remove_pairs,
+)
+from tiles import invalidate_tiles
 
 # 本地路径配置
 UPLOAD_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "uploads"))
 PARTITION_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "partitioned_data"))
-GLOBAL_BOUNDS = (-120, -120, 120, 120)
-NUM_DIVISIONS = 5
+PARTITION_CHUNK_ROWS = 100_000  # 流式分块时每次读取的行数
+# 并行分块的进程数上限，可通过环境变量 INGEST_WORKERS 配置；<=1 时单进程。
+# 默认取一半核数，与连接进程池（parti2_local.JOIN_WORKERS）分享 CPU
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", max(1, (os.cpu_count() or 1) // 2)))
+# 每个进程至少分到的字节数：小文件不值得启动进程池，按文件大小决定实际进程数
+INGEST_RANGE_BYTES = int(os.environ.get("INGEST_RANGE_BYTES", 32 * 2**20))
+SHARD_DIR = "_shards"
+STAGE_NAME = "_stage"  # 自适应分块的中间文件（全部行，尚未分网格）
+QUADTREE_SAMPLE_ROWS = 200_000  # 构建四叉树时采样的外包框数
+UPDATE_MODES = ("append", "upsert", "delete")
 
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(PARTITION_DIR, exist_ok=True)
@@ -18,6 +61,8 @@ os.makedirs(PARTITION_DIR, exist_ok=True)
 def init_partition_dirs(prefix: str):
     """初始化分块目录（清空后重建）"""
     dir_path = os.path.join(PARTITION_DIR, prefix)
+    PARTITION_CACHE.invalidate(dir_path)
+    remove_pairs(PARTITION_DIR, prefix)
     if os.path.exists(dir_path):
         shutil.rmtree(dir_path)
     os.makedirs(dir_path, exist_ok=True)
@@ -36,58 +81,382 @@ def get_grid_id(geom, num_divisions: int = NUM_DIVISIONS) -> str:
     return f"{gx}_{gy}"
 
 
-def partition_file(input_path: str, prefix: str):
+def get_grid_ids(geom, num_divisions: int = NUM_DIVISIONS) -> List[str]:
+    """返回几何外包框覆盖的全部网格 ID（跨网格的多边形会复制到每个网格）"""
+    layout = GridLayout(GLOBAL_BOUNDS, num_divisions)
+    _, codes = layout.assign(np.array([geom.bounds], dtype=float))
+    return [layout.ids[c] for c in codes]
+
+
+def parse_chunk(chunk: pd.DataFrame):
+    """
+    批量解析一块 CSV：WKT -> shapely，无效几何用 buffer(0) 修复，无法解析/修复的丢弃。
+    返回 (ids, geoms, invalid_count, repaired)，repaired 为保留行中经过修复的掩码。
+    """
+    ids = chunk["id"].astype(str).str.strip().to_numpy()
+    wkts = chunk["geometry"].astype(str).str.strip().str.strip('"').str.replace('"', "").to_numpy()
+    geoms = shapely.from_wkt(wkts, on_invalid="ignore")
+    bad = shapely.is_missing(geoms)
+    need_fix = ~bad & ~shapely.is_valid(geoms)
+    if need_fix.any():
+        geoms[need_fix] = shapely.buffer(geoms[need_fix], 0)
+    bad |= ~shapely.is_valid(geoms) | shapely.is_empty(geoms)
+    for id_val in ids[bad]:
+        print(f"跳过无效几何: {id_val}")
+    return ids[~bad], geoms[~bad], int(bad.sum()), need_fix[~bad]
+
+
+def group_rows(layout, bounds: np.ndarray) -> Dict[str, np.ndarray]:
+    """按布局把外包框分配到网格，返回 {grid_id: 行号数组}（网格内保持原行序）"""
+    rows, codes = layout.assign(bounds)
+    order = np.argsort(codes, kind="stable")
+    rows, codes = rows[order], codes[order]
+    cut = np.flatnonzero(np.diff(codes)) + 1
+    return {layout.ids[codes[seg[0]]]: rows[seg] for seg in np.split(np.arange(len(rows)), cut) if len(seg)}
+
+
+def bin_chunk(ids: np.ndarray, geoms: np.ndarray, layout=None):
+    """
+    将一批几何按外包框复制到覆盖的网格，返回 {grid_id: (ids, geoms)}。
+    layout 为 None 时不分网格，全部行归入中间文件 STAGE_NAME（自适应分块的第一遍）。
+    """
+    if layout is None:
+        return {STAGE_NAME: (ids, geoms)} if len(ids) else {}
+    groups = group_rows(layout, shapely.bounds(geoms).reshape(-1, 4))
+    return {gid: (ids[r], geoms[r]) for gid, r in groups.items()}
+
+
+def ingest_range(
+    input_path: str, start: int, end: int, out_dir: str, columns: List[str], chunksize: int, layout=None
+):
+    """
+    解析并分箱 [start, end) 区间内的记录，按网格追加写到 out_dir/{grid_id}.parquet（见 bin_chunk）。
+    返回 (总行数, 无效行数, 写出的网格行数, {grid_id: path}, 修复行数, 修复后面积)。进程池任务单元。
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    writers = {}
+    total_rows = invalid_count = cell_rows = repaired_rows = 0
+    repaired_area = 0.0
+    if start >= end:
+        return total_rows, invalid_count, cell_rows, {}, repaired_rows, repaired_area
+    src = io.BufferedReader(ByteRange(input_path, start, end))
+    try:
+        reader = pd.read_csv(
+            src, header=None, names=columns, usecols=["id", "geometry"], dtype=str, chunksize=chunksize
+        )
+        for chunk in reader:
+            total_rows += len(chunk)
+            ids, geoms, bad, repaired = parse_chunk(chunk)
+            invalid_count += bad
+            repaired_rows += int(repaired.sum())
+            repaired_area += float(shapely.area(geoms[repaired]).sum())
+            for grid_id, (cell_ids, cell_geoms) in bin_chunk(ids, geoms, layout).items():
+                cell_rows += len(cell_ids)
+                if grid_id not in writers:
+                    path = os.path.join(out_dir, f"{grid_id}{PARTITION_EXT}")
+                    writers[grid_id] = (path, open_writer(path))
+                writers[grid_id][1].write_table(build_table(cell_ids, cell_geoms))
+    finally:
+        src.close()
+        for _, writer in writers.values():
+            writer.close()
+    paths = {gid: path for gid, (path, _) in writers.items()}
+    return total_rows, invalid_count, cell_rows, paths, repaired_rows, repaired_area
+
+
+def merge_shards(shards: List[Dict[str, str]], partition_dir: str) -> Dict[str, str]:
+    """按 worker 顺序把各 worker 的网格分片合并为 partition_dir/{grid_id}.parquet（保持原文件行序）"""
+    merged = {}
+    for gid in sorted({g for shard in shards for g in shard}):
+        parts = [shard[gid] for shard in shards if gid in shard]
+        target = os.path.join(partition_dir, f"{gid}{PARTITION_EXT}")
+        if len(parts) == 1:
+            os.replace(parts[0], target)
+        else:
+            writer = open_writer(target)
+            try:
+                for part in parts:
+                    pf = pq.ParquetFile(part)
+                    for i in range(pf.num_row_groups):
+                        writer.write_table(pf.read_row_group(i))
+            finally:
+                writer.close()
+        merged[gid] = target
+    return merged
+
+
+def _rate(rows: int, seconds: float) -> str:
+    return f"{rows / seconds:,.0f} rows/s" if seconds > 0 else "-"
+
+
+def scan_stage(stage_paths: List[str], valid_rows: int, sample_rows: int = QUADTREE_SAMPLE_ROWS, seed: int = 0):
+    """扫描中间文件的 bbox 列：返回 (数据范围, 采样外包框 (m, 4))，只读 4 个数值列"""
+    rng = np.random.default_rng(seed)
+    frac = min(1.0, sample_rows / max(valid_rows, 1))
+    lo = np.array([np.inf, np.inf])
+    hi = np.array([-np.inf, -np.inf])
+    samples = []
+    for path in stage_paths:
+        pf = pq.ParquetFile(path)
+        for i in range(pf.num_row_groups):
+            t = pf.read_row_group(i, columns=["minx", "miny", "maxx", "maxy"])
+            b = np.column_stack([t.column(c).to_numpy() for c in ("minx", "miny", "maxx", "maxy")])
+            lo = np.minimum(lo, b[:, :2].min(axis=0))
+            hi = np.maximum(hi, b[:, 2:].max(axis=0))
+            samples.append(b if frac >= 1.0 else b[rng.random(len(b)) < frac])
+    if not np.isfinite(lo).all():
+        return tuple(GLOBAL_BOUNDS), np.empty((0, 4))
+    return (lo[0], lo[1], hi[0], hi[1]), np.concatenate(samples)
+
+
+def split_stage(stage_paths: List[str], layout, partition_dir: str) -> Dict[str, str]:
+    """按布局把中间文件逐 row group 分配到网格并追加写出（直接搬运 WKB，不再解析几何）"""
+    writers = {}
+    try:
+        for path in stage_paths:
+            pf = pq.ParquetFile(path)
+            for i in range(pf.num_row_groups):
+                table = pf.read_row_group(i)
+                bounds = np.column_stack([table.column(c).to_numpy() for c in ("minx", "miny", "maxx", "maxy")])
+                for grid_id, rows in group_rows(layout, bounds).items():
+                    if grid_id not in writers:
+                        target = os.path.join(partition_dir, f"{grid_id}{PARTITION_EXT}")
+                        writers[grid_id] = (target, open_writer(target))
+                    writers[grid_id][1].write_table(table.take(rows))
+    finally:
+        for _, writer in writers.values():
+            writer.close()
+    return {gid: target for gid, (target, _) in writers.items()}
+
+
+def partition_file(
+    input_path: str,
+    prefix: str,
+    chunksize: int = PARTITION_CHUNK_ROWS,
+    workers: Optional[int] = None,
+    layout: str = "grid",
+    max_per_cell: int = QUADTREE_MAX_PER_CELL,
+):
     """
     将 CSV 按 grid_id 分块到 partitioned_data/{prefix} 下。
-    CSV 需包含列 id, geometry；geometry 为 WKT。
+    CSV 需包含列 id, geometry；geometry 为 WKT（每行一条记录）。
+    每个网格写出一个 Parquet 文件（WKB 几何 + area/bbox 列），见 partition_store。
+    多边形复制到其外包框覆盖的每个网格，计算时按参考点去重（见 parti2_local.reference_points）。
+    按 chunksize 行流式读取并追加写出，峰值内存与块大小相关而与文件大小无关。
+    workers > 1 且文件足够大时按字节区间切分文件（每个区间至少 INGEST_RANGE_BYTES），
+    由多个进程并行解析/分箱到各自分片后再合并；小文件直接在本进程中处理。
+
+    layout="grid"：固定范围 5x5 均匀网格；
+    layout="quadtree"：先解析到中间文件，再由数据范围与采样构建四叉树（每格约不超过 max_per_cell），
+    最后按 row group 重新分配到叶子网格。两种布局都写出 _manifest.json（见 partition_layout）。
     """
-    start_time = pd.Timestamp.now()
+    if layout not in (GridLayout.kind, QuadtreeLayout.kind):
+        raise ValueError(f"未知的分块布局: {layout}")
+    start_time = time.perf_counter()
+    header = pd.read_csv(input_path, nrows=0)
+    if "id" not in header.columns or "geometry" not in header.columns:
+        raise ValueError("CSV必须包含'id'和'geometry'列")
+    columns = list(header.columns)
+    workers = INGEST_WORKERS if workers is None else workers
+    adaptive = layout == QuadtreeLayout.kind
+    grid_layout = None if adaptive else GridLayout()
+
     partition_dir = init_partition_dirs(prefix)
-    file_handles = {}
-    total_rows = 0
-    invalid_count = 0
+    shard_root = os.path.join(partition_dir, SHARD_DIR)
+    parts = max(1, min(workers, os.path.getsize(input_path) // INGEST_RANGE_BYTES))
+    ranges = split_ranges(input_path, parts) or [(0, 0)]
 
-    df = pd.read_csv(input_path)
-    if "id" not in df.columns or "geometry" not in df.columns:
-        raise ValueError("CSV必须包含'id'和'geometry'列")
+    # 阶段 1：解析 + 校验修复 + 分箱（自适应布局时写中间文件）
+    t0 = time.perf_counter()
+    n = len(ranges)
+    if n > 1:
+        out_dirs = [os.path.join(shard_root, f"w{k}") for k in range(n)]
+        with ProcessPoolExecutor(max_workers=n, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results = list(
+                pool.map(
+                    ingest_range,
+                    [input_path] * n,
+                    [a for a, _ in ranges],
+                    [b for _, b in ranges],
+                    out_dirs,
+                    [columns] * n,
+                    [chunksize] * n,
+                    [grid_layout] * n,
+                )
+            )
+    else:
+        out_dir = os.path.join(shard_root, "w0") if adaptive else partition_dir
+        results = [ingest_range(input_path, ranges[0][0], ranges[0][1], out_dir, columns, chunksize, grid_layout)]
+    total_rows = sum(r[0] for r in results)
+    invalid_count = sum(r[1] for r in results)
+    cell_rows = sum(r[2] for r in results)
+    valid = total_rows - invalid_count
+    t_parse = time.perf_counter() - t0
 
-    for _, row in df.iterrows():
-        total_rows += 1
-        id_val = str(row["id"]).strip()
-        geom_str = str(row["geometry"]).strip().strip('"').replace('"', "")
-        try:
-            geom = loads(geom_str)
-            if not geom.is_valid:
-                geom = geom.buffer(0)
-            if not geom.is_valid:
-                raise ValueError("无法修复的无效几何")
-        except (WKTReadingError, ValueError) as e:
-            invalid_count += 1
-            print(f"跳过无效几何: {id_val} | 错误: {str(e)}")
-            continue
-
-        grid_id = get_grid_id(geom)
-        file_path = os.path.join(partition_dir, f"{grid_id}.csv")
-        if file_path not in file_handles:
-            handle = open(file_path, "w", encoding="utf-8", newline="")
-            writer = csv.writer(handle)
-            writer.writerow(["id", "geometry", "grid_id"])
-            file_handles[file_path] = (handle, writer)
-        handle, writer = file_handles[file_path]
-        writer.writerow([id_val, geom_str, grid_id])
-
-    for h, _ in file_handles.values():
-        h.close()
-    elapsed = (pd.Timestamp.now() - start_time).total_seconds()
+    # 阶段 2：合并各 worker 分片；自适应布局在此构建四叉树并重新分配
+    t0 = time.perf_counter()
+    if adaptive:
+        stage_paths = [r[3][STAGE_NAME] for r in results if STAGE_NAME in r[3]]
+        domain, sample = scan_stage(stage_paths, valid)
+        layout_obj = QuadtreeLayout.build(domain, sample, valid / max(len(sample), 1), max_per_cell)
+        paths = split_stage(stage_paths, layout_obj, partition_dir)
+        cell_rows = sum(pq.ParquetFile(p).metadata.num_rows for p in paths.values())
+    else:
+        layout_obj = grid_layout
+        paths = merge_shards([r[3] for r in results], partition_dir) if n > 1 else results[0][3]
+    shutil.rmtree(shard_root, ignore_errors=True)
+    t_merge = time.perf_counter() - t0
+
+    # 阶段 3：构建每个网格的 R-tree 并写出 manifest
+    t0 = time.perf_counter()
+    for path in paths.values():
+        build_index(path)
+    cells = {gid: {**partition_stats(path, layout_obj.cell(gid)), "version": 1} for gid, path in paths.items()}
+    # 数据集总量：每个多边形只归属一个网格，owned 统计求和即为去重后的总行数/总面积
+    totals = {
+        "input_rows": total_rows,
+        "invalid_rows": invalid_count,
+        "rows": sum(c["owned_rows"] for c in cells.values()),
+        "area": sum(c["owned_area"] for c in cells.values()),
+        "repaired_rows": sum(r[4] for r in results),
+        "repaired_area": sum(r[5] for r in results),
+    }
+    write_manifest(partition_dir, layout_obj, cells, totals)
+    t_index = time.perf_counter() - t0
+
+    elapsed = time.perf_counter() - start_time
+    REGISTRY.inc("ingest_rows_total", total_rows)
+    REGISTRY.inc("ingest_invalid_rows_total", invalid_count)
+    for stage, seconds in (("parse", t_parse), ("merge", t_merge), ("index", t_index)):
+        REGISTRY.inc("ingest_stage_seconds_total", seconds, stage=stage)
     print(
-        f"✅ 分块完成: {os.path.basename(input_path)} -> {prefix}, "
-        f"有效行 {total_rows - invalid_count}, 耗时 {elapsed:.2f}s"
+        f"✅ 分块完成: {os.path.basename(input_path)} -> {prefix} ({layout}, {len(paths)} 个网格), "
+        f"有效行 {valid}, 跨网格复制 {cell_rows - valid}, 耗时 {elapsed:.2f}s"
+    )
+    print(
+        f"   解析/分箱 ({len(results)} 进程): {_rate(total_rows, t_parse)} | "
+        f"合并: {_rate(cell_rows, t_merge) if n > 1 or adaptive else '-'} | 索引: {_rate(cell_rows, t_index)}"
     )
     return partition_dir
 
 
+def _read_ids(input_path: str, chunksize: int) -> set:
+    ids = set()
+    for chunk in pd.read_csv(input_path, usecols=["id"], dtype=str, chunksize=chunksize):
+        ids.update(chunk["id"].astype(str).str.strip())
+    return ids
+
+
+def _bbox_columns(df: pd.DataFrame) -> np.ndarray:
+    return df[["minx", "miny", "maxx", "maxy"]].to_numpy().reshape(-1, 4)
+
+
+def update_dataset(input_path: str, prefix: str, mode: str = "append", chunksize: int = PARTITION_CHUNK_ROWS):
+    """
+    增量更新已分块的数据集，布局不变，只重写受影响的网格：
+    - append：追加 CSV（id, geometry）中的多边形；
+    - upsert：先删除 id 出现在 CSV 中的多边形，再追加；
+    - delete：删除 id 出现在 CSV 中的多边形（只需 id 列）。
+    被重写网格的 R-tree 重建，进程内缓存、涉及这些网格的交集表、与变更外包框相交的瓦片随之清除，
+    manifest 中这些网格的 version 加一并重新统计；其余网格的交集表在下次统计时继续复用。
+    四叉树不会重新划分，大量追加后格子可能超过 max_per_cell，需要时重新上传分块。
+    返回 {"cells": 重写的网格, "rows_added": 追加的有效行数, "rows_removed": 删除的多边形数}。
+    """
+    if mode not in UPDATE_MODES:
+        raise ValueError(f"未知的更新方式: {mode}")
+    partition_dir = os.path.join(PARTITION_DIR, prefix)
+    if not os.path.isdir(partition_dir):
+        raise ValueError("数据集不存在，请先上传并分块")
+    if any(f.endswith(LEGACY_EXT) for f in os.listdir(partition_dir)):
+        raise ValueError("数据集包含旧版 CSV 分块，请先用 partition_store.py 转换为 Parquet")
+    header = pd.read_csv(input_path, nrows=0)
+    if "id" not in header.columns or (mode != "delete" and "geometry" not in header.columns):
+        raise ValueError("CSV必须包含'id'和'geometry'列" if mode != "delete" else "CSV必须包含'id'列")
+    start_time = time.perf_counter()
+    grids = list_grids(partition_dir)
+    layout_obj, cells = load_layout(partition_dir, grids)
+    old_totals = dataset_totals(partition_dir) or {}
+    shard_root = os.path.join(partition_dir, SHARD_DIR)
+    shutil.rmtree(shard_root, ignore_errors=True)
+
+    # 新行解析并按现有布局分箱到临时分片
+    total_rows = invalid_count = repaired_rows = 0
+    repaired_area = 0.0
+    new_paths = {}
+    if mode != "delete":
+        (start, end), *_ = split_ranges(input_path, 1) or [(0, 0)]
+        total_rows, invalid_count, _, new_paths, repaired_rows, repaired_area = ingest_range(
+            input_path, start, end, os.path.join(shard_root, "update"), list(header.columns), chunksize, layout_obj
+        )
+
+    # 待删除的行：逐网格只读 id 与 bbox 列
+    keep = {}
+    changed = []
+    rows_removed = 0
+    remove_ids = _read_ids(input_path, chunksize) if mode != "append" else set()
+    if remove_ids:
+        for gid in grids:
+            df = read_partition(os.path.join(partition_dir, f"{gid}{PARTITION_EXT}"), with_geom=False)
+            hit = df["id"].isin(remove_ids).to_numpy()
+            if hit.any():
+                keep[gid] = ~hit
+                changed.append(_bbox_columns(df[hit]))
+                rows_removed += int(layout_obj.cell(gid).owns(df["minx"][hit], df["miny"][hit]).sum())
+
+    # 重写受影响的网格：保留的旧行 + 新行，先写临时文件再替换
+    affected = sorted(set(keep) | set(new_paths))
+    for gid in affected:
+        target = os.path.join(partition_dir, f"{gid}{PARTITION_EXT}")
+        tmp = f"{target}.{uuid.uuid4().hex[:8]}.tmp"
+        writer = open_writer(tmp)
+        try:
+            if os.path.exists(target):
+                table = pq.read_table(target)
+                writer.write_table(table.filter(pa.array(keep[gid])) if gid in keep else table)
+            if gid in new_paths:
+                pf = pq.ParquetFile(new_paths[gid])
+                for i in range(pf.num_row_groups):
+                    writer.write_table(pf.read_row_group(i))
+                changed.append(_bbox_columns(read_partition(new_paths[gid], with_geom=False)))
+        finally:
+            writer.close()
+        os.replace(tmp, target)
+        build_index(target)
+        cells[gid] = {
+            **partition_stats(target, layout_obj.cell(gid)),
+            "version": cells.get(gid, {}).get("version", 0) + 1,
+        }
+    shutil.rmtree(shard_root, ignore_errors=True)
+    # 无 manifest 的旧目录补全其余网格的统计
+    for gid in grids:
+        if not cells.get(gid):
+            path = os.path.join(partition_dir, f"{gid}{PARTITION_EXT}")
+            cells[gid] = {**partition_stats(path, layout_obj.cell(gid)), "version": 1}
+
+    # input_rows / invalid_rows / repaired_* 为累计值，rows / area 为更新后的去重总量
+    totals = {
+        "input_rows": old_totals.get("input_rows", 0) + total_rows,
+        "invalid_rows": old_totals.get("invalid_rows", 0) + invalid_count,
+        "rows": sum(c["owned_rows"] for c in cells.values()),
+        "area": sum(c["owned_area"] for c in cells.values()),
+        "repaired_rows": old_totals.get("repaired_rows", 0) + repaired_rows,
+        "repaired_area": old_totals.get("repaired_area", 0.0) + repaired_area,
+    }
+    write_manifest(partition_dir, layout_obj, cells, totals)
+
+    PARTITION_CACHE.invalidate(partition_dir, affected)
+    remove_cell_pairs(PARTITION_DIR, prefix, affected)
+    invalidate_tiles(partition_dir, np.concatenate(changed) if changed else [])
+
+    rows_added = total_rows - invalid_count
+    print(
+        f"✅ 增量更新完成: {os.path.basename(input_path)} -> {prefix} ({mode}), 重写 {len(affected)} 个网格, "
+        f"追加 {rows_added} 行, 删除 {rows_removed} 行, 耗时 {time.perf_counter() - start_time:.2f}s"
+    )
+    return {"cells": affected, "rows_added": rows_added, "rows_removed": rows_removed}
+
+
 if __name__ == "__main__":
     # 简单示例：使用采样后的 5 万行数据
     partition_file("sample_a_50k.csv", "data_a")
     partition_file("sample_b_50k.csv", "data_b")
-
@@ -1,67 +1,524 @@
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
 import pandas as pd
-from shapely import wkt
-from rtree import index
+import shapely
+
+from metrics import REGISTRY, JoinMetrics
+from partition_cache import PARTITION_CACHE
+from partition_layout import bbox_intersects, bbox_within, cell_pairs, dataset_totals, load_layout
+from partition_store import (
+    list_grids,
+    open_index,
+    pair_path,
+    partition_path,
+    partition_version,
+    read_pairs,
+    read_partition,
+    write_pairs,
+)
+
+# 网格级并行的进程数，可通过环境变量 JOIN_WORKERS 配置；<=1 时串行执行
+JOIN_WORKERS = int(os.environ.get("JOIN_WORKERS", os.cpu_count() or 1))
+# 按进程数缓存的进程池，见 get_executor
+_EXECUTORS: Dict[int, ProcessPoolExecutor] = {}
+_EXECUTORS_LOCK = threading.Lock()
 
 
 def load_df(path: str) -> pd.DataFrame:
-    """读取 CSV，去引号并解析 WKT"""
-    df = pd.read_csv(path)
-    df["geom"] = df["geometry"].astype(str).str.replace('"', "").apply(wkt.loads)
-    df["area"] = df["geom"].apply(lambda g: g.area)
-    return df
+    """读取分块（Parquet 直接解析 WKB，旧版 CSV 解析 WKT），带 geom/area/bbox 列"""
+    return read_partition(path)
+
+
+def load_partition(path: str, bbox=None):
+    """
+    读取分块及其空间索引，返回 (df, idx)；df 索引为分块内行号。
+    优先使用进程内缓存（见 partition_cache）：有 bbox 时用缓存的 STRtree 筛出相交行。
+    缓存关闭时打开磁盘 R-tree 索引，只解析相交行的几何。
+    """
+    entry = PARTITION_CACHE.get(path)
+    if entry is not None:
+        if not bbox:
+            return entry.df, entry.tree
+        rows = np.sort(entry.tree.query(shapely.box(*bbox)))
+        return entry.df.take(rows), entry.tree
+    idx = open_index(path)
+    rows = list(idx.intersection(bbox)) if bbox else None
+    return read_partition(path, rows=rows), idx
 
 
 def filter_bbox(df: pd.DataFrame, bbox):
-    """按 bbox 过滤几何"""
+    """按 bbox 过滤几何（使用预计算的 minx/miny/maxx/maxy 列）"""
     minx, miny, maxx, maxy = bbox
-    return df[
-        df["geom"].apply(
-            lambda g: g.bounds[2] >= minx
-            and g.bounds[0] <= maxx
-            and g.bounds[3] >= miny
-            and g.bounds[1] <= maxy
+    return df[(df["maxx"] >= minx) & (df["minx"] <= maxx) & (df["maxy"] >= miny) & (df["miny"] <= maxy)]
+
+
+def reference_points(minx, miny, bbox=None):
+    """
+    参考点：外包框（交集）的左下角，有 bbox 时再与 bbox 求交。
+    多边形被复制到多个网格时，只在参考点所在网格计数，避免重复。
+    单个多边形传入自身 minx/miny；A/B 对传入 np.maximum(a, b)。
+    """
+    xs = np.asarray(minx, dtype=float)
+    ys = np.asarray(miny, dtype=float)
+    if bbox:
+        xs = np.maximum(xs, bbox[0])
+        ys = np.maximum(ys, bbox[1])
+    return xs, ys
+
+
+def owned_rows(df: pd.DataFrame, cell, bbox=None) -> pd.DataFrame:
+    """只保留参考点归属 cell 的行（cell 为 None 则不过滤）"""
+    if cell is None:
+        return df
+    return df[cell.owns(*reference_points(df["minx"], df["miny"], bbox))]
+
+
+def intersect_pairs(
+    a: pd.DataFrame, b: pd.DataFrame, cell_a=None, cell_b=None, bbox=None, metrics: Optional[JoinMetrics] = None
+):
+    """
+    批量求交内核：STRtree.query(predicate="intersects") 得到候选位置数组，
+    只保留参考点同时归属 cell_a 与 cell_b 的候选对，再向量化计算 intersection/area。
+    返回 (ia, ib, inter_area)：a/b 中的位置下标与对应交集面积（已剔除空交集）。
+    传入 metrics 时记录 candidate_query / intersection 阶段耗时与 candidates / intersections 计数。
+    """
+    metrics = metrics if metrics is not None else JoinMetrics()
+    geoms_a = a["geom"].to_numpy()
+    geoms_b = b["geom"].to_numpy()
+    with metrics.stage("candidate_query"):
+        ia, ib = shapely.STRtree(geoms_b).query(geoms_a, predicate="intersects")
+    metrics.count("candidates", len(ia))
+    cells = [c for c in (cell_a, cell_b) if c is not None]
+    if cells:
+        ref = reference_points(
+            np.maximum(a["minx"].to_numpy()[ia], b["minx"].to_numpy()[ib]),
+            np.maximum(a["miny"].to_numpy()[ia], b["miny"].to_numpy()[ib]),
+            bbox,
         )
+        keep = cells[0].owns(*ref)
+        for cell in cells[1:]:
+            keep &= cell.owns(*ref)
+        ia, ib = ia[keep], ib[keep]
+    with metrics.stage("intersection"):
+        inter = shapely.intersection(geoms_a[ia], geoms_b[ib])
+        keep = ~shapely.is_empty(inter)
+        inter_area = shapely.area(inter[keep])
+    metrics.count("intersections", len(inter_area))
+    return ia[keep], ib[keep], inter_area
+
+
+def join_frames(
+    a: Optional[pd.DataFrame],
+    b: Optional[pd.DataFrame],
+    cell_a=None,
+    cell_b=None,
+    bbox=None,
+    count_a: bool = True,
+    count_b: bool = True,
+):
+    """
+    单网格（对）统计：A/B 面积（按参考点去重）、交集面积与交集对数；a/b 可为 None（该侧无分块）。
+    count_a/count_b 为 False 时不累计该侧面积（同一网格参与多个网格对时只计一次）。
+    """
+    res = {"area_a": 0.0, "area_b": 0.0, "area_inter": 0.0, "intersection_count": 0}
+    if a is not None and count_a:
+        res["area_a"] = float(owned_rows(a, cell_a, bbox)["area"].sum())
+    if b is not None and count_b:
+        res["area_b"] = float(owned_rows(b, cell_b, bbox)["area"].sum())
+    if a is not None and b is not None and len(a) and len(b):
+        _, _, inter_area = intersect_pairs(a, b, cell_a, cell_b, bbox)
+        res["area_inter"] = float(inter_area.sum())
+        res["intersection_count"] = int(len(inter_area))
+    return res
+
+
+class JoinTask(NamedTuple):
+    """
+    一个计算单元：A 网格与 B 网格（任一侧可为 None）。
+    count_a/count_b：是否由该单元累计该侧面积；known_a/known_b：manifest 中可直接使用的面积（None 则需读取分块）；
+    join：是否需要计算交集（两侧数据外包框不相交时为 False）；rows：涉及的多边形行数（manifest，用于进度估计）。
+    """
+
+    cell_a: object
+    cell_b: object
+    count_a: bool
+    count_b: bool
+    known_a: Optional[float] = None
+    known_b: Optional[float] = None
+    join: bool = True
+    rows: int = 0
+
+
+def _known_area(stats: dict, bbox) -> Optional[float]:
+    # 网格数据完全落在 bbox 内时，其中每个多边形都与 bbox 相交且参考点不受 bbox 裁剪，面积可直接取 manifest
+    if "owned_area" in stats and bbox_within(stats.get("bbox"), bbox):
+        return stats["owned_area"]
+    return None
+
+
+def plan_tasks(base_a: str, base_b: str, grids: Optional[List[str]] = None, bbox=None) -> List[JoinTask]:
+    """
+    读取两侧 manifest，生成网格对任务。布局相同时为同名网格一一配对；
+    布局不同（如各自的四叉树）时按网格范围重叠配对。每个网格的面积只在一个任务中累计。
+    有 manifest 统计时：数据外包框与 bbox 不相交的网格直接跳过，两侧数据外包框不相交的网格对不求交，
+    完全落在 bbox 内的网格面积直接取 manifest。grids 为网格 ID 列表时只计算这些网格。
+    """
+    layout_a, cells_a = load_layout(base_a, list_grids(base_a))
+    layout_b, cells_b = load_layout(base_b, list_grids(base_b))
+    wanted = set(grids) if grids else None
+
+    def _select(cells):
+        return [
+            c
+            for c, st in cells.items()
+            if (wanted is None or c in wanted) and st.get("rows", 1) > 0 and bbox_intersects(st.get("bbox"), bbox)
+        ]
+
+    ids_a, ids_b = _select(cells_a), _select(cells_b)
+    tasks = []
+    counted_a, counted_b = set(), set()
+    for ca, cb in cell_pairs(layout_a, ids_a, layout_b, ids_b):
+        join = bbox_intersects(cells_a[ca].get("bbox"), cells_b[cb].get("bbox"))
+        count_a, count_b = ca not in counted_a, cb not in counted_b
+        if not (join or count_a or count_b):
+            continue
+        tasks.append(
+            JoinTask(
+                layout_a.cell(ca),
+                layout_b.cell(cb) if join or count_b else None,
+                count_a,
+                count_b,
+                _known_area(cells_a[ca], bbox),
+                _known_area(cells_b[cb], bbox),
+                join,
+                cells_a[ca].get("rows", 0) + cells_b[cb].get("rows", 0),
+            )
+        )
+        counted_a.add(ca)
+        counted_b.add(cb)
+    tasks += [
+        JoinTask(layout_a.cell(c), None, True, False, _known_area(cells_a[c], bbox), None, False, cells_a[c].get("rows", 0))
+        for c in ids_a
+        if c not in counted_a
+    ]
+    tasks += [
+        JoinTask(None, layout_b.cell(c), False, True, None, _known_area(cells_b[c], bbox), False, cells_b[c].get("rows", 0))
+        for c in ids_b
+        if c not in counted_b
     ]
+    return tasks
 
 
-def jaccard_local(path_a: str, path_b: str, bbox=None):
-    """单分区 Jaccard 计算"""
-    a = load_df(path_a)
-    b = load_df(path_b)
-    if bbox:
-        a = filter_bbox(a, bbox)
-        b = filter_bbox(b, bbox)
-
-    idx = index.Index()
-    for i, g in b["geom"].items():
-        idx.insert(i, g.bounds)
-
-    inter_area = 0.0
-    inter_count = 0
-    for _, row in a.iterrows():
-        for j in idx.intersection(row["geom"].bounds):
-            g2 = b.loc[j, "geom"]
-            if row["geom"].intersects(g2):
-                inter = row["geom"].intersection(g2)
-                if not inter.is_empty:
-                    inter_area += inter.area
-                    inter_count += 1
-
-    area_a = a["area"].sum()
-    area_b = b["area"].sum()
-    denom = area_a + area_b - inter_area
-    jacc = inter_area / denom if denom > 0 else 0
-    return {
-        "block_jaccard": jacc,
-        "area_a": area_a,
-        "area_b": area_b,
-        "area_inter": inter_area,
-        "intersection_count": inter_count,
+def _load_counted(path: str, metrics: JoinMetrics) -> pd.DataFrame:
+    """读取完整分块，记录 partition_load 耗时、缓存命中，未命中时记录解析行数与读取字节数"""
+    cached = PARTITION_CACHE.peek(path) is not None
+    with metrics.stage("partition_load"):
+        df, _ = load_partition(path)
+    if cached:
+        metrics.count("cache_hits")
+    else:
+        metrics.count("cache_misses")
+        metrics.count("rows_parsed", len(df))
+        metrics.count("bytes_read", os.path.getsize(path))
+    return df
+
+
+def pair_table(
+    base_a: str, base_b: str, cell_a: str, cell_b: str, metrics: Optional[JoinMetrics] = None
+) -> Optional[pd.DataFrame]:
+    """
+    网格对交集表（列见 partition_store.PAIR_SCHEMA）：两个分块的全部相交对，不按 bbox/参考点过滤。
+    首次计算后保存到 A 目录下（见 partition_store.pair_path），任一侧分块重写后按版本自动重算；
+    任一侧分块不存在时返回 None。
+    """
+    metrics = metrics if metrics is not None else JoinMetrics()
+    path_a, path_b = partition_path(base_a, cell_a), partition_path(base_b, cell_b)
+    if path_a is None or path_b is None:
+        return None
+    version_a, version_b = partition_version(path_a), partition_version(path_b)
+    target = pair_path(base_a, base_b, cell_a, cell_b)
+    with metrics.stage("pair_table_read"):
+        pairs = read_pairs(target, version_a, version_b)
+    if pairs is not None:
+        metrics.count("pair_table_hits")
+        metrics.count("bytes_read", os.path.getsize(target))
+        return pairs
+    metrics.count("pair_table_misses")
+    a = _load_counted(path_a, metrics)
+    b = _load_counted(path_b, metrics)
+    if len(a) and len(b):
+        ia, ib, inter_area = intersect_pairs(a, b, metrics=metrics)
+    else:
+        ia = ib = np.empty(0, dtype=np.int64)
+        inter_area = np.empty(0)
+    data = {
+        "row_a": a.index.to_numpy()[ia],
+        "row_b": b.index.to_numpy()[ib],
+        "id_a": a["id"].to_numpy()[ia],
+        "id_b": b["id"].to_numpy()[ib],
+        "inter_area": inter_area,
+        "minx": np.maximum(a["minx"].to_numpy()[ia], b["minx"].to_numpy()[ib]),
+        "miny": np.maximum(a["miny"].to_numpy()[ia], b["miny"].to_numpy()[ib]),
+        "maxx": np.minimum(a["maxx"].to_numpy()[ia], b["maxx"].to_numpy()[ib]),
+        "maxy": np.minimum(a["maxy"].to_numpy()[ia], b["maxy"].to_numpy()[ib]),
     }
+    with metrics.stage("pair_table_write"):
+        write_pairs(target, data, version_a, version_b)
+    return pd.DataFrame(data)
+
+
+def filter_pairs(pairs: pd.DataFrame, cell_a, cell_b, bbox=None) -> pd.DataFrame:
+    """
+    从交集表中取出 bbox 统计对应的交集对，与 intersect_pairs 的结果一致：
+    两侧外包框重叠范围与 bbox 相交（即 A、B 外包框均与 bbox 相交），且参考点同时归属 cell_a 与 cell_b。
+    """
+    if bbox:
+        pairs = filter_bbox(pairs, bbox)
+    ref = reference_points(pairs["minx"], pairs["miny"], bbox)
+    return pairs[cell_a.owns(*ref) & cell_b.owns(*ref)]
+
+
+def owned_area(base: str, cell, bbox=None) -> float:
+    """网格中参考点归属本网格、且与 bbox 相交的多边形面积（已缓存则用缓存，否则只读属性列，不解析几何）"""
+    path = partition_path(base, cell.cell_id)
+    if path is None:
+        return 0.0
+    entry = PARTITION_CACHE.peek(path)
+    df = entry.df if entry is not None else read_partition(path, with_geom=False)
+    if bbox:
+        df = filter_bbox(df, bbox)
+    return float(owned_rows(df, cell, bbox)["area"].sum())
+
+
+def join_cell(base_a: str, base_b: str, task: JoinTask, bbox=None):
+    """
+    执行一个网格对任务（进程池任务单元）：交集由网格对交集表过滤求和（见 pair_table），
+    面积优先取 manifest，否则只读属性列计算。结果的 metrics 为本网格对的阶段耗时与计数（JoinMetrics.to_dict）。
+    """
+    metrics = JoinMetrics()
+    res = {"area_a": 0.0, "area_b": 0.0, "area_inter": 0.0, "intersection_count": 0, "pairs_tested": 0}
+    if task.join:
+        pairs = pair_table(base_a, base_b, task.cell_a.cell_id, task.cell_b.cell_id, metrics)
+        if pairs is not None:
+            res["pairs_tested"] = int(len(pairs))
+            with metrics.stage("pair_filter"):
+                pairs = filter_pairs(pairs, task.cell_a, task.cell_b, bbox)
+            res["area_inter"] = float(pairs["inter_area"].sum())
+            res["intersection_count"] = int(len(pairs))
+            metrics.count("pairs_tested", res["pairs_tested"])
+            metrics.count("pairs_matched", res["intersection_count"])
+    with metrics.stage("area"):
+        if task.count_a:
+            res["area_a"] = task.known_a if task.known_a is not None else owned_area(base_a, task.cell_a, bbox)
+        if task.count_b:
+            res["area_b"] = task.known_b if task.known_b is not None else owned_area(base_b, task.cell_b, bbox)
+    metrics.count("cells")
+    res["metrics"] = metrics.to_dict()
+    return res
+
+
+def iter_pairs(base_a: str, base_b: str, tasks: List[JoinTask], bbox=None):
+    """
+    按任务顺序逐个网格对产出匹配的交集对 DataFrame：id_a, id_b, area_a, area_b, inter_area。
+    每次只持有一个网格对的数据，供流式输出使用。
+    """
+    for task in tasks:
+        if not task.join:
+            continue
+        pairs = pair_table(base_a, base_b, task.cell_a.cell_id, task.cell_b.cell_id)
+        if pairs is None:
+            continue
+        pairs = filter_pairs(pairs, task.cell_a, task.cell_b, bbox)
+        if pairs.empty:
+            continue
+        area_a = read_partition(partition_path(base_a, task.cell_a.cell_id), with_geom=False)["area"]
+        area_b = read_partition(partition_path(base_b, task.cell_b.cell_id), with_geom=False)["area"]
+        yield pd.DataFrame(
+            {
+                "id_a": pairs["id_a"].to_numpy(),
+                "id_b": pairs["id_b"].to_numpy(),
+                "area_a": area_a.to_numpy()[pairs["row_a"].to_numpy()],
+                "area_b": area_b.to_numpy()[pairs["row_b"].to_numpy()],
+                "inter_area": pairs["inter_area"].to_numpy(),
+            }
+        )
+
+
+def get_executor(workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    workers 个进程的进程池（spawn 启动，避免在多线程的 API 进程中 fork），按进程数缓存复用；
+    不同的 workers 各用一个池，正在使用的池不会因其他调用方的 workers 不同而被替换
+    """
+    n = workers or JOIN_WORKERS
+    with _EXECUTORS_LOCK:
+        if n not in _EXECUTORS:
+            _EXECUTORS[n] = ProcessPoolExecutor(max_workers=n, mp_context=multiprocessing.get_context("spawn"))
+        return _EXECUTORS[n]
+
+
+class TaskCancelled(Exception):
+    """计算被取消（见 JoinProgress.cancelled）"""
+
+
+class JoinProgress:
+    """
+    网格对计算进度：已完成/总网格对数、检测的交集对数、已处理多边形数、处理速度与预计剩余时间。
+    子类覆盖 report（每个网格对完成后调用）与 cancelled（返回 True 时在网格对之间停止计算）。
+    """
+
+    def start(self, tasks: List[JoinTask]):
+        self.cells_total = len(tasks)
+        self.polygons_total = sum(t.rows for t in tasks)
+        self.cells_done = self.pairs_tested = self.polygons_done = 0
+        self.started = time.perf_counter()
+        self.report(self.snapshot())
+
+    def update(self, task: JoinTask, res: dict):
+        self.cells_done += 1
+        self.pairs_tested += res.get("pairs_tested", 0)
+        self.polygons_done += task.rows
+        self.report(self.snapshot())
+
+    def snapshot(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        rate = self.polygons_done / elapsed if elapsed > 0 else 0.0
+        if self.cells_done >= self.cells_total:
+            eta = 0.0
+        elif self.polygons_done and self.polygons_total:
+            eta = elapsed * (self.polygons_total - self.polygons_done) / self.polygons_done
+        elif self.cells_done:
+            eta = elapsed * (self.cells_total - self.cells_done) / self.cells_done
+        else:
+            eta = None
+        return {
+            "cells_done": self.cells_done,
+            "cells_total": self.cells_total,
+            "pairs_tested": self.pairs_tested,
+            "polygons_done": self.polygons_done,
+            "polygons_total": self.polygons_total,
+            "polygons_per_sec": rate,
+            "elapsed_seconds": elapsed,
+            "eta_seconds": eta,
+        }
+
+    def report(self, snapshot: dict):
+        pass
+
+    def cancelled(self) -> bool:
+        return False
+
+
+def _parallel_results(base_a: str, base_b: str, tasks: List[JoinTask], bbox, workers: int):
+    """按 tasks 顺序产出进程池结果；同时在途的任务不超过 2 * workers，生成器关闭时取消未开始的任务"""
+    executor = get_executor(workers)
+    pending = deque()
+    todo = iter(tasks)
+    try:
+        for task in itertools.islice(todo, 2 * workers):
+            pending.append(executor.submit(join_cell, base_a, base_b, task, bbox))
+        while pending:
+            res = pending.popleft().result()
+            task = next(todo, None)
+            if task is not None:
+                pending.append(executor.submit(join_cell, base_a, base_b, task, bbox))
+            yield res
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def join_grids(
+    base_a: str,
+    base_b: str,
+    tasks: List[JoinTask],
+    bbox=None,
+    workers: Optional[int] = None,
+    progress: Optional[JoinProgress] = None,
+    metrics: Optional[JoinMetrics] = None,
+):
+    """
+    按网格对并行计算并合并 area_a/area_b/area_inter/intersection_count（按 tasks 顺序累加）。
+    传入 progress 时每个网格对完成后更新进度；progress.cancelled() 为 True 时取消未开始的网格对并抛出 TaskCancelled。
+    传入 metrics 时合并各网格对的阶段耗时与计数。
+    """
+    workers = JOIN_WORKERS if workers is None else workers
+    total = {"area_a": 0.0, "area_b": 0.0, "area_inter": 0.0, "intersection_count": 0}
+    if progress is not None:
+        progress.start(tasks)
+    if workers > 1 and len(tasks) > 1:
+        results = _parallel_results(base_a, base_b, tasks, bbox, workers)
+    else:
+        results = (join_cell(base_a, base_b, task, bbox) for task in tasks)
+    try:
+        for task, res in zip(tasks, results):
+            for k in total:
+                total[k] += res[k]
+            if metrics is not None:
+                metrics.merge(res["metrics"])
+            if progress is not None:
+                progress.update(task, res)
+                if progress.cancelled():
+                    raise TaskCancelled()
+    finally:
+        results.close()
+    return total
+
+
+def compute_stats(
+    base_a: str,
+    base_b: str,
+    bbox=None,
+    grids: Optional[List[str]] = None,
+    progress: Optional[JoinProgress] = None,
+    workers: Optional[int] = None,
+):
+    """
+    两个分块目录在 bbox（或全域）内的 A/B 面积、交集面积、交集对数与 Jaccard；progress、workers 见 join_grids。
+    结果的 metrics 为分阶段耗时与计数（见 metrics.JoinMetrics），wall_seconds 为总耗时，同时计入进程级累计指标。
+    """
+    t0 = time.perf_counter()
+    metrics = JoinMetrics()
+    # 按两侧 manifest 的布局生成网格对；只有一侧有数据的网格仍参与面积统计，与 bbox 无关的网格直接剪除
+    with metrics.stage("plan"):
+        tasks = plan_tasks(base_a, base_b, grids, bbox)
+    totals_a, totals_b = dataset_totals(base_a), dataset_totals(base_b)
+    whole = bbox is None and not grids and totals_a is not None and totals_b is not None
+    if whole:
+        # 全域统计：A/B 面积直接取 manifest 总量，只计算交集
+        tasks = [t._replace(count_a=False, count_b=False) for t in tasks if t.join]
+
+    # 多边形按外包框复制到多个网格：面积与交集对都只在参考点所在网格计数；网格间由进程池并行
+    total = join_grids(base_a, base_b, tasks, bbox, workers, progress, metrics)
+    if whole:
+        total["area_a"], total["area_b"] = totals_a["area"], totals_b["area"]
+
+    denom = total["area_a"] + total["area_b"] - total["area_inter"]
+    jacc = total["area_inter"] / denom if denom > 0 else 0.0
+    elapsed = time.perf_counter() - t0
+    REGISTRY.record_join(metrics, elapsed)
+    return {**total, "block_jaccard": jacc, "metrics": {**metrics.to_dict(), "wall_seconds": elapsed}}
+
+
+def jaccard_local(path_a: str, path_b: str, bbox=None, cell=None):
+    """单分区 Jaccard 计算；传入 cell（见 partition_layout）时按参考点去重跨网格复制的多边形与交集对"""
+    a, _ = load_partition(path_a, bbox)
+    b, _ = load_partition(path_b, bbox)
+    res = join_frames(a, b, cell, cell, bbox)
+    denom = res["area_a"] + res["area_b"] - res["area_inter"]
+    jacc = res["area_inter"] / denom if denom > 0 else 0
+    return {"block_jaccard": jacc, **res}
 
 
 if __name__ == "__main__":
     # 简单示例
-    res = jaccard_local("partitioned_data/data_a/0_1.csv", "partitioned_data/data_b/0_1.csv")
+    res = jaccard_local("partitioned_data/data_a/0_1.parquet", "partitioned_data/data_b/0_1.parquet")
     print(res)
 
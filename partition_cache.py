@@ -0,0 +1,115 @@
+"""
+进程内分块缓存：按 (数据集目录, grid_id, 分块版本) 缓存解析后的分块（几何、面积、bbox 列）及其内存 STRtree，
+多次请求（平移/缩放、重复统计）复用同一份解析结果。
+
+分块版本取文件的 mtime_ns 与大小（partition_store.partition_version），分块被重写后旧条目不会再命中；
+init_partition_dirs 重建数据集时调用 invalidate 立即释放该数据集的条目，增量更新只释放被重写的网格。
+容量按估算字节数做 LRU 淘汰，上限由环境变量 PARTITION_CACHE_MB 配置（0 表示关闭缓存）。
+缓存在每个进程内独立（join 进程池的每个 worker 各有一份）。
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Iterable, NamedTuple, Optional
+
+import pandas as pd
+import shapely
+
+from partition_store import partition_version, read_partition
+
+PARTITION_CACHE_BYTES = int(float(os.environ.get("PARTITION_CACHE_MB", 512)) * 2**20)
+
+# 估算内存：每个坐标（GEOS 内部存储 + 开销）与每个几何对象的固定开销
+_BYTES_PER_COORD = 24
+_BYTES_PER_GEOM = 160
+
+
+class CachedPartition(NamedTuple):
+    df: pd.DataFrame  # 完整分块：id, area, minx, miny, maxx, maxy, geom；索引为分块内行号
+    tree: shapely.STRtree  # 按几何外包框建立，query 返回位置下标（与行号一致）
+    nbytes: int
+
+
+def _cache_key(path: str):
+    base, name = os.path.split(os.path.abspath(path))
+    return base, os.path.splitext(name)[0], partition_version(path)
+
+
+def _estimate_bytes(df: pd.DataFrame) -> int:
+    geoms = df["geom"].to_numpy()
+    coords = int(shapely.get_num_coordinates(geoms).sum())
+    columns = int(df.drop(columns=["geom"]).memory_usage(index=True, deep=True).sum())
+    return coords * _BYTES_PER_COORD + len(df) * _BYTES_PER_GEOM + columns
+
+
+class PartitionCache:
+    """线程安全的 LRU 分块缓存，统计命中/未命中/淘汰次数"""
+
+    def __init__(self, max_bytes: int = PARTITION_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, CachedPartition]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, path: str) -> Optional[CachedPartition]:
+        """返回分块的缓存条目（未命中时读取并解析）；缓存关闭时返回 None"""
+        if self.max_bytes <= 0:
+            return None
+        key = _cache_key(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        # 解析放在锁外，避免阻塞其他分块的请求；并发未命中同一分块时以后写入者为准
+        df = read_partition(path)
+        entry = CachedPartition(df, shapely.STRtree(df["geom"].to_numpy()), _estimate_bytes(df))
+        if entry.nbytes > self.max_bytes:
+            return entry
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[key] = entry
+            self._bytes += entry.nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+        return entry
+
+    def peek(self, path: str) -> Optional[CachedPartition]:
+        """只查找已缓存的条目（不读取分块，不计入命中统计）"""
+        if self.max_bytes <= 0:
+            return None
+        with self._lock:
+            return self._entries.get(_cache_key(path))
+
+    def invalidate(self, base: Optional[str] = None, cells: Optional[Iterable[str]] = None) -> int:
+        """清除某个数据集目录（base 为 None 时全部）的条目，cells 指定时只清除这些网格，返回清除数"""
+        base = None if base is None else os.path.abspath(base)
+        cells = None if cells is None else set(cells)
+        with self._lock:
+            keys = [
+                k for k in self._entries if (base is None or k[0] == base) and (cells is None or k[1] in cells)
+            ]
+            for k in keys:
+                self._bytes -= self._entries.pop(k).nbytes
+        return len(keys)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+PARTITION_CACHE = PartitionCache()
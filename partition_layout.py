@@ -0,0 +1,298 @@
+"""
+分块布局：描述网格 ID 与空间范围的对应关系，随分块写入 {prefix}/_manifest.json。
+
+- GridLayout：固定范围的均匀网格（默认 GLOBAL_BOUNDS 5x5），越界几何归入边缘网格；
+- QuadtreeLayout：范围取自数据，按采样估计的密度递归四分，每格不超过 max_per_cell 个多边形。
+
+点的归属：每个网格是半开区间 [x0, x1) x [y0, y1)，位于布局外缘的一侧向外无界，
+保证任一参考点恰好属于一个网格。assign 把几何分配到其外包框内任一点可能归属的全部网格，
+因此两个多边形外包框交集内的参考点所在网格一定同时包含这两个多边形。
+"""
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+MANIFEST_NAME = "_manifest.json"
+GLOBAL_BOUNDS = (-120, -120, 120, 120)
+NUM_DIVISIONS = 5
+QUADTREE_MAX_PER_CELL = 50_000
+QUADTREE_MAX_DEPTH = 12
+
+_INF = float("inf")
+
+
+class GridCell:
+    """均匀网格中的一个格子；归属按 floor((x - origin) / size) 截断到 [0, n) 计算"""
+
+    __slots__ = ("cell_id", "extent", "origin", "size", "divisions", "gx", "gy")
+
+    def __init__(self, cell_id: str, origin, size, divisions: int, gx: int, gy: int):
+        self.cell_id = cell_id
+        self.origin = tuple(origin)
+        self.size = tuple(size)
+        self.divisions = divisions
+        self.gx, self.gy = gx, gy
+        last = divisions - 1
+        self.extent = (
+            -_INF if gx == 0 else origin[0] + gx * size[0],
+            -_INF if gy == 0 else origin[1] + gy * size[1],
+            _INF if gx == last else origin[0] + (gx + 1) * size[0],
+            _INF if gy == last else origin[1] + (gy + 1) * size[1],
+        )
+
+    def owns(self, xs, ys) -> np.ndarray:
+        n = self.divisions - 1
+        px = np.clip(np.floor_divide(np.asarray(xs, dtype=float) - self.origin[0], self.size[0]), 0, n)
+        py = np.clip(np.floor_divide(np.asarray(ys, dtype=float) - self.origin[1], self.size[1]), 0, n)
+        return (px == self.gx) & (py == self.gy)
+
+
+class QuadCell:
+    """四叉树叶子；extent 已把布局外缘替换为 ±inf"""
+
+    __slots__ = ("cell_id", "extent")
+
+    def __init__(self, cell_id: str, extent):
+        self.cell_id = cell_id
+        self.extent = tuple(extent)
+
+    def owns(self, xs, ys) -> np.ndarray:
+        x0, y0, x1, y1 = self.extent
+        xs = np.asarray(xs, dtype=float)
+        ys = np.asarray(ys, dtype=float)
+        return (xs >= x0) & (xs < x1) & (ys >= y0) & (ys < y1)
+
+
+class GridLayout:
+    """固定范围的均匀网格，网格 ID 为 {gx}_{gy}"""
+
+    kind = "grid"
+
+    def __init__(self, bounds=GLOBAL_BOUNDS, divisions: int = NUM_DIVISIONS):
+        self.bounds = tuple(float(v) for v in bounds)
+        self.divisions = int(divisions)
+        self.size = (
+            (self.bounds[2] - self.bounds[0]) / self.divisions,
+            (self.bounds[3] - self.bounds[1]) / self.divisions,
+        )
+        self.ids = [f"{gx}_{gy}" for gx in range(self.divisions) for gy in range(self.divisions)]
+
+    def _index(self, v, axis: int) -> np.ndarray:
+        return np.clip(
+            np.floor_divide(np.asarray(v, dtype=float) - self.bounds[axis], self.size[axis]), 0, self.divisions - 1
+        ).astype(np.int64)
+
+    def assign(self, bounds: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """bounds 为 (n, 4) 外包框；返回 (rows, codes)，每个 (行, 网格) 一条，self.ids[code] 为网格 ID"""
+        gx0, gx1 = self._index(bounds[:, 0], 0), self._index(bounds[:, 2], 0)
+        gy0, gy1 = self._index(bounds[:, 1], 1), self._index(bounds[:, 3], 1)
+        wx = gx1 - gx0 + 1
+        counts = wx * (gy1 - gy0 + 1)
+        rows = np.repeat(np.arange(len(bounds)), counts)
+        k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        gx = gx0[rows] + k % wx[rows]
+        gy = gy0[rows] + k // wx[rows]
+        return rows, gx * self.divisions + gy
+
+    def cell(self, cell_id: str) -> GridCell:
+        gx, gy = map(int, cell_id.split("_"))
+        return GridCell(cell_id, self.bounds[:2], self.size, self.divisions, gx, gy)
+
+    def to_dict(self) -> Dict:
+        return {"kind": self.kind, "bounds": list(self.bounds), "divisions": self.divisions}
+
+
+class QuadtreeLayout:
+    """
+    自适应四叉树，网格 ID 为从根 "q" 起的象限路径（0=左下 1=右下 2=左上 3=右上），如 q031。
+    domain 为数据范围；只保存叶子（包括没有数据的叶子）。
+    """
+
+    kind = "quadtree"
+
+    def __init__(self, domain, leaves: List[str]):
+        self.domain = tuple(float(v) for v in domain)
+        self.ids = sorted(leaves)
+        self._code = {cid: i for i, cid in enumerate(self.ids)}
+        self._internal = {cid[:k] for cid in self.ids for k in range(1, len(cid))}
+
+    @property
+    def bounds(self):
+        """布局范围（与 GridLayout.bounds 对应）"""
+        return self.domain
+
+    @staticmethod
+    def _split(extent):
+        x0, y0, x1, y1 = extent
+        mx, my = (x0 + x1) / 2, (y0 + y1) / 2
+        return [(x0, y0, mx, my), (mx, y0, x1, my), (x0, my, mx, y1), (mx, my, x1, y1)]
+
+    def raw_extent(self, cell_id: str):
+        """网格的几何范围（不含外缘无界处理）"""
+        extent = self.domain
+        for q in cell_id[1:]:
+            extent = self._split(extent)[int(q)]
+        return extent
+
+    def _open_extent(self, extent):
+        d = self.domain
+        return (
+            -_INF if extent[0] <= d[0] else extent[0],
+            -_INF if extent[1] <= d[1] else extent[1],
+            _INF if extent[2] >= d[2] else extent[2],
+            _INF if extent[3] >= d[3] else extent[3],
+        )
+
+    @staticmethod
+    def _touches(bounds: np.ndarray, extent) -> np.ndarray:
+        # 外包框（闭区间）与半开格子 [x0, x1) x [y0, y1) 是否有公共点
+        x0, y0, x1, y1 = extent
+        return (bounds[:, 0] < x1) & (bounds[:, 2] >= x0) & (bounds[:, 1] < y1) & (bounds[:, 3] >= y0)
+
+    @classmethod
+    def build(
+        cls,
+        domain,
+        sample_bounds: np.ndarray,
+        scale: float = 1.0,
+        max_per_cell: int = QUADTREE_MAX_PER_CELL,
+        max_depth: int = QUADTREE_MAX_DEPTH,
+    ) -> "QuadtreeLayout":
+        """
+        由采样外包框构建四叉树：节点内（含跨格复制）的估计多边形数 = 采样数 * scale，
+        超过 max_per_cell 且未达 max_depth 时四分。
+        """
+        layout = cls(domain, ["q"])
+        leaves = []
+        stack = [("q", np.asarray(sample_bounds, dtype=float).reshape(-1, 4))]
+        while stack:
+            cell_id, rows = stack.pop()
+            if len(rows) * scale <= max_per_cell or len(cell_id) > max_depth:
+                leaves.append(cell_id)
+                continue
+            for q, child in enumerate(cls._split(layout.raw_extent(cell_id))):
+                child_id = f"{cell_id}{q}"
+                stack.append((child_id, rows[cls._touches(rows, layout._open_extent(child))]))
+        return cls(domain, leaves)
+
+    def assign(self, bounds: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """返回 (rows, codes)，逐层向下分配，self.ids[code] 为叶子 ID"""
+        out_rows, out_codes = [], []
+        stack = [("q", self.domain, np.arange(len(bounds)))]
+        while stack:
+            cell_id, extent, rows = stack.pop()
+            if not len(rows):
+                continue
+            if cell_id not in self._internal:
+                out_rows.append(rows)
+                out_codes.append(np.full(len(rows), self._code[cell_id], dtype=np.int64))
+                continue
+            for q, child in enumerate(self._split(extent)):
+                hit = self._touches(bounds[rows], self._open_extent(child))
+                stack.append((f"{cell_id}{q}", child, rows[hit]))
+        if not out_rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        rows = np.concatenate(out_rows)
+        codes = np.concatenate(out_codes)
+        order = np.argsort(rows, kind="stable")
+        return rows[order], codes[order]
+
+    def cell(self, cell_id: str) -> QuadCell:
+        return QuadCell(cell_id, self._open_extent(self.raw_extent(cell_id)))
+
+    def to_dict(self) -> Dict:
+        return {"kind": self.kind, "domain": list(self.domain), "leaves": self.ids}
+
+
+def layout_from_dict(d: Dict, cell_ids: Optional[List[str]] = None):
+    if d["kind"] == GridLayout.kind:
+        return GridLayout(d["bounds"], d["divisions"])
+    if d["kind"] == QuadtreeLayout.kind:
+        return QuadtreeLayout(d["domain"], d.get("leaves") or cell_ids or [])
+    raise ValueError(f"未知的分块布局: {d['kind']}")
+
+
+def write_manifest(base: str, layout, cells: Dict[str, Dict], totals: Optional[Dict] = None):
+    """
+    写出 _manifest.json：布局参数 + 每个网格的范围（外缘无界处记为 null）与统计
+    （见 partition_store.partition_stats：数据外包框、行数、面积、字节数等），
+    totals 为数据集总量（去重后的行数与面积、无效行数、修复行数与修复后面积）。
+    """
+    manifest = {"layout": layout.to_dict(), "dataset": totals or {}, "cells": {}}
+    for cell_id in sorted(cells):
+        extent = layout.cell(cell_id).extent
+        manifest["cells"][cell_id] = {
+            "extent": [None if abs(v) == _INF else v for v in extent],
+            **cells[cell_id],
+        }
+    tmp = os.path.join(base, f"{MANIFEST_NAME}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, os.path.join(base, MANIFEST_NAME))
+
+
+def read_manifest(base: str) -> Optional[Dict]:
+    path = os.path.join(base, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def dataset_totals(base: str) -> Optional[Dict]:
+    """读取 manifest 中的数据集总量（见 write_manifest），旧目录或旧 manifest 返回 None"""
+    manifest = read_manifest(base)
+    return (manifest or {}).get("dataset") or None
+
+
+def load_layout(base: str, fallback_ids: Optional[List[str]] = None):
+    """
+    读取分块目录的布局与网格信息，返回 (layout, cells)，cells 为 {grid_id: manifest 中的网格统计}。
+    无 manifest 的旧目录视为默认均匀网格，网格取 fallback_ids（通常为 list_grids 结果），统计为空。
+    """
+    manifest = read_manifest(base)
+    if manifest is None:
+        return GridLayout(), {cid: {} for cid in fallback_ids or []}
+    cells = manifest["cells"]
+    return layout_from_dict(manifest["layout"], list(cells)), cells
+
+
+def bbox_intersects(a, b) -> bool:
+    """两个闭区间外包框是否相交（任一为 None 视为无限大）"""
+    if a is None or b is None:
+        return True
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def bbox_within(inner, outer) -> bool:
+    """inner 是否完全落在 outer 内（outer 为 None 视为无限大）"""
+    if outer is None:
+        return True
+    if inner is None:
+        return False
+    return inner[0] >= outer[0] and inner[1] >= outer[1] and inner[2] <= outer[2] and inner[3] <= outer[3]
+
+
+def cell_pairs(layout_a, ids_a: List[str], layout_b, ids_b: List[str]) -> List[Tuple[str, str]]:
+    """
+    找出 A/B 两侧可能同时拥有某个参考点的网格对。
+    布局相同时就是同名网格；否则按网格范围（半开区间，留少量容差）两两求重叠。
+    """
+    if layout_a.to_dict() == layout_b.to_dict() and layout_a.kind == GridLayout.kind:
+        ids_b_set = set(ids_b)
+        return [(cid, cid) for cid in ids_a if cid in ids_b_set]
+    if not ids_a or not ids_b:
+        return []
+    ea = np.array([layout_a.cell(c).extent for c in ids_a], dtype=float)
+    eb = np.array([layout_b.cell(c).extent for c in ids_b], dtype=float)
+    tol = 1e-9 * max(1.0, float(np.nanmax(np.abs(np.where(np.isfinite(ea), ea, 0)))))
+    hit = (
+        (ea[:, None, 0] < eb[None, :, 2] + tol)
+        & (eb[None, :, 0] < ea[:, None, 2] + tol)
+        & (ea[:, None, 1] < eb[None, :, 3] + tol)
+        & (eb[None, :, 1] < ea[:, None, 3] + tol)
+    )
+    ia, ib = np.nonzero(hit)
+    return [(ids_a[i], ids_b[j]) for i, j in zip(ia, ib)]
@@ -0,0 +1,322 @@
+"""
+分块存储引擎：每个网格一个 GeoParquet 文件（WKB 几何 + 预计算 area/bbox 列）。
+
+列结构：id, geometry(WKB), area, minx, miny, maxx, maxy
+旧版 {gx}_{gy}.csv（WKT 文本）仍可读取，并可通过 migrate_csv_partitions 转换。
+每个分块另有磁盘 R-tree 索引 _index/{grid_id}.idx/.dat（条目 id 为分块内行号），
+分块文件比索引新时自动重建。
+A 数据集目录下的 _pairs/{数据集 B}/{A 网格}__{B 网格}.parquet 保存网格对的交集表（见 write_pairs）。
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import uuid
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+from rtree import index
+
+PARTITION_EXT = ".parquet"
+LEGACY_EXT = ".csv"
+INDEX_DIR = "_index"
+PAIR_DIR = "_pairs"
+
+SCHEMA = pa.schema(
+    [
+        ("id", pa.string()),
+        ("geometry", pa.binary()),
+        ("area", pa.float64()),
+        ("minx", pa.float64()),
+        ("miny", pa.float64()),
+        ("maxx", pa.float64()),
+        ("maxy", pa.float64()),
+    ],
+    metadata={
+        b"geo": json.dumps(
+            {
+                "version": "1.0.0",
+                "primary_column": "geometry",
+                "columns": {
+                    "geometry": {"encoding": "WKB", "geometry_types": ["Polygon", "MultiPolygon"]}
+                },
+            }
+        ).encode("utf-8")
+    },
+)
+
+# 网格对交集表：A/B 分块内行号、id、交集面积，以及两者外包框的重叠范围
+PAIR_SCHEMA = pa.schema(
+    [
+        ("row_a", pa.int64()),
+        ("row_b", pa.int64()),
+        ("id_a", pa.string()),
+        ("id_b", pa.string()),
+        ("inter_area", pa.float64()),
+        ("minx", pa.float64()),
+        ("miny", pa.float64()),
+        ("maxx", pa.float64()),
+        ("maxy", pa.float64()),
+    ]
+)
+
+
+def _grid_sort_key(gid: str):
+    """按网格 ID 排序：先按 x 再按 y，确保 0_0 排在前面"""
+    try:
+        return (0, tuple(map(int, gid.split("_"))))
+    except ValueError:
+        return (1, gid)
+
+
+def list_grids(base: str) -> List[str]:
+    """列出分块目录下的全部 grid_id（兼容旧版 CSV 分块）"""
+    grid_set = set()
+    for f in os.listdir(base):
+        for ext in (PARTITION_EXT, LEGACY_EXT):
+            if f.endswith(ext):
+                grid_set.add(f[: -len(ext)])
+    return sorted(grid_set, key=_grid_sort_key)
+
+
+def partition_path(base: str, gid: str) -> Optional[str]:
+    """返回 grid 对应的分块文件路径，优先 Parquet，不存在返回 None"""
+    for ext in (PARTITION_EXT, LEGACY_EXT):
+        path = os.path.join(base, f"{gid}{ext}")
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def build_table(ids, geoms) -> pa.Table:
+    """由 id 与 shapely 几何数组构造分块表"""
+    geoms = np.asarray(geoms, dtype=object)
+    bounds = shapely.bounds(geoms).reshape(-1, 4)
+    return pa.Table.from_arrays(
+        [
+            pa.array([str(i) for i in ids], type=pa.string()),
+            pa.array(shapely.to_wkb(geoms), type=pa.binary()),
+            pa.array(shapely.area(geoms), type=pa.float64()),
+            pa.array(bounds[:, 0], type=pa.float64()),
+            pa.array(bounds[:, 1], type=pa.float64()),
+            pa.array(bounds[:, 2], type=pa.float64()),
+            pa.array(bounds[:, 3], type=pa.float64()),
+        ],
+        schema=SCHEMA,
+    )
+
+
+def write_partition(path: str, ids, geoms):
+    """写出单个网格的 Parquet 分块"""
+    pq.write_table(build_table(ids, geoms), path)
+
+
+def open_writer(path: str) -> pq.ParquetWriter:
+    """打开可追加的分块写入器，每次 write_table(build_table(...)) 追加一个 row group"""
+    return pq.ParquetWriter(path, SCHEMA)
+
+
+def _read_legacy_csv(path: str) -> pd.DataFrame:
+    df = pd.read_csv(path)
+    geoms = shapely.from_wkt(
+        df["geometry"].astype(str).str.replace('"', "").to_numpy(), on_invalid="ignore"
+    )
+    keep = ~shapely.is_missing(geoms)
+    df = df.loc[keep].reset_index(drop=True)
+    geoms = geoms[keep]
+    bounds = shapely.bounds(geoms).reshape(-1, 4)
+    out = pd.DataFrame(
+        {
+            "id": df["id"].astype(str).to_numpy() if "id" in df.columns else np.arange(len(df)).astype(str),
+            "area": shapely.area(geoms),
+            "minx": bounds[:, 0],
+            "miny": bounds[:, 1],
+            "maxx": bounds[:, 2],
+            "maxy": bounds[:, 3],
+        }
+    )
+    out["geom"] = geoms
+    return out
+
+
+def read_partition(path: str, with_geom: bool = True, rows: Optional[Sequence[int]] = None) -> pd.DataFrame:
+    """
+    读取分块，返回 DataFrame：id, area, minx, miny, maxx, maxy[, geom]。
+    geom 为 shapely 几何（由 WKB 解析，不经过 WKT）；with_geom=False 时只读属性列。
+    rows 为分块内行号（通常来自 open_index 查询），只解析这些行；DataFrame 的索引始终是分块内行号。
+    """
+    if path.endswith(LEGACY_EXT):
+        df = _read_legacy_csv(path)
+        if rows is not None:
+            df = df.loc[sorted(rows)]
+        return df if with_geom else df.drop(columns=["geom"])
+
+    columns = ["id", "area", "minx", "miny", "maxx", "maxy"]
+    if with_geom:
+        columns.append("geometry")
+    table = pq.read_table(path, columns=columns)
+    row_index = pd.RangeIndex(table.num_rows)
+    if rows is not None:
+        row_index = pd.Index(np.sort(np.asarray(list(rows), dtype=np.int64)))
+        table = table.take(pa.array(row_index.to_numpy()))
+    df = table.drop(["geometry"]).to_pandas() if with_geom else table.to_pandas()
+    df.index = row_index
+    if with_geom:
+        df["geom"] = shapely.from_wkb(table.column("geometry").to_numpy(zero_copy_only=False))
+    return df
+
+
+def _index_base(path: str) -> str:
+    part_dir, name = os.path.split(path)
+    return os.path.join(part_dir, INDEX_DIR, os.path.splitext(name)[0])
+
+
+def build_index(path: str) -> str:
+    """由分块的 bbox 列批量构建（STR bulk load）磁盘 R-tree，返回索引路径前缀"""
+    base = _index_base(path)
+    os.makedirs(os.path.dirname(base), exist_ok=True)
+    df = read_partition(path, with_geom=False)
+    bounds = df[["minx", "miny", "maxx", "maxy"]].to_numpy()
+    props = index.Property()
+    props.overwrite = True
+    tmp = f"{base}.{uuid.uuid4().hex[:8]}.tmp"
+    if len(bounds):
+        stream = ((int(i), tuple(b), None) for i, b in zip(df.index, bounds))
+        idx = index.Index(tmp, stream, properties=props)
+    else:
+        idx = index.Index(tmp, properties=props)
+    idx.close()
+    # 先替换 .dat 再替换 .idx：.idx 的 mtime 作为索引新鲜度标记
+    os.replace(f"{tmp}.dat", f"{base}.dat")
+    os.replace(f"{tmp}.idx", f"{base}.idx")
+    return base
+
+
+def open_index(path: str) -> index.Index:
+    """打开分块的磁盘 R-tree；不存在或分块已更新时先重建"""
+    base = _index_base(path)
+    stamp = f"{base}.idx"
+    if not os.path.exists(stamp) or os.stat(stamp).st_mtime_ns < os.stat(path).st_mtime_ns:
+        build_index(path)
+    return index.Index(base)
+
+
+def partition_stats(path: str, cell) -> dict:
+    """
+    网格统计（写入 manifest）：行数、数据外包框、总面积、字节数，
+    以及参考点（自身左下角）归属本网格的行数与面积，用于不读分块直接得到面积。
+    """
+    df = read_partition(path, with_geom=False)
+    own = cell.owns(df["minx"].to_numpy(), df["miny"].to_numpy())
+    empty = df.empty
+    return {
+        "rows": int(len(df)),
+        "bbox": None
+        if empty
+        else [float(df["minx"].min()), float(df["miny"].min()), float(df["maxx"].max()), float(df["maxy"].max())],
+        "area": float(df["area"].sum()),
+        "owned_rows": int(own.sum()),
+        "owned_area": float(df["area"].to_numpy()[own].sum()),
+        "bytes": os.path.getsize(path),
+    }
+
+
+def partition_version(path: str) -> str:
+    """分块版本：文件 mtime_ns 与大小，分块重写后即变化"""
+    st = os.stat(path)
+    return f"{st.st_mtime_ns}-{st.st_size}"
+
+
+def dataset_version(base: str) -> str:
+    """数据集版本：全部分块版本的摘要，任一分块重写、新增或删除后即变化"""
+    digest = hashlib.sha1()
+    for gid in list_grids(base):
+        digest.update(f"{gid}:{partition_version(partition_path(base, gid))};".encode())
+    return digest.hexdigest()
+
+
+def pair_path(base_a: str, base_b: str, cell_a: str, cell_b: str) -> str:
+    return os.path.join(base_a, PAIR_DIR, os.path.basename(os.path.normpath(base_b)), f"{cell_a}__{cell_b}{PARTITION_EXT}")
+
+
+def write_pairs(path: str, data: dict, version_a: str, version_b: str):
+    """写出网格对交集表（列见 PAIR_SCHEMA），附带两侧分块版本；先写临时文件再替换"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = pa.Table.from_pydict(data, schema=PAIR_SCHEMA).replace_schema_metadata(
+        {b"version_a": version_a.encode(), b"version_b": version_b.encode()}
+    )
+    tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+
+
+def read_pairs(path: str, version_a: str, version_b: str) -> Optional[pd.DataFrame]:
+    """读取网格对交集表；不存在或任一侧分块版本已变化时返回 None"""
+    if not os.path.exists(path):
+        return None
+    meta = pq.read_schema(path).metadata or {}
+    if meta.get(b"version_a") != version_a.encode() or meta.get(b"version_b") != version_b.encode():
+        return None
+    return pq.read_table(path).to_pandas()
+
+
+def remove_pairs(root: str, dataset: str):
+    """删除 root 下各数据集中以 dataset 为 B 侧的交集表（dataset 重建时调用）"""
+    if not os.path.isdir(root):
+        return
+    for name in os.listdir(root):
+        shutil.rmtree(os.path.join(root, name, PAIR_DIR, dataset), ignore_errors=True)
+
+
+def remove_cell_pairs(root: str, dataset: str, cells):
+    """删除涉及 dataset 中指定网格的交集表（两侧均可），增量更新后调用；返回删除的文件数"""
+    cells = set(cells)
+    removed = 0
+    if not os.path.isdir(root):
+        return removed
+    for name in os.listdir(root):
+        pair_root = os.path.join(root, name, PAIR_DIR)
+        if not os.path.isdir(pair_root):
+            continue
+        for other in os.listdir(pair_root):
+            if name != dataset and other != dataset:
+                continue
+            pair_dir = os.path.join(pair_root, other)
+            for f in os.listdir(pair_dir):
+                cell_a, _, cell_b = f[: -len(PARTITION_EXT)].partition("__")
+                if (name == dataset and cell_a in cells) or (other == dataset and cell_b in cells):
+                    os.remove(os.path.join(pair_dir, f))
+                    removed += 1
+    return removed
+
+
+def migrate_csv_partitions(base: str, remove_csv: bool = True) -> int:
+    """将目录下旧版 WKT CSV 分块转换为 Parquet，返回转换的分块数"""
+    migrated = 0
+    for f in sorted(os.listdir(base)):
+        if not f.endswith(LEGACY_EXT):
+            continue
+        src = os.path.join(base, f)
+        df = _read_legacy_csv(src)
+        target = os.path.join(base, f[: -len(LEGACY_EXT)] + PARTITION_EXT)
+        write_partition(target, df["id"], df["geom"].to_numpy())
+        build_index(target)
+        if remove_csv:
+            os.remove(src)
+        migrated += 1
+    return migrated
+
+
+if __name__ == "__main__":
+    # 用法: python partition_store.py <partitioned_data/{prefix}> [...]
+    if len(sys.argv) < 2:
+        print("Usage: python partition_store.py <partition_dir> [<partition_dir> ...]")
+        sys.exit(1)
+    for d in sys.argv[1:]:
+        n = migrate_csv_partitions(d)
+        print(f"✅ {d}: 转换 {n} 个 CSV 分块为 Parquet")
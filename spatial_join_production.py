@@ -4,8 +4,14 @@ import math
 import time
 import json
 import csv
+import heapq
+import itertools
+import zlib
 from io import StringIO
+from pyspark import AccumulatorParam, StorageLevel
+from pyspark.rdd import portable_hash
 from pyspark.sql import SparkSession
+from pyspark.sql.types import DoubleType, StringType, StructField, StructType
 from typing import List, Dict, Tuple, Optional
 
 # ==========================================
@@ -17,6 +23,24 @@ GLOBAL_BOUNDS = (-115.540436, -59.913738, 114.821777, 54.987061)
 # *** 针对大数据量的优化 ***
 NUM_DIVISIONS = 50      # 增加网格密度到 50x50 = 2500 个网格，减少每个任务的计算压力
 EPSILON = 1e-9          
+MIN_INTER_AREA = 1e-9   # 交集面积不超过该值的对不输出
+MAP_BATCH_ROWS = 10_000  # map 阶段每批向量化解析的行数
+
+# 结果 Parquet 的列
+RESULT_SCHEMA = StructType([
+    StructField("id_a", StringType(), False),
+    StructField("id_b", StringType(), False),
+    StructField("area_a", DoubleType(), False),
+    StructField("area_b", DoubleType(), False),
+    StructField("inter_area", DoubleType(), False),
+])
+
+# 倾斜处理：抽样估计每个网格的 A/B 数量，热点网格拆成多个子 key，按估计代价分配分区
+SAMPLE_FRACTION = 0.01  # 抽样比例
+SAMPLE_SEED = 42
+SKEW_FACTOR = 4.0       # 估计代价超过平均每分区代价该倍数的网格视为热点
+MAX_SPLITS = 64         # 单个网格最多拆成的子 key 数
+SKEW_REPORT_TOP = 10    # 倾斜报告列出的最慢网格数
 
 # 预计算网格参数
 MIN_X, MIN_Y, MAX_X, MAX_Y = GLOBAL_BOUNDS
@@ -26,7 +50,7 @@ CELL_W = WIDTH / NUM_DIVISIONS
 CELL_H = HEIGHT / NUM_DIVISIONS
 
 # ==========================================
-# 1. 核心函数 (保持不变，仅优化引用)
+# 1. 核心函数
 # ==========================================
 
 def parse_csv_line(line: str) -> Optional[Tuple[str, str]]:
@@ -44,74 +68,293 @@ def parse_csv_line(line: str) -> Optional[Tuple[str, str]]:
     except Exception:
         return None
 
-def map_to_grid_key(iter_rows, role: str, grid_params: Dict) -> List[Tuple[str, Tuple]]:
-    """将几何体映射到网格索引 (支持多重映射)"""
-    from shapely import wkt
-    import math 
-    
-    results = []
+def map_to_grid_key(iter_rows, grid_params: Dict):
+    """
+    将几何体映射到网格索引 (支持多重映射)。
+    按批向量化解析 WKT 并修复无效几何，之后以 WKB 传输：每个多边形只解析一次 WKT，
+    连接端用 from_wkb 批量还原。输出 (grid_key, (obj_id, wkb, area, home))，
+    home 仅在几何的起始网格 (外包框左下角所在网格) 为 True，用于每个几何只计一次面积。
+    """
+    import numpy as np
+    import shapely
+
     _MIN_X, _MIN_Y = grid_params['MIN_X'], grid_params['MIN_Y']
     _CELL_W, _CELL_H = grid_params['CELL_W'], grid_params['CELL_H']
     _NUM_DIVISIONS = grid_params['NUM_DIVISIONS']
     _EPSILON = grid_params['EPSILON']
-    
-    for row in iter_rows:
-        if not row: continue
-        obj_id, wkt_str = row
-        
-        try:
-            geom = wkt.loads(wkt_str)
-            if not geom.is_valid: geom = geom.buffer(0)
-            if geom.is_empty: continue
-            
-            min_x, min_y, max_x, max_y = geom.bounds
-            area = geom.area 
-            
-            start_col = max(0, math.floor((min_x - _MIN_X) / _CELL_W))
-            start_row = max(0, math.floor((min_y - _MIN_Y) / _CELL_H))
-            end_col = min(_NUM_DIVISIONS - 1, math.floor((max_x - _MIN_X) / _CELL_W + _EPSILON))
-            end_row = min(_NUM_DIVISIONS - 1, math.floor((max_y - _MIN_Y) / _CELL_H + _EPSILON))
-
-            for r in range(start_row, end_row + 1):
-                for c in range(start_col, end_col + 1):
-                    grid_key = f"{r}_{c}"
-                    # 只保留必要数据以节省传输带宽
-                    results.append((grid_key, (obj_id, wkt_str, area, role)))
-        except Exception:
-            pass
-            
-    return results
-
-def calculate_intersection(pair_data) -> Optional[str]:
+
+    rows = (row for row in iter_rows if row)
+    while True:
+        batch = list(itertools.islice(rows, MAP_BATCH_ROWS))
+        if not batch:
+            break
+        ids = np.array([r[0] for r in batch], dtype=object)
+        geoms = shapely.from_wkt(np.array([r[1] for r in batch], dtype=object), on_invalid="ignore")
+        fix = ~shapely.is_missing(geoms) & ~shapely.is_valid(geoms)
+        if fix.any():
+            geoms[fix] = shapely.buffer(geoms[fix], 0)
+        keep = ~shapely.is_missing(geoms) & ~shapely.is_empty(geoms)
+        ids, geoms = ids[keep], geoms[keep]
+
+        bounds = shapely.bounds(geoms).reshape(-1, 4)
+        areas = shapely.area(geoms)
+        wkbs = shapely.to_wkb(geoms)
+        start_col = np.maximum(0, np.floor((bounds[:, 0] - _MIN_X) / _CELL_W)).astype(int)
+        start_row = np.maximum(0, np.floor((bounds[:, 1] - _MIN_Y) / _CELL_H)).astype(int)
+        end_col = np.minimum(_NUM_DIVISIONS - 1, np.floor((bounds[:, 2] - _MIN_X) / _CELL_W + _EPSILON)).astype(int)
+        end_row = np.minimum(_NUM_DIVISIONS - 1, np.floor((bounds[:, 3] - _MIN_Y) / _CELL_H + _EPSILON)).astype(int)
+
+        for i in range(len(ids)):
+            obj_id, wkb, area = ids[i], wkbs[i], float(areas[i])
+            for r in range(start_row[i], end_row[i] + 1):
+                for c in range(start_col[i], end_col[i] + 1):
+                    yield f"{r}_{c}", (obj_id, wkb, area, bool(r == start_row[i] and c == start_col[i]))
+
+
+def intersection_areas(geoms_a, geoms_b):
+    """逐对交集面积 (向量化)；个别几何触发 GEOS 拓扑错误时退回逐对计算，出错的对记为 0"""
+    import numpy as np
+    import shapely
+
+    try:
+        return shapely.area(shapely.intersection(geoms_a, geoms_b))
+    except shapely.errors.GEOSException:
+        out = np.zeros(len(geoms_a))
+        for k, (g1, g2) in enumerate(zip(geoms_a, geoms_b)):
+            try:
+                out[k] = g1.intersection(g2).area
+            except shapely.errors.GEOSException:
+                pass
+        return out
+
+
+def cell_of_key(key: str) -> Tuple[int, int]:
+    """key ("r_c" 或拆分后的 "r_c#j") 对应的网格 (row, col)"""
+    r, c = key.split("#", 1)[0].split("_")
+    return int(r), int(c)
+
+def join_cell(cell, grid_params: Dict) -> List[Tuple[str, str, float, float, float]]:
     """
-    计算相交。
-    注意：返回格式改为 CSV 字符串，方便直接写入文件
+    单网格 (或拆分后的子 key) 的局部空间连接 (分组后每个 key 调用一次)：
+    A/B 各自从 WKB 批量还原一次，B 建 STRtree，A 整批查询相交候选，再向量化求交，
+    工作量与实际候选对数成正比，而不是每个网格 |A|·|B|。
+    跨网格的对只由参考点 (两个外包框交集的左下角) 所在的网格输出，结果不含重复，无需 distinct。
+    返回 (id_a, id_b, area_a, area_b, inter_area)
     """
-    try:
-        from shapely import wkt
-    except ImportError:
-        return None
-    
-    _, (item_a, item_b) = pair_data
-    id_a, wkt_a, area_a, _ = item_a
-    id_b, wkt_b, area_b, _ = item_b
-    
-    if id_a == id_b: return None
+    import numpy as np
+    import shapely
 
-    try:
-        g1 = wkt.loads(wkt_a)
-        g2 = wkt.loads(wkt_b)
-        if not g1.is_valid: g1 = g1.buffer(0)
-        if not g2.is_valid: g2 = g2.buffer(0)
-        
-        if g1.intersects(g2):
-            inter = g1.intersection(g2)
-            if not inter.is_empty and inter.area > 1e-9:
-                # 返回格式: id_a, id_b, area_a, area_b, intersection_area
-                return f"{id_a},{id_b},{area_a},{area_b},{inter.area}"
-    except Exception:
-        pass
-    return None
+    _MIN_X, _MIN_Y = grid_params['MIN_X'], grid_params['MIN_Y']
+    _CELL_W, _CELL_H = grid_params['CELL_W'], grid_params['CELL_H']
+    _NUM_DIVISIONS = grid_params['NUM_DIVISIONS']
+
+    key, (items_a, items_b) = cell
+    items_a, items_b = list(items_a), list(items_b)
+    if not items_a or not items_b:
+        return []
+    ids_a, wkb_a, area_a, _ = (np.array(col, dtype=object) for col in zip(*items_a))
+    ids_b, wkb_b, area_b, _ = (np.array(col, dtype=object) for col in zip(*items_b))
+    geoms_a = shapely.from_wkb(wkb_a)
+    geoms_b = shapely.from_wkb(wkb_b)
+
+    ia, ib = shapely.STRtree(geoms_b).query(geoms_a, predicate="intersects")
+    same = ids_a[ia] == ids_b[ib]
+    ia, ib = ia[~same], ib[~same]
+
+    # 参考点与 map_to_grid_key 的起始网格用同一公式，必落在两个几何各自覆盖的网格范围内
+    bounds_a = shapely.bounds(geoms_a).reshape(-1, 4)
+    bounds_b = shapely.bounds(geoms_b).reshape(-1, 4)
+    ref_x = np.maximum(bounds_a[ia, 0], bounds_b[ib, 0])
+    ref_y = np.maximum(bounds_a[ia, 1], bounds_b[ib, 1])
+    ref_col = np.clip(np.floor((ref_x - _MIN_X) / _CELL_W), 0, _NUM_DIVISIONS - 1)
+    ref_row = np.clip(np.floor((ref_y - _MIN_Y) / _CELL_H), 0, _NUM_DIVISIONS - 1)
+    row, col = cell_of_key(key)
+    own = (ref_row == row) & (ref_col == col)
+    ia, ib = ia[own], ib[own]
+
+    inter = intersection_areas(geoms_a[ia], geoms_b[ib])
+    hit = inter > MIN_INTER_AREA
+    return [
+        (a, b, float(sa), float(sb), float(si))
+        for a, b, sa, sb, si in zip(ids_a[ia[hit]], ids_b[ib[hit]], area_a[ia[hit]], area_b[ib[hit]], inter[hit])
+    ]
+
+# ==========================================
+# 2. 倾斜处理
+# ==========================================
+
+def estimate_cost(n_a: float, n_b: float) -> float:
+    """单个 key 的估计代价：B 建树 + A 逐个查询 (n_a·log n_b)"""
+    return n_a + n_b + n_a * math.log2(n_b + 2)
+
+def split_cost(n_a: float, n_b: float, side: str, k: float) -> float:
+    """把 side 一侧拆成 k 份后每个子 key 的估计代价"""
+    return estimate_cost(n_a / k, n_b) if side == 'A' else estimate_cost(n_a, n_b / k)
+
+def sample_cell_counts(rdd, fraction: float, bc_grid) -> Dict[str, float]:
+    """抽样 pre-pass：按抽样比例放大后的每个网格的几何数 (含跨网格复制)"""
+    sampled = rdd.sample(False, fraction, SAMPLE_SEED).mapPartitions(lambda i: map_to_grid_key(i, bc_grid.value))
+    return {key: n / fraction for key, n in sampled.keys().countByValue().items()}
+
+def plan_skew(counts_a: Dict[str, float], counts_b: Dict[str, float], num_partitions: int):
+    """
+    根据估计数量制定拆分与分区计划：
+    估计代价超过平均每分区代价 SKEW_FACTOR 倍的网格，把拆分后代价更低的一侧按 id 哈希拆成 k 份 ("r_c#j")，
+    另一侧复制到全部 k 个子 key；所有 key 按估计代价从大到小贪心分给当前负载最小的分区 (LPT)。
+    返回 (splits {网格: (拆分侧 'A'/'B', k)}, assignment {key: 分区号},
+    costs {网格: 估计代价}, units {key: 估计代价})，key 为网格或拆分后的子 key
+    """
+    costs = {}
+    for key in set(counts_a) | set(counts_b):
+        costs[key] = estimate_cost(counts_a.get(key, 0), counts_b.get(key, 0))
+    target = sum(costs.values()) / num_partitions if costs else 0.0
+
+    splits, units = {}, {}
+    for key, cost in costs.items():
+        n_a, n_b = counts_a.get(key, 0), counts_b.get(key, 0)
+        if cost <= SKEW_FACTOR * target or not (n_a and n_b):
+            units[key] = cost
+            continue
+        k = min(MAX_SPLITS, math.ceil(cost / target))
+        side = min(('A', 'B'), key=lambda sd: split_cost(n_a, n_b, sd, k))
+        # 复制侧的代价不随 k 减小，拆得再细也降不到它以下
+        k = max(2, min(k, math.ceil(cost / split_cost(n_a, n_b, side, float('inf')))))
+        splits[key] = (side, k)
+        sub = split_cost(n_a, n_b, side, k)
+        for j in range(k):
+            units[f"{key}#{j}"] = sub
+
+    loads = [(0.0, pid) for pid in range(num_partitions)]
+    assignment = {}
+    for key, cost in sorted(units.items(), key=lambda kv: kv[1], reverse=True):
+        load, pid = heapq.heappop(loads)
+        assignment[key] = pid
+        heapq.heappush(loads, (load + cost, pid))
+    return splits, assignment, costs, units
+
+def split_hot_cells(iter_pairs, side: str, splits: Dict[str, Tuple[str, int]]):
+    """
+    按拆分计划改写 key：拆分侧按 id 的 crc32 落到一个子 key，另一侧复制到全部子 key
+    (复制的副本只在 #0 保留 home 标记，面积仍只计一次)
+    """
+    for key, value in iter_pairs:
+        plan = splits.get(key)
+        if plan is None:
+            yield key, value
+        elif plan[0] == side:
+            yield f"{key}#{zlib.crc32(str(value[0]).encode()) % plan[1]}", value
+        else:
+            yield f"{key}#0", value
+            for j in range(1, plan[1]):
+                yield f"{key}#{j}", value[:3] + (False,)
+
+def make_partitioner(bc_assignment):
+    """按计划分区；抽样中未出现的 key 退回默认哈希"""
+    def partition(key):
+        pid = bc_assignment.value.get(key)
+        return portable_hash(key) if pid is None else pid
+    return partition
+
+def split_sides(values) -> Tuple[List, List]:
+    """union + groupByKey 后按标记 (0 为 A，1 为 B) 拆回两侧，与 cogroup 的输出形式一致"""
+    items_a, items_b = [], []
+    for tag, item in values:
+        (items_b if tag else items_a).append(item)
+    return items_a, items_b
+
+class CellStatsParam(AccumulatorParam):
+    """
+    每个 key 的诊断统计累加器：{key: (n_a, n_b, 输出对数, 秒)}，n_a/n_b 含跨网格复制；
+    只用于倾斜报告，任务重试或推测执行时会重复计入，不能用于汇总结果
+    """
+
+    def zero(self, value):
+        return {}
+
+    def addInPlace(self, stats, other):
+        for key, v in other.items():
+            old = stats.get(key)
+            stats[key] = v if old is None else tuple(x + y for x, y in zip(old, v))
+        return stats
+
+def join_cell_with_stats(cell, grid_params: Dict, acc) -> Tuple[str, List[Tuple], Tuple]:
+    """
+    join_cell 并返回 (key, 输出对, 汇总)，汇总为 (A 几何数, B 几何数, A 面积, B 面积, 交集面积, 输出对数)，
+    只计起始网格在该 key 的几何，由 action 端归约；数量与耗时另记入诊断累加器
+    """
+    t0 = time.perf_counter()
+    out = join_cell(cell, grid_params)
+    key, (items_a, items_b) = cell
+    acc.add({key: (len(items_a), len(items_b), len(out), time.perf_counter() - t0)})
+    home_a = [item[2] for item in items_a if item[3]]
+    home_b = [item[2] for item in items_b if item[3]]
+    totals = (len(home_a), len(home_b), sum(home_a), sum(home_b), sum(r[4] for r in out), len(out))
+    return key, out, totals
+
+def add_totals(x: Tuple, y: Tuple) -> Tuple:
+    """逐项相加两个汇总元组"""
+    return tuple(a + b for a, b in zip(x, y))
+
+def imbalance(loads) -> Tuple[float, float]:
+    """(最大分区负载, 最大/平均)；平均按全部分区计"""
+    loads = list(loads)
+    mean = sum(loads) / len(loads) if loads else 0.0
+    peak = max(loads) if loads else 0.0
+    return peak, (peak / mean if mean else 0.0)
+
+def print_skew_report(plan, counts_a, counts_b, cell_stats, num_partitions: int):
+    """打印倾斜报告：拆分的网格、按默认哈希与按计划分区的估计负载、实际最慢的 key 与实际分区负载"""
+    splits, assignment, costs, units = plan
+    print("=" * 60)
+    print("倾斜报告")
+    print(f"抽样网格数: {len(costs)}，拆分网格数: {len(splits)}")
+    for key, (side, k) in sorted(splits.items(), key=lambda kv: costs[kv[0]], reverse=True)[:SKEW_REPORT_TOP]:
+        print(f"  拆分 {key}: 估计 A={counts_a.get(key, 0):,.0f} B={counts_b.get(key, 0):,.0f}，按 {side} 拆成 {k} 份")
+
+    hash_loads = [0.0] * num_partitions
+    for key, cost in costs.items():
+        hash_loads[portable_hash(key) % num_partitions] += cost
+    plan_loads = [0.0] * num_partitions
+    for key, pid in assignment.items():
+        plan_loads[pid] += units[key]
+    _, hash_ratio = imbalance(hash_loads)
+    _, plan_ratio = imbalance(plan_loads)
+    print(f"估计分区负载 最大/平均: 默认哈希 {hash_ratio:.2f}，按计划 {plan_ratio:.2f}")
+
+    actual_loads = [0.0] * num_partitions
+    for key, (_, _, _, seconds) in cell_stats.items():
+        pid = assignment.get(key)
+        actual_loads[(portable_hash(key) if pid is None else pid) % num_partitions] += seconds
+    peak, ratio = imbalance(actual_loads)
+    print(f"实际分区耗时 最大 {peak:.2f}s，最大/平均 {ratio:.2f}")
+    print(f"最慢的 {SKEW_REPORT_TOP} 个 key:")
+    slowest = sorted(cell_stats.items(), key=lambda kv: kv[1][3], reverse=True)[:SKEW_REPORT_TOP]
+    for key, (n_a, n_b, pairs, seconds) in slowest:
+        print(f"  {key}: A={n_a:,} B={n_b:,} 输出 {pairs:,} 对，{seconds:.2f}s")
+    print("=" * 60)
+
+def build_summary(cell_totals: Dict[str, Tuple]) -> Dict:
+    """
+    由各网格的汇总 {"r_c": (A 几何数, B 几何数, A 面积, B 面积, 交集面积, 输出对数)} 计算全局 Jaccard：
+    A/B 面积按起始网格每个几何只计一次，交集面积与对数来自参考点去重后的输出
+    """
+    fields = ("rows_a", "rows_b", "area_a", "area_b", "inter", "pairs")
+    cells = {key: dict(zip(fields, totals)) for key, totals in cell_totals.items()}
+    area_a = sum(cell["area_a"] for cell in cells.values())
+    area_b = sum(cell["area_b"] for cell in cells.values())
+    inter = sum(cell["inter"] for cell in cells.values())
+    union = area_a + area_b - inter
+    return {
+        "rows_a": sum(cell["rows_a"] for cell in cells.values()),
+        "rows_b": sum(cell["rows_b"] for cell in cells.values()),
+        "area_a": area_a,
+        "area_b": area_b,
+        "inter": inter,
+        "union": union,
+        "jaccard": inter / union if union > 0 else 0.0,
+        "pairs": sum(cell["pairs"] for cell in cells.values()),
+        "cells": dict(sorted(cells.items(), key=lambda kv: cell_of_key(kv[0]))),
+    }
 
 # ==========================================
 # 3. 主程序
@@ -120,12 +363,14 @@ def calculate_intersection(pair_data) -> Optional[str]:
 if __name__ == "__main__":
     # 检查参数
     if len(sys.argv) < 4:
-        print("Usage: spark-submit spatial_join_production.py <input_path_1> <input_path_2> <output_path>")
+        print("Usage: spark-submit spatial_join_production.py <input_path_1> <input_path_2> <output_parquet_dir> [summary_json]")
         sys.exit(1)
 
     input_path_1 = sys.argv[1]
     input_path_2 = sys.argv[2]
     output_path = sys.argv[3]
+    # 汇总 JSON 由 driver 写到本地路径
+    summary_path = sys.argv[4] if len(sys.argv) > 4 else "spatial_join_summary.json"
 
     print(f"正在处理: \nInput 1: {input_path_1}\nInput 2: {input_path_2}\nOutput: {output_path}")
 
@@ -150,29 +395,68 @@ if __name__ == "__main__":
     rdd1 = sc.textFile(input_path_1, minPartitions=min_parts).map(parse_csv_line).filter(lambda x: x is not None)
     rdd2 = sc.textFile(input_path_2, minPartitions=min_parts).map(parse_csv_line).filter(lambda x: x is not None)
 
-    # 2. Map Phase & Repartition
+    # 2. Sampling Pre-pass
     # 分区数设为网格数的 1-2 倍比较合适，这里设为 2500
     join_partitions = NUM_DIVISIONS * NUM_DIVISIONS 
-    
-    rdd1_mapped = rdd1.mapPartitions(lambda i: map_to_grid_key(i, 'A', bc_grid.value)).repartition(join_partitions)
-    rdd2_mapped = rdd2.mapPartitions(lambda i: map_to_grid_key(i, 'B', bc_grid.value)).repartition(join_partitions)
 
-    # 3. Join Phase
-    joined = rdd1_mapped.join(rdd2_mapped)
+    # 抽样估计每个网格的 A/B 数量，拆分热点网格并按估计代价分配分区，避免少数网格拖慢整个作业
+    counts_a = sample_cell_counts(rdd1, SAMPLE_FRACTION, bc_grid)
+    counts_b = sample_cell_counts(rdd2, SAMPLE_FRACTION, bc_grid)
+    plan = plan_skew(counts_a, counts_b, join_partitions)
+    splits, assignment = plan[0], plan[1]
+    bc_splits = sc.broadcast(splits)
+    bc_assignment = sc.broadcast(assignment)
+    print(f"抽样完成: {len(plan[2])} 个网格，拆分 {len(splits)} 个热点网格")
+
+    # 3. Map Phase
+    rdd1_mapped = rdd1.mapPartitions(lambda i: split_hot_cells(map_to_grid_key(i, bc_grid.value), 'A', bc_splits.value))
+    rdd2_mapped = rdd2.mapPartitions(lambda i: split_hot_cells(map_to_grid_key(i, bc_grid.value), 'B', bc_splits.value))
 
-    # 4. Reduce/Calc Phase & Save
+    # 4. Join Phase
+    # 按 key 分组 (一次 shuffle)，每个 key 的 A/B 在同一个任务内做局部空间连接，不再生成 A×B 笛卡尔积；
+    # cogroup 不支持自定义分区函数，这里给两侧打标记后 union + groupByKey，按计划分区
+    tagged = rdd1_mapped.mapValues(lambda v: (0, v)).union(rdd2_mapped.mapValues(lambda v: (1, v)))
+    grouped = tagged.groupByKey(join_partitions, make_partitioner(bc_assignment)).mapValues(split_sides)
+
+    # 5. Reduce/Calc Phase & Save
     # 直接计算并保存，不要 collect()!
-    result_rdd = joined.map(calculate_intersection).filter(lambda x: x is not None)
-    
-    # 去重 (如果跨网格可能会产生重复对，使用 distinct 或者 reduceByKey 去重)
-    # 对于字符串输出，distinct() 最简单
-    final_rdd = result_rdd.distinct()
+    # 连接结果缓存一次，写 Parquet 与汇总两个 action 共用，不重复连接
+    cell_stats = sc.accumulator({}, CellStatsParam())
+    joined = grouped.map(lambda cell: join_cell_with_stats(cell, bc_grid.value, cell_stats))
+    joined.persist(StorageLevel.MEMORY_AND_DISK)
+    result_rdd = joined.flatMap(lambda r: r[1])
+
+    # 每对只由参考点所在网格输出，不再需要 distinct() 的第二次 shuffle；结果写为 Parquet
+    result_df = spark.createDataFrame(result_rdd, RESULT_SCHEMA)
 
     # 保存结果到 HDFS 或 本地路径
-    final_rdd.saveAsTextFile(output_path)
+    result_df.write.mode("overwrite").parquet(output_path)
+
+    # 6. Global Jaccard
+    # 面积在 map 阶段已算出，由 action 归约到 driver (拆分的子 key 合并回所属网格)，
+    # 任务重试不会重复计入，也不再需要 cal.py 重读原始数据集
+    cell_totals = (
+        joined.map(lambda r: ("{}_{}".format(*cell_of_key(r[0])), r[2]))
+        .reduceByKey(add_totals)
+        .collectAsMap()
+    )
+    joined.unpersist()
 
     end_time = time.time()
+    print_skew_report(plan, counts_a, counts_b, cell_stats.value, join_partitions)
+
+    summary = build_summary(cell_totals)
+    summary["seconds"] = end_time - start_time
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=1)
+    print(f" Dataset A 总面积 : {summary['area_a']:,.4f} ({summary['rows_a']:,} 个)")
+    print(f" Dataset B 总面积 : {summary['area_b']:,.4f} ({summary['rows_b']:,} 个)")
+    print(f" 交集总面积 (I)   : {summary['inter']:,.4f} ({summary['pairs']:,} 对)")
+    print(f" 并集总面积 (U)   : {summary['union']:,.4f}")
+    print(f" ★ Global Jaccard : {summary['jaccard']:.10f}")
+
     print(f"任务完成！耗时: {end_time - start_time:.2f} 秒")
     print(f"结果已保存至: {output_path}")
+    print(f"汇总已保存至: {summary_path}")
     
     spark.stop()
\ No newline at end of file
@@ -0,0 +1,345 @@
+"""
+任务队列与结果存储。
+
+默认使用 SQLite（TASK_DB，默认项目目录下 tasks.db），无需外部服务，多个 uvicorn worker
+与独立的计算 worker 进程（task_worker.py）共享同一份任务表；TASK_STORE=memory 时退回进程内字典
+（仅适合单进程调试）。已结束任务在 TASK_RESULT_TTL 秒后清除。
+
+任务状态：PENDING -> RUNNING -> DONE / FAILED / CANCELLED。运行中的任务定期写入进度
+（见 parti2_local.JoinProgress）；执行任务的 worker 另以固定间隔写心跳（heartbeat，与网格对是否完成无关），
+超过 TASK_STALE_SECONDS 没有心跳的任务重新排队并清空进度。任务被重新排队后，原 worker 的心跳、进度与
+结果写入都因 worker 不再匹配而失效。取消运行中的任务只设置标记，由 worker 在网格对之间停止。
+"""
+import abc
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from typing import Dict, Optional, Tuple
+
+TASK_DB = os.environ.get("TASK_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "tasks.db"))
+TASK_RESULT_TTL = float(os.environ.get("TASK_RESULT_TTL", 24 * 3600))
+# worker 写心跳的间隔；RUNNING 任务超过 TASK_STALE_SECONDS 没有心跳视为 worker 已退出，重新排队
+TASK_HEARTBEAT_SECONDS = float(os.environ.get("TASK_HEARTBEAT_SECONDS", 10))
+TASK_STALE_SECONDS = float(os.environ.get("TASK_STALE_SECONDS", 6 * TASK_HEARTBEAT_SECONDS))
+
+FINISHED = ("DONE", "FAILED", "CANCELLED")
+
+
+class TaskStore(abc.ABC):
+    """
+    任务存储接口；get 返回 {task_id, status, error, request, result, progress} 或 None。
+    写入运行中任务的方法接受 worker：给出时只在任务仍为 RUNNING 且由该 worker 领取时生效。
+    """
+
+    @abc.abstractmethod
+    def create(self, request: Dict) -> str:
+        ...
+
+    @abc.abstractmethod
+    def claim(self, task_id: Optional[str] = None, worker: str = "") -> Optional[Tuple[str, Dict]]:
+        """领取一个 PENDING 任务（task_id 为 None 时取最早的）并置为 RUNNING，返回 (task_id, request)"""
+
+    @abc.abstractmethod
+    def heartbeat(self, task_id: str, worker: str) -> bool:
+        """刷新任务的心跳；任务已不是该 worker 运行中的任务（如已被重新排队）时返回 False"""
+
+    @abc.abstractmethod
+    def finish(self, task_id: str, result: Dict, worker: Optional[str] = None):
+        ...
+
+    @abc.abstractmethod
+    def fail(self, task_id: str, error: str, worker: Optional[str] = None):
+        ...
+
+    @abc.abstractmethod
+    def get(self, task_id: str) -> Optional[Dict]:
+        ...
+
+    @abc.abstractmethod
+    def set_progress(self, task_id: str, progress: Dict, worker: Optional[str] = None):
+        ...
+
+    @abc.abstractmethod
+    def cancel(self, task_id: str) -> Optional[str]:
+        """请求取消：PENDING 直接置为 CANCELLED，RUNNING 设置取消标记；返回当前状态（任务不存在为 None）"""
+
+    @abc.abstractmethod
+    def cancel_requested(self, task_id: str) -> bool:
+        ...
+
+    @abc.abstractmethod
+    def mark_cancelled(self, task_id: str, worker: Optional[str] = None):
+        ...
+
+    @abc.abstractmethod
+    def purge(self, ttl: float = TASK_RESULT_TTL) -> int:
+        """删除结束超过 ttl 秒的任务，返回删除数"""
+
+    @abc.abstractmethod
+    def requeue_stale(self, seconds: float = TASK_STALE_SECONDS) -> int:
+        """把超过 seconds 秒没有心跳的 RUNNING 任务重新置为 PENDING（清除 worker 与进度），返回数量"""
+
+
+class MemoryTaskStore(TaskStore):
+    """进程内任务表（原 TASKS/RESULTS 字典的行为），不跨进程共享"""
+
+    def __init__(self):
+        self._tasks: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def create(self, request: Dict) -> str:
+        task_id = str(uuid.uuid4())
+        now = time.time()
+        with self._lock:
+            self._tasks[task_id] = {
+                "status": "PENDING",
+                "error": None,
+                "request": request,
+                "result": None,
+                "progress": None,
+                "worker": None,
+                "cancel_requested": False,
+                "created_at": now,
+                "updated_at": now,
+            }
+        return task_id
+
+    def claim(self, task_id: Optional[str] = None, worker: str = ""):
+        with self._lock:
+            pending = [
+                (t["created_at"], tid)
+                for tid, t in self._tasks.items()
+                if t["status"] == "PENDING" and (task_id is None or tid == task_id)
+            ]
+            if not pending:
+                return None
+            _, tid = min(pending)
+            task = self._tasks[tid]
+            task.update(status="RUNNING", worker=worker, updated_at=time.time())
+            return tid, task["request"]
+
+    def _set(self, task_id: str, owner: Optional[str] = None, **fields) -> bool:
+        """更新任务字段；owner 给出时只更新该 worker 运行中的任务，返回是否更新"""
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None or (owner is not None and (task["status"] != "RUNNING" or task["worker"] != owner)):
+                return False
+            task.update(updated_at=time.time(), **fields)
+            return True
+
+    def heartbeat(self, task_id: str, worker: str) -> bool:
+        return self._set(task_id, owner=worker)
+
+    def finish(self, task_id: str, result: Dict, worker: Optional[str] = None):
+        self._set(task_id, owner=worker, status="DONE", result=result)
+
+    def fail(self, task_id: str, error: str, worker: Optional[str] = None):
+        self._set(task_id, owner=worker, status="FAILED", error=error)
+
+    def get(self, task_id: str) -> Optional[Dict]:
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return None
+            return {"task_id": task_id, **{k: task[k] for k in ("status", "error", "request", "result", "progress")}}
+
+    def set_progress(self, task_id: str, progress: Dict, worker: Optional[str] = None):
+        self._set(task_id, owner=worker, progress=progress)
+
+    def cancel(self, task_id: str) -> Optional[str]:
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return None
+            if task["status"] == "PENDING":
+                task.update(status="CANCELLED", updated_at=time.time())
+            elif task["status"] == "RUNNING":
+                task["cancel_requested"] = True
+            return task["status"]
+
+    def cancel_requested(self, task_id: str) -> bool:
+        with self._lock:
+            return bool(self._tasks.get(task_id, {}).get("cancel_requested"))
+
+    def mark_cancelled(self, task_id: str, worker: Optional[str] = None):
+        self._set(task_id, owner=worker, status="CANCELLED")
+
+    def purge(self, ttl: float = TASK_RESULT_TTL) -> int:
+        cutoff = time.time() - ttl
+        with self._lock:
+            old = [tid for tid, t in self._tasks.items() if t["status"] in FINISHED and t["updated_at"] < cutoff]
+            for tid in old:
+                del self._tasks[tid]
+        return len(old)
+
+    def requeue_stale(self, seconds: float = TASK_STALE_SECONDS) -> int:
+        cutoff = time.time() - seconds
+        with self._lock:
+            stale = [t for t in self._tasks.values() if t["status"] == "RUNNING" and t["updated_at"] < cutoff]
+            for t in stale:
+                t.update(status="PENDING", worker=None, progress=None)
+        return len(stale)
+
+
+class SQLiteTaskStore(TaskStore):
+    """SQLite 任务表（WAL 模式），每次操作独立连接，可被多个进程同时使用"""
+
+    def __init__(self, path: str = TASK_DB):
+        self.path = path
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS tasks (
+                    task_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    request TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    worker TEXT,
+                    progress TEXT,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            # 旧版任务表补充列
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(tasks)")}
+            if "progress" not in columns:
+                conn.execute("ALTER TABLE tasks ADD COLUMN progress TEXT")
+            if "cancel_requested" not in columns:
+                conn.execute("ALTER TABLE tasks ADD COLUMN cancel_requested INTEGER NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, created_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create(self, request: Dict) -> str:
+        task_id = str(uuid.uuid4())
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT INTO tasks (task_id, status, request, created_at, updated_at) VALUES (?, 'PENDING', ?, ?, ?)",
+                (task_id, json.dumps(request), now, now),
+            )
+        return task_id
+
+    def claim(self, task_id: Optional[str] = None, worker: str = ""):
+        conn = self._connect()
+        try:
+            # BEGIN IMMEDIATE 取得写锁，保证同一任务只被一个进程领取
+            conn.execute("BEGIN IMMEDIATE")
+            if task_id is None:
+                row = conn.execute(
+                    "SELECT task_id, request FROM tasks WHERE status = 'PENDING' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+            else:
+                row = conn.execute(
+                    "SELECT task_id, request FROM tasks WHERE status = 'PENDING' AND task_id = ?", (task_id,)
+                ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE tasks SET status = 'RUNNING', worker = ?, updated_at = ? WHERE task_id = ?",
+                (worker, time.time(), row["task_id"]),
+            )
+            conn.execute("COMMIT")
+            return row["task_id"], json.loads(row["request"])
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _set(self, task_id: str, owner: Optional[str] = None, **fields) -> bool:
+        """更新任务字段；owner 给出时只更新该 worker 运行中的任务，返回是否更新"""
+        cols = "".join(f"{k} = ?, " for k in fields)
+        sql = f"UPDATE tasks SET {cols}updated_at = ? WHERE task_id = ?"
+        params = [*fields.values(), time.time(), task_id]
+        if owner is not None:
+            sql += " AND status = 'RUNNING' AND worker = ?"
+            params.append(owner)
+        with closing(self._connect()) as conn:
+            return conn.execute(sql, params).rowcount > 0
+
+    def heartbeat(self, task_id: str, worker: str) -> bool:
+        return self._set(task_id, owner=worker)
+
+    def finish(self, task_id: str, result: Dict, worker: Optional[str] = None):
+        self._set(task_id, owner=worker, status="DONE", result=json.dumps(result))
+
+    def fail(self, task_id: str, error: str, worker: Optional[str] = None):
+        self._set(task_id, owner=worker, status="FAILED", error=error)
+
+    def get(self, task_id: str) -> Optional[Dict]:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT task_id, status, error, request, result, progress FROM tasks WHERE task_id = ?", (task_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "task_id": row["task_id"],
+            "status": row["status"],
+            "error": row["error"],
+            "request": json.loads(row["request"]),
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "progress": json.loads(row["progress"]) if row["progress"] else None,
+        }
+
+    def set_progress(self, task_id: str, progress: Dict, worker: Optional[str] = None):
+        self._set(task_id, owner=worker, progress=json.dumps(progress))
+
+    def cancel(self, task_id: str) -> Optional[str]:
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE tasks SET status = 'CANCELLED', updated_at = ? WHERE task_id = ? AND status = 'PENDING'",
+                (time.time(), task_id),
+            )
+            conn.execute("UPDATE tasks SET cancel_requested = 1 WHERE task_id = ? AND status = 'RUNNING'", (task_id,))
+            row = conn.execute("SELECT status FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return row["status"] if row else None
+
+    def cancel_requested(self, task_id: str) -> bool:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT cancel_requested FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def mark_cancelled(self, task_id: str, worker: Optional[str] = None):
+        self._set(task_id, owner=worker, status="CANCELLED")
+
+    def purge(self, ttl: float = TASK_RESULT_TTL) -> int:
+        with closing(self._connect()) as conn:
+            cur = conn.execute(
+                "DELETE FROM tasks WHERE status IN ('DONE', 'FAILED', 'CANCELLED') AND updated_at < ?",
+                (time.time() - ttl,),
+            )
+            return cur.rowcount
+
+    def requeue_stale(self, seconds: float = TASK_STALE_SECONDS) -> int:
+        with closing(self._connect()) as conn:
+            cur = conn.execute(
+                "UPDATE tasks SET status = 'PENDING', worker = NULL, progress = NULL "
+                "WHERE status = 'RUNNING' AND updated_at < ?",
+                (time.time() - seconds,),
+            )
+            return cur.rowcount
+
+
+def open_task_store() -> TaskStore:
+    """按环境变量 TASK_STORE（sqlite / memory）创建任务存储"""
+    kind = os.environ.get("TASK_STORE", "sqlite")
+    if kind == "memory":
+        return MemoryTaskStore()
+    if kind == "sqlite":
+        return SQLiteTaskStore()
+    raise ValueError(f"未知的任务存储: {kind}")
@@ -0,0 +1,173 @@
+"""
+计算 worker：从任务存储（见 task_store）领取统计任务并执行。
+
+API 进程默认在后台线程中直接执行自己创建的任务（TASK_INLINE=1），并在启动时运行一个
+后台 run_worker 线程，接管重启前遗留的 PENDING 任务与失联的 RUNNING 任务；
+设置 TASK_INLINE=0 后 API 只负责入队，由一个或多个独立进程执行：
+
+    python task_worker.py
+
+设置 WORKER_METRICS_PORT 时 worker 在该端口导出本进程的 /metrics（见 metrics.serve_metrics）。
+"""
+import os
+import socket
+import threading
+import time
+
+from metrics import REGISTRY, SamplingProfiler, serve_metrics
+from parti1_local import PARTITION_DIR
+from parti2_local import JoinProgress, TaskCancelled, compute_stats
+from partition_store import dataset_version
+from task_store import TASK_HEARTBEAT_SECONDS, TaskStore, open_task_store
+
+TASK_POLL_SECONDS = float(os.environ.get("TASK_POLL_SECONDS", 1.0))
+# 进度写入任务存储的最小间隔
+TASK_PROGRESS_SECONDS = 0.5
+# 清理过期结果、重新排队失联任务的间隔
+TASK_MAINTENANCE_SECONDS = 30.0
+WORKER_METRICS_PORT = int(os.environ.get("WORKER_METRICS_PORT", 0))
+PROFILE_TOP_STACKS = 200  # 任务结果中保留的折叠栈条数
+
+
+class Heartbeat:
+    """
+    任务执行期间由后台线程按 interval 秒刷新心跳（与网格对是否完成无关）；
+    任务已被重新排队（不再属于本 worker）时 lost 置为 True 并停止
+    """
+
+    def __init__(self, store: TaskStore, task_id: str, worker: str, interval: float = TASK_HEARTBEAT_SECONDS):
+        self.store = store
+        self.task_id = task_id
+        self.worker = worker
+        self.interval = interval
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                alive = self.store.heartbeat(self.task_id, self.worker)
+            except Exception:
+                # 存储暂时不可用（如 SQLite 锁超时）不等于任务丢失，下个周期重试
+                continue
+            if not alive:
+                self.lost = True
+                return
+
+
+class StoreProgress(JoinProgress):
+    """把进度写回任务存储，并在网格对之间检查取消标记；任务不再属于本 worker 时同样停止"""
+
+    def __init__(self, store: TaskStore, task_id: str, worker: str = None, heartbeat: Heartbeat = None):
+        self.store = store
+        self.task_id = task_id
+        self.worker = worker
+        self.heartbeat = heartbeat
+        self._last_write = 0.0
+
+    def report(self, snapshot: dict):
+        now = time.monotonic()
+        if now - self._last_write >= TASK_PROGRESS_SECONDS or snapshot["cells_done"] == snapshot["cells_total"]:
+            self.store.set_progress(self.task_id, snapshot, self.worker)
+            self._last_write = now
+
+    def cancelled(self) -> bool:
+        if self.heartbeat is not None and self.heartbeat.lost:
+            return True
+        return self.store.cancel_requested(self.task_id)
+
+
+def compute_request(request: dict, progress: JoinProgress = None) -> dict:
+    """
+    执行一个统计请求（TaskCreate 的字典形式：dataset_a, dataset_b, bbox, grids, profile）。
+    profile 为真时用 SamplingProfiler 采样，结果附带 profile（折叠栈）；
+    采样只覆盖当前线程，因此分析时网格对在本进程内串行执行。
+    """
+    base_a = os.path.join(PARTITION_DIR, request["dataset_a"])
+    base_b = os.path.join(PARTITION_DIR, request["dataset_b"])
+    if not os.path.isdir(base_a) or not os.path.isdir(base_b):
+        raise ValueError("数据集不存在，请先上传并分块")
+    bbox = request.get("bbox")
+    bbox_tuple = (bbox["minx"], bbox["miny"], bbox["maxx"], bbox["maxy"]) if bbox else None
+    # 计算前的数据集版本，结果的交集对流（/api/results/{task_id}/pairs）据此判断结果是否过期
+    versions = {"a": dataset_version(base_a), "b": dataset_version(base_b)}
+    if not request.get("profile"):
+        return {**compute_stats(base_a, base_b, bbox_tuple, request.get("grids"), progress), "dataset_versions": versions}
+    with SamplingProfiler() as profiler:
+        result = compute_stats(base_a, base_b, bbox_tuple, request.get("grids"), progress, workers=1)
+    result["dataset_versions"] = versions
+    result["profile"] = {
+        "interval_seconds": profiler.interval,
+        "samples": sum(profiler.stacks.values()),
+        "stacks": profiler.collapsed(PROFILE_TOP_STACKS),
+    }
+    return result
+
+
+def run_task(store: TaskStore, task_id: str, request: dict, worker: str):
+    """
+    执行 worker 已领取的任务并写回结果、错误或取消状态。执行期间持续写心跳；
+    任务若因心跳超时被重新排队，则在网格对之间停止，所有写入都因 worker 不匹配而不生效
+    """
+    t0 = time.perf_counter()
+    with Heartbeat(store, task_id, worker) as heartbeat:
+        progress = StoreProgress(store, task_id, worker, heartbeat)
+        try:
+            result = compute_request(request, progress)
+        except TaskCancelled:
+            # 记录停止时的进度（report 有节流，最后一次未必已写入）
+            store.set_progress(task_id, progress.snapshot(), worker)
+            store.mark_cancelled(task_id, worker)
+            status = "CANCELLED"
+        except Exception as e:
+            store.fail(task_id, str(e), worker)
+            status = "FAILED"
+        else:
+            store.finish(task_id, result, worker)
+            status = "DONE"
+    if heartbeat.lost:
+        status = "REQUEUED"
+    REGISTRY.inc("spatial_tasks_total", status=status)
+    REGISTRY.observe("spatial_task_seconds", time.perf_counter() - t0)
+
+
+def run_worker(
+    store: TaskStore = None,
+    poll_seconds: float = TASK_POLL_SECONDS,
+    worker: str = None,
+    metrics_port: int = WORKER_METRICS_PORT,
+    stop: threading.Event = None,
+):
+    """循环领取并执行 PENDING 任务，直到 stop 被设置（在任务之间检查）；启动时即清理过期结果并重新排队失联任务"""
+    stop = stop or threading.Event()
+    store = store or open_task_store()
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    last_maintenance = 0.0
+    if metrics_port:
+        serve_metrics(metrics_port)
+    print(f"✅ worker {worker} 已启动")
+    while not stop.is_set():
+        if time.monotonic() - last_maintenance > TASK_MAINTENANCE_SECONDS:
+            store.purge()
+            store.requeue_stale()
+            last_maintenance = time.monotonic()
+        claimed = store.claim(worker=worker)
+        if claimed is None:
+            stop.wait(poll_seconds)
+            continue
+        task_id, request = claimed
+        print(f"[-] 执行任务 {task_id}")
+        run_task(store, task_id, request, worker)
+
+
+if __name__ == "__main__":
+    run_worker()
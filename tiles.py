@@ -0,0 +1,134 @@
+"""
+多边形预览瓦片：z/x/y 瓦片按缩放级别简化几何、剔除亚像素多边形，编码为紧凑的二进制坐标缓冲区。
+
+瓦片坐标：每个数据集的世界范围由 manifest 决定（见 tile_world：布局范围与各网格数据外包框的并集，
+取正方形），四叉树布局的数据超出 GLOBAL_BOUNDS 时同样覆盖；z 级每边 2^z 个瓦片，x 向右、y 向上递增
+（与数据坐标同向），x/y 取值 [0, 2^z)，超出范围的瓦片不生成。前端经 GET /api/tiles/{dataset}/world 取得世界范围。
+瓦片缓存在 partitioned_data/{dataset}/_tiles/{世界范围摘要}/{z}/{x}/{y}.bin，数据集重新分块时随目录一并清除，
+增量更新时只删除与变更多边形外包框相交的瓦片，世界范围变化时旧范围的瓦片整体删除（见 invalidate_tiles）。
+瓦片内容为 polygon_codec.encode_polygons 的扁平二进制格式。
+"""
+import hashlib
+import os
+import shutil
+import uuid
+from typing import Optional, Tuple
+
+import numpy as np
+import shapely
+
+from partition_layout import bbox_intersects, load_layout
+from partition_store import list_grids, partition_path
+from parti2_local import load_partition, owned_rows
+from polygon_codec import encode_polygons
+
+TILE_DIR = "_tiles"
+TILE_SIZE = 256  # 瓦片像素宽度，决定简化容差与亚像素阈值
+MAX_ZOOM = 16
+MIN_FEATURE_PX = 1.0  # 外包框长边小于该像素数的多边形不输出
+
+
+def tile_world(base: str) -> Tuple[float, float, float, float]:
+    """
+    数据集的瓦片世界范围 (minx, miny, maxx, maxy)：布局范围（均匀网格的 bounds / 四叉树的 domain）
+    与 manifest 中各网格数据外包框的并集，扩为以左下角为原点的正方形
+    """
+    layout, cells = load_layout(base, list_grids(base))
+    boxes = np.array([layout.bounds] + [st["bbox"] for st in cells.values() if st.get("bbox")], dtype=float)
+    minx, miny = boxes[:, :2].min(axis=0)
+    maxx, maxy = boxes[:, 2:].max(axis=0)
+    side = max(maxx - minx, maxy - miny) or 1.0
+    return (float(minx), float(miny), float(minx + side), float(miny + side))
+
+
+def _world_dir(base: str, world) -> str:
+    key = hashlib.sha1(repr(tuple(world)).encode()).hexdigest()[:12]
+    return os.path.join(base, TILE_DIR, key)
+
+
+def tile_bounds(world, z: int, x: int, y: int):
+    """世界范围 world 中瓦片的数据坐标范围 (minx, miny, maxx, maxy)"""
+    minx, miny, maxx, maxy = world
+    w = (maxx - minx) / 2**z
+    h = (maxy - miny) / 2**z
+    return (minx + x * w, miny + y * h, minx + (x + 1) * w, miny + (y + 1) * h)
+
+
+def render_tile(base: str, world, z: int, x: int, y: int) -> bytes:
+    """
+    生成单个瓦片：取与瓦片相交的多边形（跨网格复制的只取一次），
+    剔除亚像素多边形，按一个像素的容差简化（保持拓扑），再编码。
+    几何不按瓦片裁剪，跨瓦片的多边形在每个相交瓦片中都会出现（id 相同，前端去重）。
+    """
+    bbox = tile_bounds(world, z, x, y)
+    px = (bbox[2] - bbox[0]) / TILE_SIZE
+    layout, cells = load_layout(base, list_grids(base))
+    ids, areas, geoms = [], [], []
+    for gid, stats in cells.items():
+        if not bbox_intersects(stats.get("bbox"), bbox):
+            continue
+        path = partition_path(base, gid)
+        if path is None:
+            continue
+        df, _ = load_partition(path, bbox)
+        df = owned_rows(df, layout.cell(gid), bbox)
+        big = np.maximum(df["maxx"] - df["minx"], df["maxy"] - df["miny"]) >= MIN_FEATURE_PX * px
+        df = df[big]
+        ids.append(df["id"].to_numpy())
+        areas.append(df["area"].to_numpy())
+        geoms.append(df["geom"].to_numpy())
+    if not ids:
+        return encode_polygons(np.empty(0, dtype=object), np.empty(0), np.empty(0, dtype=object))
+    ids, areas, geoms = np.concatenate(ids), np.concatenate(areas), np.concatenate(geoms)
+    geoms = shapely.simplify(geoms, px, preserve_topology=True)
+    keep = ~shapely.is_empty(geoms)
+    return encode_polygons(ids[keep], areas[keep], geoms[keep])
+
+
+def get_tile(base: str, z: int, x: int, y: int) -> Optional[str]:
+    """返回瓦片缓存文件路径（不存在时先生成）；数据集不存在或瓦片超出世界范围返回 None"""
+    if not os.path.isdir(base) or not (0 <= x < 2**z and 0 <= y < 2**z):
+        return None
+    world = tile_world(base)
+    path = os.path.join(_world_dir(base, world), str(z), str(x), f"{y}.bin")
+    if not os.path.exists(path):
+        data = render_tile(base, world, z, x, y)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    return path
+
+
+def invalidate_tiles(base: str, bboxes) -> int:
+    """
+    删除与任一外包框 (minx, miny, maxx, maxy) 相交的已缓存瓦片，返回删除数；
+    在 manifest 更新后调用，世界范围已变化时旧范围下的瓦片全部删除
+    """
+    tile_root = os.path.join(base, TILE_DIR)
+    if not os.path.isdir(tile_root):
+        return 0
+    world = tile_world(base)
+    root = _world_dir(base, world)
+    for name in os.listdir(tile_root):
+        if os.path.join(tile_root, name) != root:
+            shutil.rmtree(os.path.join(tile_root, name), ignore_errors=True)
+    bboxes = np.asarray(bboxes, dtype=float).reshape(-1, 4)
+    if not os.path.isdir(root) or not len(bboxes):
+        return 0
+    removed = 0
+    for dirpath, _, files in os.walk(root):
+        rel = os.path.relpath(dirpath, root).split(os.sep)
+        if len(rel) != 2:
+            continue
+        z, x = int(rel[0]), int(rel[1])
+        for f in files:
+            if not f.endswith(".bin"):
+                continue
+            t = tile_bounds(world, z, x, int(f[:-4]))
+            hit = (bboxes[:, 0] <= t[2]) & (bboxes[:, 2] >= t[0]) & (bboxes[:, 1] <= t[3]) & (bboxes[:, 3] >= t[1])
+            if hit.any():
+                os.remove(os.path.join(dirpath, f))
+                removed += 1
+    return removed